@@ -0,0 +1,58 @@
+"""
+Micro-benchmark: per-file classification cost of CategoryIndex
+compared with the old linear scan over FILE_CATEGORIES.
+
+Run from the project folder:
+    python -m benchmarks.bench_classify
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import FILE_CATEGORIES, OTHERS_CATEGORY, CategoryIndex
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def make_names(count, seed=42):
+    """Generates synthetic filenames with a mix of known, compound and unknown extensions."""
+    rnd = random.Random(seed)
+    known = [ext for extensions in FILE_CATEGORIES.values() for ext in extensions]
+    unknown = [".log", ".csv", ".json", ".py", ".iso", ""]
+    pool = known + unknown + [".TAR.GZ", ".JPG"]
+    return [f"file_{i}{rnd.choice(pool)}" for i in range(count)]
+
+
+def linear_classify(filename):
+    """The original classification loop from _sort_files_thread."""
+    ext = os.path.splitext(filename)[1].lower()
+    for category, extensions in FILE_CATEGORIES.items():
+        if ext in extensions:
+            return category
+    return OTHERS_CATEGORY
+
+
+def bench(classify, names):
+    start = time.perf_counter()
+    for name in names:
+        classify(name)
+    return time.perf_counter() - start
+
+
+def main():
+    index = CategoryIndex(FILE_CATEGORIES)
+    print(f"{'files':>10} {'linear ns/file':>16} {'index ns/file':>15} {'speedup':>8}")
+    for count in SIZES:
+        names = make_names(count)
+        linear = bench(linear_classify, names)
+        indexed = bench(index.classify, names)
+        print(f"{count:>10} {linear / count * 1e9:>16.1f} {indexed / count * 1e9:>15.1f} "
+              f"{linear / indexed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
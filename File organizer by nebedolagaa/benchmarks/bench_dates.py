@@ -0,0 +1,111 @@
+"""
+Benchmark: cost of date bucketing by mtime, by embedded date, and from the cache.
+
+--files synthetic photos (JPEG with an Exif segment after a JFIF header,
+some PNG with an eXIf chunk) and videos (MP4 with moov at the end, behind
+--payload KiB of media data) are created in a temporary folder. Their date
+folders are computed by modification time, by reading the embedded dates
+(cold, with an empty DateCache), and again by a fresh bucketer on the same
+DateCache, as the next run would.
+
+Run from the project folder:
+    python -m benchmarks.bench_dates [--files 5000] [--payload 256]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import DateBucketer, DateCache, embedded_date
+from organizer.dates import MP4_EPOCH_OFFSET
+
+
+def exif_tiff(date):
+    """Little-endian TIFF block: IFD0 -> Exif IFD -> DateTimeOriginal."""
+    text = date.strftime("%Y:%m:%d %H:%M:%S").encode() + b"\x00"
+    ifd0 = struct.pack("<H", 1) + struct.pack("<HHII", 0x8769, 4, 1, 26) + struct.pack("<I", 0)
+    exif = struct.pack("<H", 1) + struct.pack("<HHII", 0x9003, 2, len(text), 44) + struct.pack("<I", 0)
+    return b"II*\x00" + struct.pack("<I", 8) + ifd0 + exif + text
+
+
+def make_jpeg(date, payload):
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    app1 = b"Exif\x00\x00" + exif_tiff(date)
+    return (b"\xff\xd8"
+            + b"\xff\xe0" + struct.pack(">H", len(app0) + 2) + app0
+            + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+            + b"\xff\xda" + payload + b"\xff\xd9")
+
+
+def make_png(date, payload):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + b"\x00" * 4
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", b"\x00" * 13) + chunk(b"eXIf", exif_tiff(date))
+            + chunk(b"IDAT", payload) + chunk(b"IEND", b""))
+
+
+def make_mp4(date, payload):
+    seconds = int(date.timestamp()) + MP4_EPOCH_OFFSET
+    mvhd_body = b"\x00\x00\x00\x00" + struct.pack(">II", seconds, seconds) + b"\x00" * 88
+    mvhd = struct.pack(">I", len(mvhd_body) + 8) + b"mvhd" + mvhd_body
+    ftyp = struct.pack(">I", 20) + b"ftypisom" + b"\x00\x00\x02\x00" + b"isom"
+    mdat = struct.pack(">I", len(payload) + 8) + b"mdat" + payload
+    moov = struct.pack(">I", len(mvhd) + 8) + b"moov" + mvhd
+    return ftyp + mdat + moov
+
+
+MAKERS = [("jpg", make_jpeg)] * 6 + [("png", make_png), ("mp4", make_mp4)]
+
+
+def make_tree(root, count, payload_size):
+    payload = os.urandom(payload_size)
+    base = datetime(2015, 1, 1, 12, 0, 0)
+    paths = []
+    for i in range(count):
+        ext, make = MAKERS[i % len(MAKERS)]
+        date = base + timedelta(days=i % 3000)
+        path = os.path.join(root, f"file_{i:06d}.{ext}")
+        with open(path, 'wb') as f:
+            f.write(make(date, payload))
+        paths.append((path, date))
+    return paths
+
+
+def bucket_all(bucketer, paths):
+    start = time.perf_counter()
+    folders = [bucketer.subfolder(path, os.stat(path)) for path, date in paths]
+    return folders, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--payload", type=int, default=256, help="KiB of media data per file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = make_tree(root, args.files, args.payload * 1024)
+        wrong = [path for path, date in paths if embedded_date(path) != date]
+        assert not wrong, f"embedded date not found in {wrong[:3]}"
+        cache = DateCache(os.path.join(root, "dates.sqlite"))
+
+        print(f"{args.files} files of {args.payload} KiB")
+        for label, bucketer in (
+                ("mtime", DateBucketer("month")),
+                ("embedded, cold", DateBucketer("month", embedded=True, cache=cache)),
+                ("embedded, cached", DateBucketer("month", embedded=True, cache=cache))):
+            folders, elapsed = bucket_all(bucketer, paths)
+            bucketer.flush()
+            print(f"  {label:17} {args.files / elapsed:10,.0f} files/s "
+                  f"({bucketer.headers_read} headers read, {len(set(folders))} folders)")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: several folders one after the other vs. as jobs of a JobQueue.
+
+One big folder and --small small ones are sorted on a simulated network
+mount (see SlowFilesystem in bench_pipeline.py, --latency ms per call):
+
+    sequential   each folder with its own pool of -j workers, in turn
+    queue        all folders at once (--jobs), sharing one pool of -j workers
+
+Besides the total time, the time until the last small folder is done shows
+whether the small folders wait behind the big one. All folders are on the
+same device here, so the per-device limit is lifted for the queue run.
+
+Run from the project folder:
+    python -m benchmarks.bench_jobs [--big 4000] [--small 6] [--files 200] [-j 16] [--jobs 4]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import SlowFilesystem, make_tree
+from organizer import JobQueue, Organizer
+
+
+def make_folders(base, args):
+    folders = []
+    for i, count in enumerate([args.big] + [args.files] * args.small):
+        folder = os.path.join(base, f"folder_{i}")
+        make_tree(folder, count, max(1, count // 100))
+        folders.append(folder)
+    return folders
+
+
+def sequential(folders, args):
+    """Returns (total seconds, seconds until the small folders were done)."""
+    start = time.perf_counter()
+    small_done = 0.0
+    # Big folder first: the order a user would typically pick
+    for i, folder in enumerate(folders):
+        Organizer(folder, recursive=True, workers=args.workers).sort()
+        if i:
+            small_done = time.perf_counter() - start
+    return time.perf_counter() - start, small_done
+
+
+def queued(folders, args):
+    start = time.perf_counter()
+    small_done = 0.0
+    with JobQueue(workers=args.workers, max_jobs=args.jobs, per_device=None) as queue:
+        jobs = [queue.submit(folder, recursive=True) for folder in folders]
+        for job in jobs[1:]:
+            job.wait()
+        small_done = time.perf_counter() - start
+    for job in jobs:
+        assert job.status == "finished", (job.folder, job.status, job.error)
+    return time.perf_counter() - start, small_done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--big", type=int, default=4000, help="files in the big folder")
+    parser.add_argument("--small", type=int, default=6, help="number of small folders")
+    parser.add_argument("--files", type=int, default=200, help="files per small folder")
+    parser.add_argument("-j", "--workers", type=int, default=16)
+    parser.add_argument("--jobs", type=int, default=4, help="folders sorted at once by the queue")
+    parser.add_argument("--latency", type=float, default=2.0, help="milliseconds per call")
+    args = parser.parse_args()
+
+    print(f"1 folder of {args.big} files + {args.small} of {args.files}, {args.workers} workers, "
+          f"{args.latency:g} ms per filesystem call")
+    print(f"{'mode':>12} {'total s':>9} {'small done s':>13} {'files/s':>9}")
+    total_files = args.big + args.small * args.files
+    for label, run in (("sequential", sequential), ("queue", queued)):
+        base = tempfile.mkdtemp(prefix="organizer_bench_jobs_")
+        try:
+            folders = make_folders(base, args)
+            with SlowFilesystem(args.latency / 1000):
+                total, small_done = run(folders, args)
+            print(f"{label:>12} {total:>9.2f} {small_done:>13.2f} {total_files / total:>9.0f}")
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
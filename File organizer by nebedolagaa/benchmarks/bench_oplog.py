@@ -0,0 +1,85 @@
+"""
+Benchmark: memory of the operations log, list of dicts vs OperationLog.
+
+--operations synthetic moves of a recursive run (folder/sub/name ->
+folder/<category>/sub/name, with size and mtime) are logged both ways and
+measured with tracemalloc; then both are walked newest first, as undo does.
+
+Run from the project folder:
+    python -m benchmarks.bench_oplog [--operations 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import OperationLog
+
+FOLDER = "/home/user/Downloads"
+CATEGORIES = ["Documents", "Images", "Videos", "Music", "Archives", "Others"]
+
+
+def operations(count):
+    for i in range(count):
+        subfolder = f"batch_{i % 200}"
+        name = f"IMG_{i:07d}.jpg"
+        yield {
+            'source': f"{FOLDER}/{subfolder}/{name}",
+            'destination': f"{FOLDER}/{CATEGORIES[i % len(CATEGORIES)]}/{subfolder}/{name}",
+            'size': i * 37 % 10**7,
+            'mtime': 1_700_000_000_000_000_000 + i,
+        }
+
+
+def log_dicts(count):
+    log = []
+    for operation in operations(count):
+        log.append(operation)
+    return log
+
+
+def log_compact(count):
+    log = OperationLog(FOLDER)
+    for operation in operations(count):
+        log.append(operation)
+    return log
+
+
+def measure(build, count):
+    """Returns (log, bytes it holds, seconds to build it under tracemalloc)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    log = build(count)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return log, current, elapsed
+
+
+def walk_reversed(log):
+    start = time.perf_counter()
+    for operation in reversed(log):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--operations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{args.operations} operations")
+    for label, build in (("list of dicts", log_dicts), ("OperationLog", log_compact)):
+        log, size, built = measure(build, args.operations)
+        walked = walk_reversed(log)
+        print(f"  {label:14} {size / 2**20:8.1f} MiB ({size / args.operations:5.0f} B/op), "
+              f"reverse walk {walked:5.2f} s")
+        del log
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark: serial, thread pool and asyncio pipeline on a high-latency folder.
+
+A network mount is simulated locally: while SlowFilesystem is active every
+filesystem call the engine makes (os.stat, os.scandir, the rename,
+os.mkdir, DirEntry.stat, ...) first sleeps for --latency milliseconds,
+like an SMB/NFS round trip. Sleeping releases the GIL just as waiting for
+the server does. A recursive folder of --dirs subfolders with --files files
+in total is sorted three ways on that stand-in.
+
+Run from the project folder:
+    python -m benchmarks.bench_pipeline [--files 2000] [--dirs 40] [--latency 2]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import FILE_CATEGORIES, Organizer, Stages, transfer
+
+# os functions that cost a round trip on a network mount
+SLOW_CALLS = ("stat", "lstat", "scandir", "rename", "link", "mkdir", "listdir", "open", "unlink")
+
+
+class SlowEntry:
+    """os.DirEntry stand-in whose stat() costs a round trip (once, then cached)."""
+
+    def __init__(self, entry, delay):
+        self._entry = entry
+        self._delay = delay
+        self._stat = None
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def stat(self, follow_symlinks=True):
+        if self._stat is None:
+            time.sleep(self._delay)
+            self._stat = self._entry.stat(follow_symlinks=follow_symlinks)
+        return self._stat
+
+
+class SlowScandir:
+    def __init__(self, iterator, delay):
+        self._iterator = iterator
+        self._delay = delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        for entry in self._iterator:
+            yield SlowEntry(entry, self._delay)
+
+    def close(self):
+        self._iterator.close()
+
+
+class SlowFilesystem:
+    """Context manager adding a fixed delay to every filesystem call of the os module."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self._saved = {}
+
+    def __enter__(self):
+        delay = self.latency
+        for name in SLOW_CALLS:
+            real = getattr(os, name)
+            self._saved[name] = real
+
+            def slow(*args, _real=real, **kwargs):
+                time.sleep(delay)
+                return _real(*args, **kwargs)
+            setattr(os, name, slow)
+        real_scandir = os.scandir
+        os.scandir = lambda *args: SlowScandir(real_scandir(*args), delay)
+        # Same-device moves call renameat2/renamex_np through ctypes, not os
+        real_rename = self._native_rename = transfer._native_rename()
+        if real_rename is not None:
+            def slow_rename(src, dest):
+                time.sleep(delay)
+                return real_rename(src, dest)
+            transfer._rename_function = slow_rename
+        return self
+
+    def __exit__(self, *exc):
+        for name, real in self._saved.items():
+            setattr(os, name, real)
+        transfer._rename_function = self._native_rename
+
+
+def make_tree(folder, files, dirs):
+    extensions = [ext for extensions in FILE_CATEGORIES.values() for ext in extensions]
+    for i in range(files):
+        subfolder = os.path.join(folder, f"dir_{i % dirs}")
+        os.makedirs(subfolder, exist_ok=True)
+        with open(os.path.join(subfolder, f"file_{i}{extensions[i % len(extensions)]}"), "wb") as f:
+            f.write(b"x" * 64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--dirs", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=2.0, help="milliseconds per call")
+    args = parser.parse_args()
+
+    modes = [
+        ("serial", dict(workers=1)),
+        ("16 threads", dict(workers=16)),
+        ("pipeline 4,8,64", dict(pipeline=Stages(4, 8, 64))),
+        ("pipeline 8,16,256", dict(pipeline=Stages(8, 16, 256))),
+    ]
+    print(f"{args.files} files in {args.dirs} folders, {args.latency:g} ms per filesystem call")
+    print(f"{'mode':>18} {'seconds':>9} {'files/s':>10}")
+    for label, options in modes:
+        folder = tempfile.mkdtemp(prefix="organizer_bench_")
+        try:
+            make_tree(folder, args.files, args.dirs)
+            organizer = Organizer(folder, recursive=True, **options)
+            with SlowFilesystem(args.latency / 1000):
+                start = time.perf_counter()
+                moved = len(organizer.sort())
+                elapsed = time.perf_counter() - start
+            assert moved == args.files, (label, moved)
+            print(f"{label:>18} {elapsed:>9.2f} {moved / elapsed:>10.0f}")
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
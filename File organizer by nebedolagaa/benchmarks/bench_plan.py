@@ -0,0 +1,111 @@
+"""
+Benchmark: memory and time of move plans.
+
+First a plan of --entries synthetic entries is built in memory and
+compared, with tracemalloc, against the same entries as one dict per
+file. Then a real folder of --files files is planned, re-validated and
+saved.
+
+Run from the project folder:
+    python -m benchmarks.bench_plan [--entries 1000000] [--files 100000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import Organizer, Plan
+
+FOLDER = "/srv/share/inbox"
+CATEGORIES = ["Documents", "Images", "Videos", "Music", "Archives", "Others"]
+
+
+def synthetic(count):
+    """Yields (source, destination, category, size, mtime) like a recursive run would plan."""
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        subfolder = f"projects/p{i % 500}"
+        name = f"file_{i:07d}.dat"
+        yield (f"{FOLDER}/{subfolder}/{name}", f"{FOLDER}/{category}/{subfolder}/{name}",
+               category, i * 37 % 10**7, 1_700_000_000_000_000_000 + i)
+
+
+def measure(build, count):
+    """Returns (seconds, bytes held) of build(count); timed without tracemalloc, which slows it down."""
+    start = time.perf_counter()
+    result = build(count)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = build(count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current
+
+
+def build_plan(count):
+    plan = Plan(FOLDER)
+    for source, destination, category, size, mtime in synthetic(count):
+        plan.add(source, destination, category, size, mtime)
+    return plan
+
+
+def build_dicts(count):
+    return [{'source': source, 'destination': destination, 'category': category,
+             'size': size, 'mtime': mtime, 'conflict': ""}
+            for source, destination, category, size, mtime in synthetic(count)]
+
+
+def make_tree(folder, files, dirs=100):
+    for d in range(dirs):
+        os.makedirs(os.path.join(folder, f"dir_{d}"))
+    for i in range(files):
+        ext = (".jpg", ".pdf", ".mp3", ".zip", ".txt")[i % 5]
+        with open(os.path.join(folder, f"dir_{i % dirs}", f"file_{i}{ext}"), "wb") as f:
+            f.write(b"x" * (i % 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--files", type=int, default=100_000)
+    args = parser.parse_args()
+
+    plan_seconds, plan_bytes = measure(build_plan, args.entries)
+    dict_seconds, dict_bytes = measure(build_dicts, args.entries)
+    print(f"{args.entries} entries")
+    print(f"  Plan (columns):  {plan_bytes / 2**20:8.1f} MiB  {plan_seconds:6.2f} s to build")
+    print(f"  list of dicts:   {dict_bytes / 2**20:8.1f} MiB  {dict_seconds:6.2f} s to build")
+
+    base = tempfile.mkdtemp(prefix="organizer_bench_")
+    try:
+        folder = os.path.join(base, "inbox")
+        make_tree(folder, args.files)
+        start = time.perf_counter()
+        plan = Organizer(folder, dry_run=True, recursive=True).plan()
+        planned = time.perf_counter() - start
+        start = time.perf_counter()
+        stale = plan.validate()
+        validated = time.perf_counter() - start
+        plan_path = os.path.join(base, "inbox.plan.jsonl")
+        start = time.perf_counter()
+        plan.save(plan_path)
+        Plan.load(plan_path)
+        saved = time.perf_counter() - start
+        print(f"{args.files} files on disk")
+        print(f"  plan:            {planned:6.2f} s")
+        print(f"  validate:        {validated:6.2f} s ({len(stale)} stale)")
+        print(f"  save + load:     {saved:6.2f} s ({os.path.getsize(plan_path) / 2**20:.1f} MiB file)")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: repeated runs over the same folder, with and without the scan cache.
+
+The synthetic tree holds --files files in --dirs subfolders that the
+organizer leaves in place: a file of the same name is already in its
+category folder and --on-conflict is "skip". Before every run --new new
+files are dropped into the first folders, the way downloads arrive, and
+the run sorts them. Nothing is backdated: every run starts right after the
+previous one, so the folders the last run moved files out of are as fresh
+as they are in real use.
+
+Run from the project folder:
+    python -m benchmarks.bench_scan_cache [--files 100000] [--dirs 100] [--new 10] [--runs 3]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import Organizer, ScanCache
+from organizer.conflicts import SKIP
+
+
+def make_tree(folder, files, dirs):
+    per_dir = files // dirs
+    for d in range(dirs):
+        sub = os.path.join(folder, f"dir_{d}")
+        sorted_sub = os.path.join(folder, "Documents", f"dir_{d}")
+        os.makedirs(sub)
+        os.makedirs(sorted_sub)
+        for i in range(per_dir):
+            open(os.path.join(sub, f"report_{i}.txt"), "wb").close()
+            open(os.path.join(sorted_sub, f"report_{i}.txt"), "wb").close()
+
+
+def drop_new(folder, count, dirs, run):
+    for i in range(count):
+        with open(os.path.join(folder, f"dir_{i % dirs}", f"photo_{run}_{i}.jpg"), "wb") as f:
+            f.write(b"new")
+
+
+def run(folder, cache_path):
+    cache = ScanCache(cache_path) if cache_path else None
+    organizer = Organizer(folder, recursive=True, on_conflict=SKIP, scan_cache=cache)
+    start = time.perf_counter()
+    organizer.sort()
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        cache.close()
+    return elapsed, organizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000, help="files left in place")
+    parser.add_argument("--dirs", type=int, default=100)
+    parser.add_argument("--new", type=int, default=10, help="new files sorted by every run")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for label, cached in (("no cache", False), ("scan cache", True)):
+        base = tempfile.mkdtemp(prefix="organizer_bench_")
+        try:
+            folder = os.path.join(base, "inbox")
+            make_tree(folder, args.files, args.dirs)
+            cache_path = os.path.join(base, "cache.sqlite") if cached else None
+            results[label] = []
+            for i in range(args.runs):
+                drop_new(folder, args.new, args.dirs, i)
+                elapsed, organizer = run(folder, cache_path)
+                assert organizer.moved == args.new, (label, i, organizer.moved)
+                results[label].append((elapsed, organizer.stats))
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+    print(f"files left in place: {args.files} in {args.dirs} folders, {args.new} new files per run")
+    print(f"{'run':>5} {'no cache ms':>12} {'scan cache ms':>14} {'folders skipped':>16} {'fs calls':>9}")
+    for i in range(args.runs):
+        plain, _ = results["no cache"][i]
+        cached, stats = results["scan cache"][i]
+        print(f"{i + 1:>5} {plain * 1000:>12.1f} {cached * 1000:>14.1f} "
+              f"{stats.cached_dirs:>16} {stats.fs_calls:>9}")
+
+
+if __name__ == "__main__":
+    main()
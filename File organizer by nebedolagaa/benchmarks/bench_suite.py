@@ -0,0 +1,225 @@
+"""
+Benchmark suite: the engine on synthetic trees, stage by stage, as JSON.
+
+Every scenario builds a fresh tree, sorts it with a StageTimer (see
+organizer/profiling.py) and undoes the run, timing:
+
+    scan      listing the directories
+    classify  choosing the destination of every file
+    move      free names, folders and renames
+    undo      moving everything back
+
+Scenarios:
+    small       many small files in one folder
+    huge        a few huge (sparse) files, with content sniffing on
+    deep        a deeply nested tree, sorted recursively
+    collisions  every name already taken in the category folder (renames)
+
+Trees are created in tmpfs (/dev/shm) when there is one, so the numbers
+show the engine and not the disk; use --base to measure a real disk or a
+mount. The results (best of --repeat runs) are printed as JSON or written
+to --output; --compare OLD.json prints the change against an earlier
+result and exits with 1 when a stage got slower than --tolerance allows.
+
+Run from the project folder:
+    python -m benchmarks.bench_suite [--scale 1.0] [--repeat 3] [--output results.json]
+    python -m benchmarks.bench_suite --compare results.json
+    python -m benchmarks.bench_suite --only deep --profile profiles/
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import FILE_CATEGORIES, ContentSniffer, Organizer, Profiler, StageTimer, undo_operations
+
+EXTENSIONS = [ext for extensions in FILE_CATEGORIES.values() for ext in extensions] + [".log", ""]
+METRICS = ("scan", "classify", "move", "undo", "sort")
+
+
+def make_small(folder, scale):
+    count = int(20000 * scale)
+    for i in range(count):
+        with open(os.path.join(folder, f"file_{i}{EXTENSIONS[i % len(EXTENSIONS)]}"), "wb") as f:
+            f.write(b"x" * 1024)
+    return {}
+
+
+def make_huge(folder, scale):
+    # Sparse files: huge to the engine, free to create on tmpfs
+    for i in range(max(1, int(8 * scale))):
+        with open(os.path.join(folder, f"huge_{i}{EXTENSIONS[i % len(EXTENSIONS)]}"), "wb") as f:
+            f.truncate(4 * 2**30)
+    return {"sniffer": ContentSniffer()}
+
+
+def make_deep(folder, scale, depth=12, files_per_level=10):
+    for branch in range(max(1, int(40 * scale))):
+        path = os.path.join(folder, f"branch_{branch}")
+        for level in range(depth):
+            path = os.path.join(path, f"level_{level}")
+            os.makedirs(path, exist_ok=True)
+            for i in range(files_per_level):
+                name = f"f{i}{EXTENSIONS[(branch + level + i) % len(EXTENSIONS)]}"
+                with open(os.path.join(path, name), "wb") as f:
+                    f.write(b"x" * 64)
+    return {"recursive": True}
+
+
+def make_collisions(folder, scale):
+    count = int(5000 * scale)
+    index = Organizer(folder).index
+    for i in range(count):
+        name = f"report_{i % 50}_{i}{EXTENSIONS[i % len(EXTENSIONS)]}"
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(b"x" * 64)
+        # The same name, plus its first few "(n)" renames, already in the category folder
+        category = os.path.join(folder, index.classify(name))
+        os.makedirs(category, exist_ok=True)
+        stem, ext = os.path.splitext(name)
+        for taken in [name] + [f"{stem} ({n}){ext}" for n in range(1, 4)]:
+            open(os.path.join(category, taken), "wb").close()
+    return {}
+
+
+SCENARIOS = {
+    "small": make_small,
+    "huge": make_huge,
+    "deep": make_deep,
+    "collisions": make_collisions,
+}
+
+
+def default_base():
+    """tmpfs when there is one (Linux), the temp folder otherwise."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+
+def filesystem_type(path):
+    """Type of the filesystem path is on (Linux /proc/mounts), or None."""
+    path = os.path.realpath(path)
+    best = ("", None)
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts:
+            for line in mounts:
+                fields = line.split()
+                mount_point, fs_type = fields[1], fields[2]
+                if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) \
+                        and len(mount_point) >= len(best[0]):
+                    best = (mount_point, fs_type)
+    except OSError:
+        pass
+    return best[1]
+
+
+def run_scenario(name, args, profile_path=None):
+    """One build + sort + undo; returns the measurements."""
+    folder = tempfile.mkdtemp(prefix=f"organizer_suite_{name}_", dir=args.base)
+    try:
+        options = SCENARIOS[name](folder, args.scale)
+        profiler = Profiler(profile_path) if profile_path else None
+        timer = profiler.timer if profiler else StageTimer()
+        organizer = Organizer(folder, workers=args.workers, timer=timer, **options)
+
+        with profiler or contextlib.nullcontext():
+            start = time.perf_counter()
+            operations = organizer.sort()
+            sort_seconds = time.perf_counter() - start
+            with timer.measure("undo", len(operations)):
+                report = undo_operations(operations, workers=args.workers)
+        assert report.restored == len(operations), f"{name}: undo restored {report.restored}"
+
+        stages = timer.as_dict()
+        result = {stage: stages.get(stage, {}).get("seconds", 0.0) for stage in METRICS[:-1]}
+        result.update(sort=round(sort_seconds, 6), files=len(operations),
+                      renamed=organizer.stats.renamed)
+        return result
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change of every metric; returns the regressions."""
+    regressions = []
+    print(f"{'scenario':12} {'metric':9} {'before':>9} {'now':>9} {'change':>8}")
+    for name, now in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            # Stages under a millisecond are all noise
+            flag = " <- slower" if change > tolerance and new - old > 0.001 else ""
+            if flag:
+                regressions.append((name, metric, change))
+            print(f"{name:12} {metric:9} {old:9.3f} {new:9.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the number of files")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario (best is kept)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--only", action="append", choices=SCENARIOS, help="scenario to run (repeatable)")
+    parser.add_argument("--base", default=default_base(), help="where to create the trees")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", metavar="OLD", help="compare with an earlier JSON result")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="slowdown that counts as a regression (default: %(default)s)")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="write cProfile stats of the last run of every scenario to DIR")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "base": args.base or tempfile.gettempdir(),
+        "filesystem": filesystem_type(args.base or tempfile.gettempdir()),
+        "scale": args.scale,
+        "workers": args.workers,
+        "scenarios": {},
+    }
+    for name in args.only or SCENARIOS:
+        runs = []
+        for attempt in range(args.repeat):
+            profile_path = None
+            if args.profile and attempt == args.repeat - 1:
+                profile_path = os.path.join(args.profile, f"{name}.prof")
+            runs.append(run_scenario(name, args, profile_path))
+        best = dict(runs[0])
+        for metric in METRICS:
+            best[metric] = min(run[metric] for run in runs)
+        results["scenarios"][name] = best
+        print(f"{name}: {best['files']} files, sort {best['sort']:.3f} s, "
+              f"undo {best['undo']:.3f} s", file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
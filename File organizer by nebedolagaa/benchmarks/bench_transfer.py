@@ -0,0 +1,148 @@
+"""
+Benchmark: moving files to another device, shutil.move vs. CrossDeviceMover.
+
+--files files of --size MiB are moved from --src to --dest, which must be
+on different filesystems (by default the temp folder and /dev/shm):
+
+    shutil.move       copy2 + unlink, what the engine used before
+    mover (sample)    chunked zero-copy copy, size/mtime/sampled blocks verified
+    mover (full)      the same, every byte compared before the source is deleted
+    resume            a copy stopped halfway and finished by a second move;
+                      only the second move is timed
+    resume after kill a copy whose process is killed halfway (no cleanup, no
+                      final checkpoint), finished by a second move that
+                      compares every byte; checks that the copy continues
+                      from the last checkpoint instead of starting over
+
+Run from the project folder:
+    python -m benchmarks.bench_transfer [--files 4] [--size 256] [--src DIR] [--dest DIR]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT)
+
+from organizer import CrossDeviceMover
+from organizer.transfer import FULL, SAMPLE
+
+
+def make_files(folder, count, size):
+    block = os.urandom(2**20)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"file_{i}.bin")
+        with open(path, "wb") as f:
+            for _ in range(size):
+                f.write(block)
+        paths.append(path)
+    return paths
+
+
+def move_all(paths, dest, move):
+    start = time.perf_counter()
+    for path in paths:
+        move(path, os.path.join(dest, os.path.basename(path)))
+    return time.perf_counter() - start
+
+
+def resume_half(paths, dest, size):
+    """Stops every copy at half its size, then times the moves that finish them.
+
+    Returns the seconds and the MiB the timed moves copied.
+    """
+    mover = CrossDeviceMover()
+    for path in paths:
+        copied = [0]
+
+        def on_bytes(count, copied=copied):
+            copied[0] += count
+
+        mover.move(path, os.path.join(dest, os.path.basename(path)), on_bytes,
+                   lambda copied=copied: copied[0] >= size * 2**20 // 2)
+    mover = CrossDeviceMover()
+    seconds = move_all(paths, dest, mover.move)
+    assert mover.bytes_resumed, "nothing was resumed"
+    return seconds, mover.bytes_copied / 2**20
+
+
+# Run in a child process: copies argv[2] to argv[3] with a checkpoint every
+# argv[4] bytes and dies without any cleanup once half of it is copied
+KILLED_COPY = """
+import os, sys
+sys.path.insert(0, sys.argv[1])
+from organizer import CrossDeviceMover
+src, dest, checkpoint = sys.argv[2], sys.argv[3], int(sys.argv[4])
+half = os.path.getsize(src) // 2
+copied = 0
+
+def on_bytes(count):
+    global copied
+    copied += count
+    if copied >= half:
+        os._exit(9)
+
+CrossDeviceMover(chunk_size=min(checkpoint, 8 * 2**20), checkpoint=checkpoint).move(src, dest, on_bytes)
+"""
+
+
+def resume_killed(paths, dest, size):
+    """Kills every copy halfway, then times the moves that finish them."""
+    checkpoint = max(size * 2**20 // 4, 2**16)
+    for path in paths:
+        target = os.path.join(dest, os.path.basename(path))
+        child = subprocess.run([sys.executable, "-c", KILLED_COPY, PROJECT, path, target, str(checkpoint)])
+        assert child.returncode == 9 and os.path.exists(path), "the copy was not killed halfway"
+    mover = CrossDeviceMover(verify=FULL)
+    seconds = move_all(paths, dest, mover.move)
+    # Everything up to the last checkpoint before the kill is kept, nothing after it
+    assert 0 < mover.bytes_resumed <= mover.bytes_copied, "the killed copies were started over"
+    return seconds, mover.bytes_copied / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--size", type=int, default=256, help="MiB per file")
+    parser.add_argument("--src", default=None, help="where the files are created (default: temp folder)")
+    parser.add_argument("--dest", default="/dev/shm", help="folder on another device")
+    args = parser.parse_args()
+
+    modes = [
+        ("shutil.move", lambda: shutil.move),
+        ("mover (sample)", lambda: CrossDeviceMover(verify=SAMPLE).move),
+        ("mover (full)", lambda: CrossDeviceMover(verify=FULL).move),
+        ("resume", resume_half),
+        ("resume after kill", resume_killed),
+    ]
+    total = args.files * args.size
+    print(f"{args.files} file(s) of {args.size} MiB, {args.src or tempfile.gettempdir()} -> {args.dest}")
+    print(f"{'mode':>17} {'seconds':>9} {'MiB/s':>9}")
+    for label, make_move in modes:
+        src = tempfile.mkdtemp(prefix="organizer_bench_src_", dir=args.src)
+        dest = tempfile.mkdtemp(prefix="organizer_bench_dest_", dir=args.dest)
+        try:
+            if os.stat(src).st_dev == os.stat(dest).st_dev:
+                sys.exit("--src and --dest are on the same device: nothing would be copied")
+            paths = make_files(src, args.files, args.size)
+            if make_move in (resume_half, resume_killed):
+                seconds, mib = make_move(paths, dest, args.size)
+            else:
+                seconds = move_all(paths, dest, make_move())
+                mib = total
+            assert not any(os.path.exists(path) for path in paths)
+            assert not [name for name in os.listdir(dest) if name.startswith(".")], "temporary files were left"
+            print(f"{label:>17} {seconds:>9.2f} {mib / seconds:>9.0f}")
+        finally:
+            shutil.rmtree(src, ignore_errors=True)
+            shutil.rmtree(dest, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
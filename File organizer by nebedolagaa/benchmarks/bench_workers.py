@@ -0,0 +1,56 @@
+"""
+Benchmark: sorting a synthetic folder of small files with 1, 4 and 16 workers.
+
+Run from the project folder:
+    python -m benchmarks.bench_workers [--files 50000] [--base /mnt/share/tmp]
+
+Point --base at a network mount or slow disk to see the effect of
+concurrent moves; on a local SSD the gain is much smaller.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organizer import FILE_CATEGORIES, Organizer
+
+WORKER_COUNTS = (1, 4, 16)
+
+
+def make_tree(folder, count):
+    """Creates count small files with extensions from every category (and unknown ones)."""
+    extensions = [ext for extensions in FILE_CATEGORIES.values() for ext in extensions]
+    extensions += [".log", ".csv", ""]
+    for i in range(count):
+        with open(os.path.join(folder, f"file_{i}{extensions[i % len(extensions)]}"), "wb") as f:
+            f.write(b"x" * 64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--base", default=None, help="where to create the synthetic folders")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'files':>8} {'seconds':>9} {'files/s':>10}")
+    for workers in WORKER_COUNTS:
+        folder = tempfile.mkdtemp(prefix="organizer_bench_", dir=args.base)
+        try:
+            make_tree(folder, args.files)
+            organizer = Organizer(folder, workers=workers)
+            start = time.perf_counter()
+            moved = len(organizer.sort())
+            elapsed = time.perf_counter() - start
+            assert moved == args.files
+            print(f"{workers:>8} {moved:>8} {elapsed:>9.2f} {moved / elapsed:>10.0f}")
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
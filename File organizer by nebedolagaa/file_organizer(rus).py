@@ -3,32 +3,39 @@ File Organizer на Python (tkinter) — сортировка файлов в в
 Работает под Python 3 на macOS без дополнительных библиотек.
 """
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
 import os
-import shutil
+import sys
 import threading
-import json
-from datetime import datetime
-
-# ---------------------- Настройка категорий файлов ----------------------
-# Словарь FILE_CATEGORIES: ключ — название категории/папки, значение — список расширений.
-FILE_CATEGORIES = {
-    "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"],
-    "Documents": [".pdf", ".doc", ".docx", ".txt", ".rtf", ".xls", ".xlsx", ".ppt", ".pptx"],
-    "Videos": [".mp4", ".mkv", ".avi", ".mov", ".flv"],
-    "Music": [".mp3", ".wav", ".aac", ".flac", ".ogg"],
-    "Archives": [".zip", ".rar", ".tar", ".gz", ".7z", ".dmg"],
-    # Прочие расширения попадут в раздел "Others"
-}
-# ------------------------------------------------------------------------
+
+try:
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+except ImportError:  # Сборки Python без Tk (серверы) — работает только CLI
+    tk = None
+
+# Движок сортировки и категории файлов — в пакете organizer (общий с английской версией).
+from organizer import (PROFILE_ENV, ContentSniffer, DateBucketer, DateCache, JobQueue, Profiler,
+                       Progress, SniffCache, default_date_cache_path, default_sniff_cache_path,
+                       load_rules, mark_undone, undo_operations)
 
 
 class FileOrganizerApp:
+    # Сколько файлов отмена возвращает одновременно (ускоряет работу на сетевых дисках)
+    UNDO_WORKERS = 4
+    # Как часто окно перерисовывает индикатор (~30 раз в секунду), сколько бы файлов ни было
+    POLL_INTERVAL_MS = 33
+    # Потоки, перемещающие файлы, общие для всех сортируемых папок
+    SORT_WORKERS = 4
+    # Сколько папок сортируется одновременно; остальные ждут в очереди (по одной папке на диск)
+    MAX_JOBS = 3
+    # Колонка состояния в списке заданий
+    STATUS_TEXT = {"queued": "В очереди", "running": "Сортировка", "finished": "Готово",
+                   "canceled": "Отменено", "failed": "Ошибка", "undone": "Возвращено"}
+
     def __init__(self, root):
         self.root = root
         root.title("File Organizer")
-        root.geometry("500x250")  # Размер окна (можно настроить)
+        root.geometry("500x470")  # Размер окна (можно настроить)
         root.resizable(False, False)
 
         try:
@@ -39,16 +46,32 @@ class FileOrganizerApp:
         except Exception as e:
             print(f"Не удалось загрузить иконку: {e}")
 
-        # Флаг для отмены сортировки
-        self.cancelled = False
-        
-        # Журнал операций с файлами для отмены
-        self.file_operations = []
-        self.has_operations = False
+        # Очередь сортировки: каждое нажатие «Сортировать» добавляет папку как задание
+        # (см. organizer/jobs.py); у каждого задания свой журнал рядом со скриптом и своя отмена
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.queue = JobQueue(workers=self.SORT_WORKERS, max_jobs=self.MAX_JOBS, log_dir=script_dir,
+                              journal_prefix="журнал_сортировки")
+        # Задания, добавленные с тех пор, как очередь опустела; итог по ним показывается вместе
+        self.batch = []
+        # Номера заданий, сортировка которых отменена, и задание, которое сейчас возвращается
+        self.undone = set()
+        self.undo_job = None
+        # Канал прогресса текущего восстановления: поток пишет, окно опрашивает
+        self.run_progress = None
+        # Анализатор содержимого живёт между запусками, а его результаты — на диске: повторная
+        # сортировка тех же файлов ничего не читает; создаётся при первом использовании
+        self.sniffer = None
+        # Папки по датам для фото и видео; создаётся при первом использовании, кэш хранится на диске
+        self.dates = None
 
         # Переменные интерфейса
         self.selected_folder = tk.StringVar()
         self.progress_var = tk.DoubleVar()
+        self.status_var = tk.StringVar()
+        self.recursive_var = tk.BooleanVar(value=False)
+        self.duplicates_var = tk.BooleanVar(value=False)
+        self.sniff_var = tk.BooleanVar(value=False)
+        self.dates_var = tk.BooleanVar(value=False)
 
         # Стилизация (тема)
         style = ttk.Style()
@@ -74,10 +97,44 @@ class FileOrganizerApp:
         entry_folder = ttk.Entry(select_frame, textvariable=self.selected_folder, state='readonly')
         entry_folder.pack(side="left", fill='x', expand=True, padx=(5, 0))
 
+        # Опции: сортировка вложенных папок, сбор одинаковых по содержимому копий
+        options_frame = ttk.Frame(self.root)
+        options_frame.pack(padx=10, fill='x')
+        chk_recursive = ttk.Checkbutton(options_frame, text="Включая вложенные папки", variable=self.recursive_var)
+        chk_recursive.pack(side="left")
+        chk_duplicates = ttk.Checkbutton(options_frame, text="Дубликаты в 'Duplicates'",
+                                         variable=self.duplicates_var)
+        chk_duplicates.pack(side="left", padx=(10, 0))
+        chk_sniff = ttk.Checkbutton(self.root, text="Определять тип по содержимому (файлы без расширения или с неверным)",
+                                    variable=self.sniff_var)
+        chk_sniff.pack(padx=10, anchor='w')
+        chk_dates = ttk.Checkbutton(self.root, text="Раскладывать фото и видео по дате съёмки (Images/2024/05)",
+                                    variable=self.dates_var)
+        chk_dates.pack(padx=10, anchor='w')
+
+        # Список заданий: строка на каждую папку, добавленную «Сортировать»; выделите строки,
+        # чтобы отменить их сортировку или вернуть файлы
+        jobs_frame = ttk.Frame(self.root)
+        jobs_frame.pack(fill='x', padx=10, pady=(10, 0))
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=("folder", "status", "files"),
+                                      show='headings', height=4)
+        self.jobs_tree.heading("folder", text="Папка")
+        self.jobs_tree.heading("status", text="Состояние")
+        self.jobs_tree.heading("files", text="Файлов")
+        self.jobs_tree.column("folder", width=290)
+        self.jobs_tree.column("status", width=90, stretch=False)
+        self.jobs_tree.column("files", width=70, stretch=False, anchor='e')
+        scrollbar = ttk.Scrollbar(jobs_frame, orient='vertical', command=self.jobs_tree.yview)
+        self.jobs_tree.configure(yscrollcommand=scrollbar.set)
+        self.jobs_tree.pack(side="left", fill='x', expand=True)
+        scrollbar.pack(side="left", fill='y')
+
         # ProgressBar
         self.progress = ttk.Progressbar(self.root, orient='horizontal', mode='determinate',
                                         variable=self.progress_var, maximum=100)
-        self.progress.pack(fill='x', padx=10, pady=10)
+        self.progress.pack(fill='x', padx=10, pady=(10, 0))
+        status = ttk.Label(self.root, textvariable=self.status_var, font=("Helvetica", 8))
+        status.pack(fill='x', padx=10)
 
         # Кнопки «Сортировать» и «Отменить»
         btn_frame = ttk.Frame(self.root)
@@ -102,118 +159,217 @@ class FileOrganizerApp:
             self.selected_folder.set(folder)
 
     def start_sorting(self):
-        """Запускает процесс сортировки файлов в отдельном потоке."""
+        """Добавляет выбранную папку в очередь сортировки; она сортируется в фоне."""
         folder = self.selected_folder.get()
         if not folder or not os.path.isdir(folder):
             messagebox.showwarning("Предупреждение", "Сначала выберите корректную папку.")
             return
 
-        # Готовим список файлов (только файлы, без директорий)
-        self.files_to_sort = [f for f in os.listdir(folder)
-                              if os.path.isfile(os.path.join(folder, f))]
-        total = len(self.files_to_sort)
-        if total == 0:
-            messagebox.showinfo("Информация", "В папке нет файлов для сортировки.")
-            return
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        # Пользовательские правила (rules.json рядом со скриптом) перечитываются при каждом запуске
+        rules = None
+        rules_path = os.path.join(script_dir, "rules.json")
+        if os.path.exists(rules_path):
+            try:
+                rules = load_rules(rules_path)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Ошибка", f"Не удалось загрузить правила {rules_path}:\n{e}")
+                return
+        # Профилирование по желанию: FILE_ORGANIZER_PROFILE=<файл> сохраняет статистику cProfile каждой сортировки,
+        # по файлу на задание (sort_<задание>.prof); cProfile работает только в одном задании за раз
+        profile_path = os.environ.get(PROFILE_ENV)
+        profiler = None
+        if profile_path:
+            root, ext = os.path.splitext(profile_path)
+            # Задания добавляются только отсюда, поэтому номер следующего известен
+            profiler = Profiler(f"{root}_{len(self.queue.jobs) + 1}{ext}")
 
-        # Блокируем кнопку «Сортировать» и активируем «Отменить»
-        self.btn_sort.config(state='disabled')
+        # Настройки под именами командной строки — для --resume по журналу задания
+        run_options = {"recursive": self.recursive_var.get(), "find_duplicates": self.duplicates_var.get(),
+                       "sniff": self.sniff_var.get(), "rules": rules_path if rules is not None else "",
+                       "by_date": "month" if self.dates_var.get() else None, "exif": self.dates_var.get()}
+
+        # Каждое перемещение дописывается в журнал задания на диске ещё до того, как сделано: даже
+        # после сбоя посреди сортировки его можно отменить (python -m file_organizer --undo <журнал>)
+        # или продолжить с теми же настройками (python -m file_organizer --resume <журнал>).
+        # Файлы перечисляет собственный поток задания (потоковый os.scandir),
+        # поэтому окно не зависает на огромных папках
+        job = self.queue.submit(folder, profiler=profiler, run_options=run_options,
+                                recursive=self.recursive_var.get(),
+                                find_duplicates=self.duplicates_var.get(),
+                                sniffer=self._sniffer() if self.sniff_var.get() else None,
+                                rules=rules,
+                                dates=self._date_bucketer() if self.dates_var.get() else None,
+                                timer=profiler.timer if profiler else None)
+        self.batch.append(job)
+        self.jobs_tree.insert('', 'end', iid=str(job.number), values=(folder, "", 0))
+        self._update_row(job)
+
+        # «Сортировать» остаётся доступной, чтобы добавить ещё папки; возврат ждёт, пока очередь опустеет
         self.btn_cancel.config(state='enabled')
         self.btn_undo.config(state='disabled')
-        self.progress_var.set(0)
-        self.cancelled = False
-        
-        # Очищаем предыдущий журнал операций
-        self.file_operations = []
-
-        # Запускаем фоновую сортировку в потоке
-        threading.Thread(target=self._sort_files_thread, args=(folder,), daemon=True).start()
-
-    def _sort_files_thread(self, folder):
-        """Фоновая функция: сортирует файлы и обновляет ProgressBar."""
-        total = len(self.files_to_sort)
-        done = 0
-
-        for filename in self.files_to_sort:
-            if self.cancelled:
-                break
-
-            src_path = os.path.join(folder, filename)
-            moved = False
-            # Определяем категорию по расширению
-            ext = os.path.splitext(filename)[1].lower()
-            for category, extensions in FILE_CATEGORIES.items():
-                if ext in extensions:
-                    dest_dir = os.path.join(folder, category)
-                    os.makedirs(dest_dir, exist_ok=True)  # Создать папку, если нужно
-                    dest_path = os.path.join(dest_dir, filename)
-                    shutil.move(src_path, dest_path)  # Переместить файл
-                    
-                    # Записываем операцию для функции отмены
-                    self.file_operations.append({
-                        'source': src_path,
-                        'destination': dest_path
-                    })
-                    
-                    moved = True
-                    break
-            # Если в ни одной категории не попал — в Others
-            if not moved:
-                other_dir = os.path.join(folder, "Others")
-                os.makedirs(other_dir, exist_ok=True)
-                dest_path = os.path.join(other_dir, filename)
-                shutil.move(src_path, dest_path)
-                
-                # Записываем операцию для функции отмены
-                self.file_operations.append({
-                    'source': src_path,
-                    'destination': dest_path
-                })
-
-            done += 1
-            # Обновляем индикатор (через главную нить)
-            progress_percent = done / total * 100
-            self.root.after(0, self.progress_var.set, progress_percent)
-        
-        # Сохраняем операции в файл для возможного восстановления в будущем
-        if not self.cancelled and self.file_operations:
+        if len(self.batch) == 1:
+            self.progress_var.set(0)
+            self._poll_jobs()
+
+    def _date_bucketer(self):
+        """Возвращает раскладку по датам: даты съёмки (Exif) кэшируются между запусками."""
+        if self.dates is None:
+            try:
+                cache = DateCache(default_date_cache_path())
+            except Exception as e:
+                # Без кэша даты всё равно читаются, только заново при каждом запуске
+                print(f"Не удалось открыть кэш дат: {e}")
+                cache = None
+            self.dates = DateBucketer(embedded=True, cache=cache)
+        return self.dates
+
+    def _sniffer(self):
+        """Возвращает анализатор содержимого: его результаты кэшируются между запусками."""
+        if self.sniffer is None:
             try:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                log_path = os.path.join(script_dir, f"журнал_сортировки_{timestamp}.json")
-                
-                with open(log_path, 'w', encoding='utf-8') as log_file:
-                    json.dump(self.file_operations, log_file, ensure_ascii=False)
+                cache = SniffCache(default_sniff_cache_path())
             except Exception as e:
-                print(f"Не удалось сохранить журнал операций: {e}")
+                # Без кэша заголовки всё равно читаются, только заново при каждом запуске
+                print(f"Не удалось открыть кэш анализа содержимого: {e}")
+                cache = None
+            self.sniffer = ContentSniffer(cache=cache)
+        return self.sniffer
+
+    def _selected_jobs(self):
+        """Задания выделенных строк списка."""
+        return [self.queue.jobs[int(iid) - 1] for iid in self.jobs_tree.selection()]
+
+    def _update_row(self, job):
+        status = "undone" if job.number in self.undone else job.status
+        self.jobs_tree.set(str(job.number), "status", self.STATUS_TEXT[status])
+        self.jobs_tree.set(str(job.number), "files", job.progress.done)
+
+    def _poll_jobs(self):
+        """Обновляет список заданий, индикатор и строку состояния (~30 раз в секунду), пока очередь не опустеет."""
+        for job in self.batch:
+            self._update_row(job)
+        if all(job.done for job in self.batch):
+            self._finish_sorting()
+            return
+        # Индикатор следит за выделенным заданием, пока оно идёт, иначе за последним запущенным
+        running = [job for job in self._selected_jobs() + self.batch[::-1] if job.status == "running"]
+        if running:
+            self._show_progress(running[0].progress.snapshot())
+        self.root.after(self.POLL_INTERVAL_MS, self._poll_jobs)
+
+    def _show_progress(self, snapshot):
+        """Перерисовывает индикатор и строку состояния по снимку прогресса."""
+        if snapshot.total:
+            # Общее число известно (после полного сканирования): индикатор показывает долю
+            if str(self.progress.cget('mode')) == 'indeterminate':
+                self.progress.stop()
+                self.progress.config(mode='determinate')
+            self.progress_var.set(snapshot.done / snapshot.total * 100)
+        elif str(self.progress.cget('mode')) == 'determinate':
+            # Пока папка читается потоком, общее число неизвестно: индикатор только показывает активность
+            self.progress.config(mode='indeterminate')
+            self.progress.start(10)
+        if snapshot.done:
+            self.status_var.set(self._describe(snapshot))
+
+    def _poll_progress(self, progress):
+        """Перерисовывает индикатор и строку состояния по каналу прогресса восстановления."""
+        if progress is not self.run_progress:
+            return  # запуск завершён (или опрос ведёт более новый)
+        self._show_progress(progress.snapshot())
+        self.root.after(self.POLL_INTERVAL_MS, self._poll_progress, progress)
 
-        # После завершения (или отмены) вернуть кнопки в исходное состояние
-        self.root.after(0, self._finish_sorting)
+    @staticmethod
+    def _describe(snapshot):
+        """Строка состояния: сколько файлов готово, скорость, оставшееся время, текущий файл."""
+        text = f"{snapshot.done} из {snapshot.total}" if snapshot.total else f"{snapshot.done}"
+        text += f" файлов, {snapshot.files_per_second:.0f} файл/с"
+        if snapshot.bytes_done:
+            text += f", {snapshot.bytes_per_second / 2**20:.1f} МиБ/с"
+        if snapshot.eta is not None:
+            minutes, seconds = divmod(int(snapshot.eta), 60)
+            text += f", осталось {minutes}:{seconds:02d}"
+        if snapshot.current:
+            text += f" - {os.path.basename(snapshot.current)}"
+        return text
 
     def cancel_sorting(self):
-        """Устанавливает флаг отмены сортировки."""
-        self.cancelled = True
-        self.btn_cancel.config(state='disabled')
+        """Отменяет выделенные задания, а если ничего не выделено — все."""
+        selected = self._selected_jobs()
+        # Если выделены только завершённые задания, ничего не отменяется
+        jobs = [job for job in selected if not job.done] if selected else self.queue.active
+        for job in jobs:
+            job.cancel()
 
     def _finish_sorting(self):
-        """Сброс интерфейса после завершения."""
-        if self.cancelled:
-            messagebox.showinfo("Отменено", "Сортировка была отменена.")
+        """Показывает итог заданий и сбрасывает интерфейс, когда очередь опустела."""
+        jobs, self.batch = self.batch, []
+        self.status_var.set("")
+        for job in jobs:
+            if job.profiler is not None:
+                print(f"Задание {job.number}, {job.folder}:")
+                print(job.profiler.timer.report())
+                if job.profiler.profiled:
+                    print(f"Профиль сохранён в {job.profiler.path}")
+                else:
+                    print("Статистики cProfile нет: профилировалось другое задание")
+            if job.error is not None:
+                print(f"Сортировка {job.folder} не удалась: {job.error}")
+        if len(jobs) == 1:
+            self._report_job(jobs[0])
         else:
-            messagebox.showinfo("Готово", "Сортировка завершена успешно.")
-        
-        self.btn_sort.config(state='enabled')
+            moved = sum(job.organizer.moved for job in jobs if job.organizer is not None)
+            finished = sum(job.status == "finished" for job in jobs)
+            message = f"Отсортировано папок: {finished} из {len(jobs)}, перемещено файлов: {moved}."
+            if finished < len(jobs):
+                message += ("\nОстальные папки отменены или завершились с ошибкой "
+                            "(см. список заданий и консоль).")
+            messagebox.showinfo("Готово", message)
+
         self.btn_cancel.config(state='disabled')
+        self.progress.stop()
+        self.progress.config(mode='determinate')
         self.progress_var.set(0)
-        
+
         # Активируем кнопку отмены сортировки, если были выполнены операции
-        if self.file_operations:
+        if self._undo_candidate() is not None:
             self.btn_undo.config(state='enabled')
-            self.has_operations = True
+
+    def _report_job(self, job):
+        """Показывает, как прошла сортировка одной папки."""
+        if job.status == "failed":
+            messagebox.showerror("Ошибка", f"Сортировка не удалась:\n{job.error}")
+            return
+        stats = job.organizer.stats
+        left_in_place = stats.skipped + stats.duplicates
+        if job.status == "canceled":
+            messagebox.showinfo("Отменено", "Сортировка была отменена.")
+        elif not job.organizer.moved and not left_in_place:
+            messagebox.showinfo("Информация", "В папке нет файлов для сортировки.")
+        else:
+            message = "Сортировка завершена успешно."
+            if stats.cross_device:
+                # Перемещение между устройствами — это копирование; сообщаем об этом явно
+                message += (f"\nФайлов на другом устройстве (скопировано): {stats.cross_device} "
+                            f"({stats.bytes_copied / 2**20:.1f} МиБ).")
+            if left_in_place:
+                message += (f"\nОставлено на месте файлов: {left_in_place} "
+                            f"(в папке категории уже есть файл с таким именем).")
+            messagebox.showinfo("Готово", message)
+
+    def _undo_candidate(self, jobs=None):
+        """Задание для возврата файлов: первое из jobs (по умолчанию от новых к старым), которое что-то переместило."""
+        for job in jobs if jobs is not None else self.queue.jobs[::-1]:
+            if (job.done and job.number not in self.undone and job.organizer is not None
+                    and job.organizer.file_operations):
+                return job
+        return None
 
     def undo_sorting(self):
-        """Возвращает файлы в их исходное местоположение."""
-        if not self.file_operations:
+        """Возвращает файлы выделенного задания (или последнего отсортированного) в исходное местоположение."""
+        self.undo_job = self._undo_candidate(self._selected_jobs() or None)
+        if self.undo_job is None:
             messagebox.showinfo("Информация", "Нет операций для отмены.")
             return
             
@@ -223,55 +379,60 @@ class FileOrganizerApp:
         self.progress_var.set(0)
         
         # Запускаем фоновый процесс восстановления в отдельном потоке
+        self.run_progress = Progress()
         threading.Thread(target=self._undo_files_thread, daemon=True).start()
+        self._poll_progress(self.run_progress)
 
     def _undo_files_thread(self):
         """Фоновая функция: перемещает файлы обратно в их исходное положение."""
-        total = len(self.file_operations)
-        done = 0
-        
-        # Разворачиваем операции, чтобы отменять в обратном порядке
-        reversed_ops = self.file_operations[::-1]
-        
-        for operation in reversed_ops:
-            try:
-                source_path = operation['source']
-                dest_path = operation['destination']
-                
-                # Проверяем, существует ли файл в месте назначения
-                if os.path.exists(dest_path):
-                    # Убедимся, что исходная директория существует
-                    source_dir = os.path.dirname(source_path)
-                    if not os.path.exists(source_dir):
-                        os.makedirs(source_dir, exist_ok=True)
-                        
-                    # Перемещаем файл обратно в исходное место
-                    shutil.move(dest_path, source_path)
-                
-                done += 1
-                # Обновляем прогресс
-                progress_percent = done / total * 100
-                self.root.after(0, self.progress_var.set, progress_percent)
-                
-            except Exception as e:
-                print(f"Ошибка при восстановлении: {e}")
-        
-        # Очищаем операции после восстановления
-        self.file_operations = []
-        self.has_operations = False
-        
+        job = self.undo_job
+        report = undo_operations(job.organizer.file_operations, progress=self.run_progress,
+                                 workers=self.UNDO_WORKERS)
+        for operation, reason in report.conflicts:
+            print(f"Конфликт при восстановлении: {operation['destination']}: {reason}")
+        for operation, e in report.errors:
+            print(f"Ошибка при восстановлении: {operation['destination']}: {e}")
+        # При конфликтах журнал можно отменить снова из командной строки, когда они будут исправлены
+        if report.complete and os.path.exists(job.journal.path):
+            mark_undone(job.journal.path)
+
+        # Операции задания не возвращаются дважды
+        self.undone.add(job.number)
+
         # Сбрасываем интерфейс
-        self.root.after(0, self._finish_undo)
+        self.root.after(0, self._finish_undo, report)
 
-    def _finish_undo(self):
+    def _finish_undo(self, report):
         """Сбрасывает интерфейс после операции восстановления."""
-        messagebox.showinfo("Готово", "Файлы восстановлены в исходные местоположения.")
+        self.run_progress = None
+        self.status_var.set("")
+        self._update_row(self.undo_job)
+        if report.skipped or not report.complete:
+            message = f"Восстановлено файлов: {report.restored} из {report.total}."
+            if report.skipped:
+                message += f"\nУже не было в папках сортировки: {len(report.skipped)}."
+            if report.conflicts:
+                message += (f"\nОставлено на месте (изменены после сортировки или исходное место "
+                            f"занято): {len(report.conflicts)}.")
+            if report.errors:
+                message += f"\nНе удалось вернуть (подробности в консоли): {len(report.errors)}."
+            messagebox.showwarning("Восстановление завершено с проблемами", message)
+        else:
+            messagebox.showinfo("Готово", "Файлы восстановлены в исходные местоположения.")
         self.btn_sort.config(state='enabled')
-        self.btn_undo.config(state='disabled')
+        # Более ранние сортировки тоже можно вернуть, от новых к старым
+        self.btn_undo.config(state='enabled' if self._undo_candidate() is not None else 'disabled')
+        self.progress.stop()
+        self.progress.config(mode='determinate')
         self.progress_var.set(0)
 
 
 if __name__ == "__main__":
+    # Любые аргументы командной строки (--dir, --dry-run и т.д.) запускают сортировку без GUI
+    if len(sys.argv) > 1 or tk is None:
+        from organizer.cli import main
+        sys.exit(main())
+
     root = tk.Tk()
     app = FileOrganizerApp(root)
     root.mainloop()
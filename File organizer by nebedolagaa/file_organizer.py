@@ -3,32 +3,39 @@ File Organizer in Python (tkinter) — sorting files in a selected folder by cat
 Works with Python 3 on macOS without additional libraries.
 """
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
 import os
-import shutil
+import sys
 import threading
-import json
-from datetime import datetime
-
-# ---------------------- File categories configuration ----------------------
-# FILE_CATEGORIES dictionary: key — category/folder name, value — list of extensions.
-FILE_CATEGORIES = {
-    "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"],
-    "Documents": [".pdf", ".doc", ".docx", ".txt", ".rtf", ".xls", ".xlsx", ".ppt", ".pptx"],
-    "Videos": [".mp4", ".mkv", ".avi", ".mov", ".flv"],
-    "Music": [".mp3", ".wav", ".aac", ".flac", ".ogg"],
-    "Archives": [".zip", ".rar", ".tar", ".gz", ".7z", ".dmg"],
-    # Other extensions will go to "Others" section
-}
-# ------------------------------------------------------------------------
+
+try:
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+except ImportError:  # Headless Python builds ship without Tk; the CLI still works
+    tk = None
+
+# Sorting engine and file categories live in the organizer package (shared with the Russian version).
+from organizer import (PROFILE_ENV, ContentSniffer, DateBucketer, DateCache, JobQueue, Profiler,
+                       Progress, SniffCache, default_date_cache_path, default_sniff_cache_path,
+                       format_progress, load_rules, mark_undone, undo_operations)
 
 
 class FileOrganizerApp:
+    # Files moved back at a time by undo (helps on network drives)
+    UNDO_WORKERS = 4
+    # How often the window redraws the progress (~30 times a second), however many files there are
+    POLL_INTERVAL_MS = 33
+    # Threads moving files, shared by all folders being sorted
+    SORT_WORKERS = 4
+    # Folders sorted at once; the others wait in the queue (one folder per disk at a time)
+    MAX_JOBS = 3
+    # Status column of the job list
+    STATUS_TEXT = {"queued": "Queued", "running": "Sorting", "finished": "Done",
+                   "canceled": "Canceled", "failed": "Failed", "undone": "Undone"}
+
     def __init__(self, root):
         self.root = root
         root.title("File Organizer")
-        root.geometry("500x300")  # Increased height for undo button
+        root.geometry("500x520")  # Increased height for undo button, subfolders option and job list
         root.resizable(False, False)
 
         try:
@@ -40,16 +47,31 @@ class FileOrganizerApp:
         except Exception as e:
             print(f"Could not load icon: {e}")
 
-        # Flag for canceling sorting
-        self.cancelled = False
-        
-        # Log of file operations for undo feature
-        self.file_operations = []
-        self.has_operations = False
+        # Sorting queue: every "Sort" adds the folder as a job (see organizer/jobs.py); each job
+        # writes its own journal next to this script and can be canceled on its own
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.queue = JobQueue(workers=self.SORT_WORKERS, max_jobs=self.MAX_JOBS, log_dir=script_dir)
+        # Jobs submitted since the queue was last empty; reported together when all are over
+        self.batch = []
+        # Numbers of the jobs whose sort was undone, and the job being undone
+        self.undone = set()
+        self.undo_job = None
+        # Progress channel of the running undo: the thread writes, the window polls
+        self.run_progress = None
+        # Content sniffer is kept between runs and its results on disk: re-sorting the same files
+        # costs no reads; created on first use
+        self.sniffer = None
+        # Date folders for photos and videos; created on first use, its cache lives on disk
+        self.dates = None
 
         # Interface variables
         self.selected_folder = tk.StringVar()
         self.progress_var = tk.DoubleVar()
+        self.status_var = tk.StringVar()
+        self.recursive_var = tk.BooleanVar(value=False)
+        self.duplicates_var = tk.BooleanVar(value=False)
+        self.sniff_var = tk.BooleanVar(value=False)
+        self.dates_var = tk.BooleanVar(value=False)
 
         # Styling (theme)
         style = ttk.Style()
@@ -75,10 +97,43 @@ class FileOrganizerApp:
         entry_folder = ttk.Entry(select_frame, textvariable=self.selected_folder, state='readonly')
         entry_folder.pack(side="left", fill='x', expand=True, padx=(5, 0))
 
+        # Options: organize nested folders too, collect byte-identical copies
+        options_frame = ttk.Frame(self.root)
+        options_frame.pack(padx=10, fill='x')
+        chk_recursive = ttk.Checkbutton(options_frame, text="Include subfolders", variable=self.recursive_var)
+        chk_recursive.pack(side="left")
+        chk_duplicates = ttk.Checkbutton(options_frame, text="Move duplicates to 'Duplicates'",
+                                         variable=self.duplicates_var)
+        chk_duplicates.pack(side="left", padx=(10, 0))
+        chk_sniff = ttk.Checkbutton(self.root, text="Detect file type by content (files without or with wrong extension)",
+                                    variable=self.sniff_var)
+        chk_sniff.pack(padx=10, anchor='w')
+        chk_dates = ttk.Checkbutton(self.root, text="Split photos and videos by date taken (Images/2024/05)",
+                                    variable=self.dates_var)
+        chk_dates.pack(padx=10, anchor='w')
+
+        # Job list: one row per folder added with "Sort"; select rows to cancel or undo them
+        jobs_frame = ttk.Frame(self.root)
+        jobs_frame.pack(fill='x', padx=10, pady=(10, 0))
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=("folder", "status", "files"),
+                                      show='headings', height=4)
+        self.jobs_tree.heading("folder", text="Folder")
+        self.jobs_tree.heading("status", text="Status")
+        self.jobs_tree.heading("files", text="Files")
+        self.jobs_tree.column("folder", width=300)
+        self.jobs_tree.column("status", width=80, stretch=False)
+        self.jobs_tree.column("files", width=70, stretch=False, anchor='e')
+        scrollbar = ttk.Scrollbar(jobs_frame, orient='vertical', command=self.jobs_tree.yview)
+        self.jobs_tree.configure(yscrollcommand=scrollbar.set)
+        self.jobs_tree.pack(side="left", fill='x', expand=True)
+        scrollbar.pack(side="left", fill='y')
+
         # ProgressBar
         self.progress = ttk.Progressbar(self.root, orient='horizontal', mode='determinate',
                                         variable=self.progress_var, maximum=100)
-        self.progress.pack(fill='x', padx=10, pady=10)
+        self.progress.pack(fill='x', padx=10, pady=(10, 0))
+        status = ttk.Label(self.root, textvariable=self.status_var, font=("Helvetica", 8))
+        status.pack(fill='x', padx=10)
 
         # "Sort" and "Cancel" buttons
         btn_frame = ttk.Frame(self.root)
@@ -103,119 +158,203 @@ class FileOrganizerApp:
             self.selected_folder.set(folder)
 
     def start_sorting(self):
-        """Starts the file sorting process in a separate thread."""
+        """Adds the selected folder to the sorting queue; it is sorted in the background."""
         folder = self.selected_folder.get()
         if not folder or not os.path.isdir(folder):
             messagebox.showwarning("Warning", "Please select a valid folder first.")
             return
 
-        # Prepare list of files (files only, no directories)
-        self.files_to_sort = [f for f in os.listdir(folder)
-                              if os.path.isfile(os.path.join(folder, f))]
-        total = len(self.files_to_sort)
-        if total == 0:
-            messagebox.showinfo("Information", "No files to sort in the folder.")
-            return
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        # User rules (rules.json next to this script) are re-read on every run
+        rules = None
+        rules_path = os.path.join(script_dir, "rules.json")
+        if os.path.exists(rules_path):
+            try:
+                rules = load_rules(rules_path)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"Could not load rules from {rules_path}:\n{e}")
+                return
+        # Opt-in profiling: FILE_ORGANIZER_PROFILE=<file> writes cProfile stats of every sort,
+        # one file per job (sort_<job>.prof); only one job at a time runs cProfile
+        profile_path = os.environ.get(PROFILE_ENV)
+        profiler = None
+        if profile_path:
+            root, ext = os.path.splitext(profile_path)
+            # Jobs are only submitted from here, so the next job number is known
+            profiler = Profiler(f"{root}_{len(self.queue.jobs) + 1}{ext}")
 
-        # Disable "Sort" button and enable "Cancel"
-        self.btn_sort.config(state='disabled')
+        # The options as the command line names them, for --resume of the job's journal
+        run_options = {"recursive": self.recursive_var.get(), "find_duplicates": self.duplicates_var.get(),
+                       "sniff": self.sniff_var.get(), "rules": rules_path if rules is not None else "",
+                       "by_date": "month" if self.dates_var.get() else None, "exif": self.dates_var.get()}
+
+        # Every move is appended to the job's on-disk journal before it is made, so even a run
+        # that crashes halfway can be undone (python -m file_organizer --undo <journal>) or
+        # continued with the same options (python -m file_organizer --resume <journal>).
+        # Files are listed by the job's own thread (streaming os.scandir),
+        # so the window does not freeze on huge folders
+        job = self.queue.submit(folder, profiler=profiler, run_options=run_options,
+                                recursive=self.recursive_var.get(),
+                                find_duplicates=self.duplicates_var.get(),
+                                sniffer=self._sniffer() if self.sniff_var.get() else None,
+                                rules=rules,
+                                dates=self._date_bucketer() if self.dates_var.get() else None,
+                                timer=profiler.timer if profiler else None)
+        self.batch.append(job)
+        self.jobs_tree.insert('', 'end', iid=str(job.number), values=(folder, "", 0))
+        self._update_row(job)
+
+        # "Sort" stays enabled to queue more folders; undo waits until the queue is empty
         self.btn_cancel.config(state='enabled')
         self.btn_undo.config(state='disabled')
-        self.progress_var.set(0)
-        self.cancelled = False
-        
-        # Clear previous operations log
-        self.file_operations = []
-
-        # Start background sorting in a thread
-        threading.Thread(target=self._sort_files_thread, args=(folder,), daemon=True).start()
-
-    def _sort_files_thread(self, folder):
-        """Background function: sorts files and updates the ProgressBar."""
-        total = len(self.files_to_sort)
-        done = 0
-
-        for filename in self.files_to_sort:
-            if self.cancelled:
-                break
-
-            src_path = os.path.join(folder, filename)
-            moved = False
-            # Determine category by extension
-            ext = os.path.splitext(filename)[1].lower()
-            for category, extensions in FILE_CATEGORIES.items():
-                if ext in extensions:
-                    dest_dir = os.path.join(folder, category)
-                    os.makedirs(dest_dir, exist_ok=True)  # Create folder if needed
-                    dest_path = os.path.join(dest_dir, filename)
-                    shutil.move(src_path, dest_path)  # Move the file
-                    
-                    # Log the operation for undo feature
-                    self.file_operations.append({
-                        'source': src_path,
-                        'destination': dest_path
-                    })
-                    
-                    moved = True
-                    break
-                    
-            # If file doesn't match any category — move to Others
-            if not moved:
-                other_dir = os.path.join(folder, "Others")
-                os.makedirs(other_dir, exist_ok=True)
-                dest_path = os.path.join(other_dir, filename)
-                shutil.move(src_path, dest_path)
-                
-                # Log the operation for undo feature
-                self.file_operations.append({
-                    'source': src_path,
-                    'destination': dest_path
-                })
-
-            done += 1
-            # Update indicator (through the main thread)
-            progress_percent = done / total * 100
-            self.root.after(0, self.progress_var.set, progress_percent)
-        
-        # Save operations to file for potential future recovery
-        if not self.cancelled and self.file_operations:
+        if len(self.batch) == 1:
+            self.progress_var.set(0)
+            self._poll_jobs()
+
+    def _date_bucketer(self):
+        """Returns the date bucketer, reading capture dates (Exif) cached between runs."""
+        if self.dates is None:
+            try:
+                cache = DateCache(default_date_cache_path())
+            except Exception as e:
+                # Without the cache dates are still read, just again on every run
+                print(f"Could not open date cache: {e}")
+                cache = None
+            self.dates = DateBucketer(embedded=True, cache=cache)
+        return self.dates
+
+    def _sniffer(self):
+        """Returns the content sniffer, its results cached between runs."""
+        if self.sniffer is None:
             try:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                log_path = os.path.join(script_dir, f"sort_log_{timestamp}.json")
-                
-                with open(log_path, 'w') as log_file:
-                    json.dump(self.file_operations, log_file)
+                cache = SniffCache(default_sniff_cache_path())
             except Exception as e:
-                print(f"Could not save operations log: {e}")
+                # Without the cache headers are still read, just again on every run
+                print(f"Could not open sniff cache: {e}")
+                cache = None
+            self.sniffer = ContentSniffer(cache=cache)
+        return self.sniffer
+
+    def _selected_jobs(self):
+        """Jobs of the rows selected in the job list."""
+        return [self.queue.jobs[int(iid) - 1] for iid in self.jobs_tree.selection()]
+
+    def _update_row(self, job):
+        status = "undone" if job.number in self.undone else job.status
+        self.jobs_tree.set(str(job.number), "status", self.STATUS_TEXT[status])
+        self.jobs_tree.set(str(job.number), "files", job.progress.done)
+
+    def _poll_jobs(self):
+        """Updates the job list, the bar and the status line (~30 times a second) until the queue is empty."""
+        for job in self.batch:
+            self._update_row(job)
+        if all(job.done for job in self.batch):
+            self._finish_sorting()
+            return
+        # The bar follows the selected job while it runs, otherwise the newest running one
+        running = [job for job in self._selected_jobs() + self.batch[::-1] if job.status == "running"]
+        if running:
+            self._show_progress(running[0].progress.snapshot())
+        self.root.after(self.POLL_INTERVAL_MS, self._poll_jobs)
+
+    def _show_progress(self, snapshot):
+        """Redraws the bar and the status line from a progress snapshot."""
+        if snapshot.total:
+            # Total is known (after a full scan): the bar shows the share done
+            if str(self.progress.cget('mode')) == 'indeterminate':
+                self.progress.stop()
+                self.progress.config(mode='determinate')
+            self.progress_var.set(snapshot.done / snapshot.total * 100)
+        elif str(self.progress.cget('mode')) == 'determinate':
+            # Total is unknown while the folder is streamed, so the bar only shows activity
+            self.progress.config(mode='indeterminate')
+            self.progress.start(10)
+        if snapshot.done:
+            self.status_var.set(format_progress(snapshot))
 
-        # After completion (or cancellation) return buttons to initial state
-        self.root.after(0, self._finish_sorting)
+    def _poll_progress(self, progress):
+        """Redraws the bar and the status line from the progress channel of the undo."""
+        if progress is not self.run_progress:
+            return  # the run is over (or a newer one polls itself)
+        self._show_progress(progress.snapshot())
+        self.root.after(self.POLL_INTERVAL_MS, self._poll_progress, progress)
 
     def cancel_sorting(self):
-        """Sets the flag to cancel sorting."""
-        self.cancelled = True
-        self.btn_cancel.config(state='disabled')
+        """Cancels the selected jobs, or all of them when none is selected."""
+        selected = self._selected_jobs()
+        # A selection of finished jobs only cancels nothing, not everything
+        jobs = [job for job in selected if not job.done] if selected else self.queue.active
+        for job in jobs:
+            job.cancel()
 
     def _finish_sorting(self):
-        """Reset interface after completion."""
-        if self.cancelled:
-            messagebox.showinfo("Canceled", "Sorting was canceled.")
+        """Reports the jobs of the batch and resets the interface once the queue is empty."""
+        jobs, self.batch = self.batch, []
+        self.status_var.set("")
+        for job in jobs:
+            if job.profiler is not None:
+                print(f"Job {job.number}, {job.folder}:")
+                print(job.profiler.timer.report())
+                if job.profiler.profiled:
+                    print(f"Profile written to {job.profiler.path}")
+                else:
+                    print("No cProfile stats: another job was being profiled")
+            if job.error is not None:
+                print(f"Sorting {job.folder} failed: {job.error}")
+        if len(jobs) == 1:
+            self._report_job(jobs[0])
         else:
-            messagebox.showinfo("Done", "Sorting completed successfully.")
-        
-        self.btn_sort.config(state='enabled')
+            moved = sum(job.organizer.moved for job in jobs if job.organizer is not None)
+            finished = sum(job.status == "finished" for job in jobs)
+            message = f"Sorted {finished} of {len(jobs)} folders, {moved} file(s) moved."
+            if finished < len(jobs):
+                message += ("\nThe other folders were canceled or failed "
+                            "(see the job list and the console).")
+            messagebox.showinfo("Done", message)
+
         self.btn_cancel.config(state='disabled')
+        self.progress.stop()
+        self.progress.config(mode='determinate')
         self.progress_var.set(0)
-        
+
         # Enable undo button if operations were performed
-        if self.file_operations:
+        if self._undo_candidate() is not None:
             self.btn_undo.config(state='enabled')
-            self.has_operations = True
+
+    def _report_job(self, job):
+        """Shows how the sort of a single folder went."""
+        if job.status == "failed":
+            messagebox.showerror("Error", f"Sorting failed:\n{job.error}")
+            return
+        stats = job.organizer.stats
+        left_in_place = stats.skipped + stats.duplicates
+        if job.status == "canceled":
+            messagebox.showinfo("Canceled", "Sorting was canceled.")
+        elif not job.organizer.moved and not left_in_place:
+            messagebox.showinfo("Information", "No files to sort in the folder.")
+        else:
+            message = "Sorting completed successfully."
+            if stats.cross_device:
+                # Moves across devices are copies; say so instead of silently taking minutes
+                message += (f"\n{stats.cross_device} file(s) were on another device and had to be "
+                            f"copied ({stats.bytes_copied / 2**20:.1f} MiB).")
+            if left_in_place:
+                message += (f"\n{left_in_place} file(s) were left in place: the category folder "
+                            f"already has a file with the same name.")
+            messagebox.showinfo("Done", message)
+
+    def _undo_candidate(self, jobs=None):
+        """The job Undo applies to: the first one of jobs (newest first by default) that moved files."""
+        for job in jobs if jobs is not None else self.queue.jobs[::-1]:
+            if (job.done and job.number not in self.undone and job.organizer is not None
+                    and job.organizer.file_operations):
+                return job
+        return None
 
     def undo_sorting(self):
-        """Restore files to their original locations."""
-        if not self.file_operations:
+        """Restore the files of the selected job (or of the last sorted one) to their original locations."""
+        self.undo_job = self._undo_candidate(self._selected_jobs() or None)
+        if self.undo_job is None:
             messagebox.showinfo("Info", "No operations to undo.")
             return
             
@@ -225,55 +364,60 @@ class FileOrganizerApp:
         self.progress_var.set(0)
         
         # Start background undo in a thread
+        self.run_progress = Progress()
         threading.Thread(target=self._undo_files_thread, daemon=True).start()
+        self._poll_progress(self.run_progress)
 
     def _undo_files_thread(self):
         """Background function: moves files back to their original locations."""
-        total = len(self.file_operations)
-        done = 0
-        
-        # Reverse the operations to undo in reverse order
-        reversed_ops = self.file_operations[::-1]
-        
-        for operation in reversed_ops:
-            try:
-                source_path = operation['source']
-                dest_path = operation['destination']
-                
-                # Check if file still exists at destination
-                if os.path.exists(dest_path):
-                    # Ensure source directory exists
-                    source_dir = os.path.dirname(source_path)
-                    if not os.path.exists(source_dir):
-                        os.makedirs(source_dir, exist_ok=True)
-                        
-                    # Move file back to original location
-                    shutil.move(dest_path, source_path)
-                
-                done += 1
-                # Update progress
-                progress_percent = done / total * 100
-                self.root.after(0, self.progress_var.set, progress_percent)
-                
-            except Exception as e:
-                print(f"Error during undo: {e}")
-        
-        # Clear operations after undo
-        self.file_operations = []
-        self.has_operations = False
-        
+        job = self.undo_job
+        report = undo_operations(job.organizer.file_operations, progress=self.run_progress,
+                                 workers=self.UNDO_WORKERS)
+        for operation, reason in report.conflicts:
+            print(f"Conflict during undo: {operation['destination']}: {reason}")
+        for operation, e in report.errors:
+            print(f"Error during undo: {operation['destination']}: {e}")
+        # With conflicts the journal stays undoable: fix them and undo it again from the command line
+        if report.complete and os.path.exists(job.journal.path):
+            mark_undone(job.journal.path)
+
+        # The job's operations are not undone twice
+        self.undone.add(job.number)
+
         # Reset interface
-        self.root.after(0, self._finish_undo)
+        self.root.after(0, self._finish_undo, report)
 
-    def _finish_undo(self):
+    def _finish_undo(self, report):
         """Reset interface after undo operation."""
-        messagebox.showinfo("Done", "Files restored to original locations.")
+        self.run_progress = None
+        self.status_var.set("")
+        self._update_row(self.undo_job)
+        if report.skipped or not report.complete:
+            message = f"Restored {report.restored} of {report.total} file(s)."
+            if report.skipped:
+                message += f"\n{len(report.skipped)} file(s) were no longer in the sorted folders."
+            if report.conflicts:
+                message += (f"\n{len(report.conflicts)} file(s) were left in place: they were changed "
+                            f"after sorting or their original location is taken.")
+            if report.errors:
+                message += f"\n{len(report.errors)} file(s) could not be moved back (see the console)."
+            messagebox.showwarning("Undo finished with problems", message)
+        else:
+            messagebox.showinfo("Done", "Files restored to original locations.")
         self.btn_sort.config(state='enabled')
-        self.btn_undo.config(state='disabled')
+        # Earlier sorts can be undone too, newest first
+        self.btn_undo.config(state='enabled' if self._undo_candidate() is not None else 'disabled')
+        self.progress.stop()
+        self.progress.config(mode='determinate')
         self.progress_var.set(0)
 
 
 if __name__ == "__main__":
+    # Any command line arguments (e.g. --dir, --dry-run) run the headless sorter
+    if len(sys.argv) > 1 or tk is None:
+        from organizer.cli import main
+        sys.exit(main())
+
     root = tk.Tk()
     app = FileOrganizerApp(root)
     root.mainloop()
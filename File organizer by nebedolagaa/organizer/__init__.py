@@ -0,0 +1,77 @@
+"""
+Sorting engine of the File Organizer.
+
+Everything in this package works without tkinter, so it can be used both by
+the GUI (file_organizer.py) and from scripts or headless servers.
+"""
+
+from .categories import FILE_CATEGORIES, OTHERS_CATEGORY, CategoryIndex
+from .conflicts import ConflictResolver
+from .dates import DateBucketer, DateCache, default_date_cache_path, embedded_date
+from .duplicates import DUPLICATES_CATEGORY, DuplicateFinder
+from .engine import MoveStats, Organizer, load_log, redo_operations
+from .jobs import Job, JobQueue
+from .journal import (Journal, journal_info, journal_path, mark_replayed, mark_undone,
+                      read_journal, read_journal_reversed)
+from .oplog import OperationLog
+from .pipeline import Stages, run_pipeline, sort_pipelined
+from .plan import Plan, PlanEntry
+from .profiling import PROFILE_ENV, Profiler, StageTimer
+from .progress import Progress, ProgressLine, format_progress
+from .rules import RuleSet, load_rules
+from .scan_cache import ScanCache
+from .sniff import ContentSniffer, SniffCache, default_sniff_cache_path
+from .transfer import CrossDeviceMover, check_space, free_space
+from .undo import UndoReport, Undoer, undo_operations
+from .watch import FolderWatch
+
+__all__ = [
+    "FILE_CATEGORIES",
+    "OTHERS_CATEGORY",
+    "PROFILE_ENV",
+    "CategoryIndex",
+    "ConflictResolver",
+    "ContentSniffer",
+    "CrossDeviceMover",
+    "DateBucketer",
+    "DateCache",
+    "DUPLICATES_CATEGORY",
+    "DuplicateFinder",
+    "FolderWatch",
+    "Job",
+    "JobQueue",
+    "Journal",
+    "MoveStats",
+    "OperationLog",
+    "Organizer",
+    "Plan",
+    "PlanEntry",
+    "Progress",
+    "ProgressLine",
+    "Profiler",
+    "RuleSet",
+    "ScanCache",
+    "SniffCache",
+    "Stages",
+    "StageTimer",
+    "UndoReport",
+    "Undoer",
+    "check_space",
+    "default_date_cache_path",
+    "default_sniff_cache_path",
+    "embedded_date",
+    "format_progress",
+    "free_space",
+    "journal_info",
+    "journal_path",
+    "load_log",
+    "load_rules",
+    "mark_replayed",
+    "mark_undone",
+    "read_journal",
+    "read_journal_reversed",
+    "redo_operations",
+    "run_pipeline",
+    "sort_pipelined",
+    "undo_operations",
+]
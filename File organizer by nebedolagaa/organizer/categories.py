@@ -0,0 +1,65 @@
+"""
+File categories and the extension -> category index used for classification.
+"""
+
+# ---------------------- File categories configuration ----------------------
+# FILE_CATEGORIES dictionary: key — category/folder name, value — list of extensions.
+# Compound suffixes (e.g. ".tar.gz") are supported and win over the plain ones.
+FILE_CATEGORIES = {
+    "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"],
+    "Documents": [".pdf", ".doc", ".docx", ".txt", ".rtf", ".xls", ".xlsx", ".ppt", ".pptx"],
+    "Videos": [".mp4", ".mkv", ".avi", ".mov", ".flv"],
+    "Music": [".mp3", ".wav", ".aac", ".flac", ".ogg"],
+    "Archives": [".zip", ".rar", ".tar", ".gz", ".7z", ".dmg", ".tar.gz", ".tar.bz2", ".tar.xz"],
+    # Other extensions will go to "Others" section
+}
+
+# Folder for files that don't match any category
+OTHERS_CATEGORY = "Others"
+# ------------------------------------------------------------------------
+
+
+class CategoryIndex:
+    """Extension -> category lookup table, built once from a categories dict.
+
+    Classification of a filename costs one dict lookup per suffix level
+    (usually one or two), no matter how many categories or extensions exist.
+    """
+
+    def __init__(self, categories=None, default=OTHERS_CATEGORY):
+        if categories is None:
+            categories = FILE_CATEGORIES
+        self.default = default
+        self.categories = list(categories)
+        self._by_ext = {}
+        # Longest suffix in dots: 1 for ".jpg", 2 for ".tar.gz", ...
+        self._max_parts = 1
+        for category, extensions in categories.items():
+            for ext in extensions:
+                ext = ext.lower()
+                if not ext.startswith("."):
+                    ext = "." + ext
+                # First category listing an extension keeps it (same as the old linear scan)
+                self._by_ext.setdefault(ext, category)
+                self._max_parts = max(self._max_parts, ext.count("."))
+
+    def extensions(self):
+        """Returns sorted (extension, category) pairs known to the index."""
+        return sorted(self._by_ext.items())
+
+    def classify(self, filename):
+        """Returns the category folder name for filename."""
+        name = filename.lower()
+        by_ext = self._by_ext
+        end = len(name)
+        category = self.default
+        for _ in range(self._max_parts):
+            dot = name.rfind(".", 0, end)
+            # A leading dot is a hidden file, not an extension (same as os.path.splitext)
+            if dot <= 0:
+                break
+            hit = by_ext.get(name[dot:])
+            if hit is not None:
+                category = hit
+            end = dot
+        return category
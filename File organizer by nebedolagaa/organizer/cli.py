@@ -0,0 +1,540 @@
+"""
+Command line interface of the File Organizer (no tkinter required).
+
+Usage:
+    python -m file_organizer --dir ~/Downloads --dry-run
+    python -m file_organizer --dir ~/Downloads --dir /mnt/share/inbox -j 16 --jobs 4
+    python -m organizer --dir ~/Downloads
+    python -m file_organizer --undo sort_log_20240101_120000.jsonl -j 8
+    python -m file_organizer --dir /mnt/share -r --plan share.plan.jsonl
+    python -m file_organizer --apply share.plan.jsonl
+"""
+
+import argparse
+import contextlib
+import errno
+import os
+import signal
+import sys
+import time
+from collections import Counter
+
+from .conflicts import POLICIES, RENAME
+from .dates import LAYOUTS, DateBucketer, DateCache, default_date_cache_path
+from .engine import Organizer, load_log, redo_operations
+from .jobs import FINISHED, JobQueue
+from .journal import (JOURNAL_SUFFIX, Journal, journal_info, journal_path, mark_replayed,
+                      mark_undone, read_journal, read_journal_reversed)
+from .pipeline import parse_stages
+from .plan import Plan
+from .profiling import Profiler
+from .progress import Progress, ProgressLine
+from .rules import load_rules
+from .scan_cache import ScanCache, default_cache_path
+from .sniff import ContentSniffer, SniffCache, default_sniff_cache_path
+from .transfer import FULL, CrossDeviceMover
+from .undo import undo_operations
+from .watch import FolderWatch
+
+# Sort logs are stored next to file_organizer.py, the same place the GUI uses
+DEFAULT_LOG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# User rules the GUI picks up too (see organizer/rules.py)
+DEFAULT_RULES = os.path.join(DEFAULT_LOG_DIR, "rules.json")
+# Options that decide which files move where: recorded in the journal, reused by --resume
+RUN_OPTIONS = ("recursive", "max_depth", "exclude", "on_conflict", "rules", "by_date", "exif",
+               "verify_copies", "find_duplicates", "sniff")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="file_organizer",
+        description="Sort files of a folder into category subfolders.")
+    parser.add_argument("--dir", action="append", default=[],
+                        help="folder to organize; repeat it to sort several folders as a batch")
+    parser.add_argument("--dirs-from", metavar="FILE",
+                        help="also organize the folders listed in FILE, one per line")
+    parser.add_argument("--jobs", type=int, default=4,
+                        help="with several folders, how many are sorted at once; they share "
+                             "the -j workers (default: %(default)s)")
+    parser.add_argument("--per-device", type=int, default=1, metavar="N",
+                        help="with several folders, how many of one disk or mount are sorted "
+                             "at once, 0 = no limit (default: %(default)s)")
+    actions = parser.add_mutually_exclusive_group()
+    actions.add_argument("--undo", metavar="LOG",
+                         help="move the files of a past run back (journal or old .json log)")
+    actions.add_argument("--resume", metavar="JOURNAL",
+                         help="continue an interrupted run, appending to its journal")
+    actions.add_argument("--replay", metavar="JOURNAL",
+                         help="redo the moves recorded in a journal (e.g. after an undo)")
+    actions.add_argument("--apply", metavar="PLAN",
+                         help="carry out a plan written by --plan (changed files are left alone)")
+    actions.add_argument("--check", metavar="PLAN",
+                         help="list the entries of a plan that no longer match the disk")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print what would be moved")
+    parser.add_argument("--plan", metavar="FILE",
+                        help="scan and classify, write the full move plan to FILE and print "
+                             "per-category totals; nothing is moved")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR,
+                        help="where to write the sort journal (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of files moved concurrently, also by --undo "
+                             "(default: %(default)s)")
+    parser.add_argument("--pipeline", nargs="?", const="4,8,64", type=stages_arg,
+                        metavar="SCAN,CLASSIFY,MOVE",
+                        help="run scan, classify and move as concurrent stages with that many "
+                             "operations in flight each, for network mounts (default: 4,8,64)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="also organize files of nested folders")
+    parser.add_argument("--max-depth", type=int, default=None,
+                        help="how deep --recursive goes (0 = top level only)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="skip files and folders matching GLOB (repeatable)")
+    parser.add_argument("--on-conflict", choices=POLICIES, default=RENAME,
+                        help="when the category folder already has a file with that name: "
+                             "keep both as 'name (n).ext', leave the new file in place, or "
+                             "leave it only if identical (default: %(default)s)")
+    parser.add_argument("--rules", metavar="FILE", default=None,
+                        help="JSON file of rules tried before the categories (default: "
+                             "rules.json next to file_organizer.py, if present)")
+    parser.add_argument("--by-date", nargs="?", const="month", choices=LAYOUTS, metavar="LAYOUT",
+                        help="split Images and Videos into date folders: year, month (default) "
+                             "or day, by modification time")
+    parser.add_argument("--exif", action="store_true",
+                        help="with --by-date, use the capture date stored in photos and videos "
+                             "(Exif, MP4/MOV header) when there is one; cached per file")
+    parser.add_argument("--verify-copies", action="store_true",
+                        help="when a category folder is on another device, compare every byte of "
+                             "each copy before deleting the original (default: size, mtime and "
+                             "sampled blocks)")
+    parser.add_argument("--find-duplicates", action="store_true",
+                        help="move byte-identical copies into the Duplicates folder")
+    parser.add_argument("--sniff", action="store_true",
+                        help="recognize file types by their content (magic numbers), "
+                             "not only by extension (results cached in ~/.cache/file_organizer)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="remember what was left in every folder and skip unchanged "
+                             "folders next time (cache in ~/.cache/file_organizer)")
+    parser.add_argument("--cache", default=None, metavar="FILE",
+                        help="scan cache file to use (implies --incremental)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and sort new files as they arrive (Ctrl+C to stop)")
+    parser.add_argument("--polling", action="store_true",
+                        help="with --watch, poll the folder instead of using inotify")
+    parser.add_argument("--stats", action="store_true",
+                        help="print filesystem call counters after the run")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not print every file")
+    parser.add_argument("--progress", action="store_true",
+                        help="show a live status line (files/s, MiB/s, ETA) instead of every file")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write cProfile stats of the run to FILE and print the time spent "
+                             "per stage (scan, classify, move, undo)")
+    return parser
+
+
+def stages_arg(text):
+    try:
+        return parse_stages(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+class Reporter:
+    """Stands in for the journal: forwards every move to it before the move,
+    then prints and counts the moves that happened.
+
+    Nothing is kept per file, so memory stays flat for runs of any size.
+    """
+
+    def __init__(self, folder, journal=None, quiet=False):
+        self.folder = folder
+        self.journal = journal
+        self.quiet = quiet
+        self.per_category = Counter()
+
+    def intend(self, operation):
+        if self.journal is not None:
+            self.journal.intend(operation)
+
+    def abort(self, operation):
+        if self.journal is not None:
+            self.journal.abort(operation)
+
+    def record(self, operation):
+        # Destinations are always inside the folder; slicing is much cheaper than relpath
+        category = operation['destination'][len(self.folder) + 1:].split(os.sep, 1)[0]
+        self.per_category[category] += 1
+        if not self.quiet:
+            print(f"{operation['source']} -> {operation['destination']}")
+
+    def finish(self, status="finished"):
+        if self.journal is not None:
+            self.journal.finish(status)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.profile:
+        return run(parser, args)
+    with Profiler(args.profile) as profiler:
+        status = run(parser, args, profiler.timer)
+    print(profiler.timer.report(), file=sys.stderr)
+    print(profiler.top(), file=sys.stderr)
+    print(f"Profile written to {args.profile} (python -m pstats {args.profile})", file=sys.stderr)
+    return status
+
+
+def run(parser, args, timer=None):
+    """Carries out the parsed command line; timer is a StageTimer with --profile."""
+    for log_path in (args.undo, args.replay, args.resume, args.apply, args.check):
+        if log_path and not os.path.isfile(log_path):
+            print(f"No such file: {log_path}", file=sys.stderr)
+            return 2
+    progress = Progress() if args.progress else None
+    if args.undo:
+        return undo(args.undo, args.workers, progress, timer)
+    if args.replay:
+        return replay(args.replay, progress)
+    if args.check:
+        return check_plan(args.check)
+
+    journal = None
+    plan = None
+    # Several folders (--dir more than once, --dirs-from) are sorted as a batch
+    folders = []
+    if args.apply:
+        plan = Plan.load(args.apply)
+        folder = plan.folder
+    elif args.resume:
+        info = journal_info(args.resume)
+        if info["status"] is not None:
+            print(f"Nothing to resume: the run was {info['status']}.", file=sys.stderr)
+            return 2
+        folder = info["folder"]
+        if info["options"] is not None:
+            # Continue the way the run was started, not with this command line's options
+            for name in RUN_OPTIONS:
+                if name in info["options"]:
+                    setattr(args, name, info["options"][name])
+        journal = Journal(args.resume, folder)
+    elif args.dir or args.dirs_from:
+        folders = args.dir + (read_folder_list(args.dirs_from) if args.dirs_from else [])
+        folders = [os.path.normpath(os.path.expanduser(path)) for path in folders]
+        if not folders:
+            print(f"No folders listed in {args.dirs_from}", file=sys.stderr)
+            return 2
+        if len(folders) > 1 and (args.plan or args.watch or args.cache):
+            parser.error("--plan, --watch and --cache work on one folder at a time")
+        if args.watch and args.find_duplicates:
+            parser.error("--find-duplicates does not work with --watch: new files are sorted a few at a time")
+        folder = folders[0]
+    else:
+        parser.error("--dir is required (or use --undo / --resume / --replay / --apply / --check)")
+    missing = [path for path in folders or [folder] if not os.path.isdir(path)]
+    for path in missing:
+        print(f"Not a folder: {path}", file=sys.stderr)
+    if missing:
+        return 2
+    # --rules "" (what a journal records for a run without rules) turns the default rules off
+    if args.rules is not None:
+        rules_path = args.rules
+    else:
+        rules_path = DEFAULT_RULES if os.path.exists(DEFAULT_RULES) else None
+    rules = None
+    if rules_path:
+        try:
+            rules = load_rules(rules_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not load rules from {rules_path}: {e}", file=sys.stderr)
+            return 2
+
+    dates = date_bucketer(args)
+
+    if args.plan:
+        return write_plan(folder, args, rules, dates, timer)
+
+    options = dict(dry_run=args.dry_run, workers=args.workers,
+                   recursive=args.recursive, max_depth=args.max_depth,
+                   exclude=args.exclude, on_conflict=args.on_conflict,
+                   find_duplicates=args.find_duplicates,
+                   sniffer=content_sniffer(args),
+                   keep_operations=False, rules=rules, dates=dates,
+                   pipeline=args.pipeline, timer=timer,
+                   mover=CrossDeviceMover(verify=FULL) if args.verify_copies else None)
+    recorded = run_options(args, rules_path)
+    if len(folders) > 1:
+        return batch(folders, args, options, recorded)
+
+    if journal is None and not args.dry_run:
+        journal = Journal(journal_path(args.log_dir), folder, recorded)
+    scan_cache = None
+    if args.incremental or args.cache:
+        scan_cache = ScanCache(args.cache or default_cache_path(folder))
+    reporter = Reporter(folder, journal, args.quiet or args.progress)
+    options.update(scan_cache=scan_cache, journal=reporter)
+    if args.watch:
+        return watch(folder, args, options, journal)
+
+    organizer = Organizer(folder, **options)
+    # Ctrl+C stops after the current file, so the journal never misses a move
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: organizer.cancel())
+    try:
+        with progress_line(progress):
+            if plan is not None:
+                organizer.execute(plan, progress=progress)
+            else:
+                organizer.sort(progress=progress)
+    except OSError as e:
+        if journal is not None:
+            journal.close()
+        if e.errno != errno.ENOSPC:
+            raise
+        # Raised before a copy starts (for --apply, before anything is moved)
+        print(f"Stopped: {e.strerror}", file=sys.stderr)
+        if journal is not None and journal.moves:
+            print(f"Free some space and continue with --resume {journal.path}", file=sys.stderr)
+        return 1
+    except BaseException:
+        if journal is not None:
+            # No end marker: the journal shows an interrupted run that can be resumed
+            journal.close()
+        raise
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+    if organizer.cancelled:
+        print("Sorting was canceled.", file=sys.stderr)
+    if journal is not None:
+        journal.finish("canceled" if organizer.cancelled else "finished")
+
+    stats = organizer.stats
+    if not organizer.moved and not (stats.skipped or stats.duplicates):
+        print("No files to sort in the folder.")
+    else:
+        verb = "Would move" if args.dry_run else "Moved"
+        print(f"{verb} {organizer.moved} file(s): "
+              + ", ".join(f"{name}: {count}" for name, count in sorted(reporter.per_category.items())))
+
+    if stats.renamed or stats.skipped or stats.duplicates:
+        print(f"Name conflicts: {stats.renamed} renamed, {stats.skipped} skipped, "
+              f"{stats.duplicates} identical left in place")
+    if args.find_duplicates:
+        print(f"Duplicates: {stats.duplicates_found} (hashed {stats.bytes_hashed / 2**20:.1f} MiB "
+              f"at {stats.hash_bytes_per_second / 2**20:.1f} MiB/s)")
+    if organizer.stale:
+        for entry, reason in organizer.stale:
+            print(f"Not moved: {entry.source}: {reason}", file=sys.stderr)
+        print(f"{len(organizer.stale)} planned move(s) no longer matched the disk and were skipped.")
+    if stats.cross_device:
+        print(f"Warning: {stats.cross_device} file(s) were on another device and had to be "
+              f"copied ({stats.bytes_copied / 2**20:.1f} MiB"
+              + (f", {stats.bytes_resumed / 2**20:.1f} MiB more from interrupted copies"
+                 if stats.bytes_resumed else "") + ")", file=sys.stderr)
+    if args.stats:
+        print(f"Filesystem calls: {stats.fs_calls} ({stats.fs_calls_per_file:.2f} per file), "
+              f"renames: {stats.renames}, folders created: {stats.dirs_created}, "
+              f"unchanged folders skipped: {stats.cached_dirs}")
+        if dates is not None and dates.embedded:
+            print(f"Embedded dates: {dates.headers_read} file header(s) read, "
+                  f"{dates.cache_hits} from cache")
+    if journal is not None and journal.moves:
+        print(f"Sort journal: {journal.path}")
+    return 0
+
+
+def run_options(args, rules_path=None):
+    """The RUN_OPTIONS of a run as plain values, for its journal.
+
+    The rules file is recorded by absolute path, "" meaning no rules.
+    """
+    options = {name: getattr(args, name) for name in RUN_OPTIONS}
+    options["rules"] = os.path.abspath(rules_path) if rules_path else ""
+    return options
+
+
+def read_folder_list(path):
+    """--dirs-from: the folders listed in a file, one per line ("#" starts a comment)."""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def batch(folders, args, options, recorded=None):
+    """Several folders: sorted side by side as jobs of one JobQueue.
+
+    Every folder gets its own journal; a summary line is printed as each
+    one is done. Ctrl+C cancels all of them after their current files.
+    """
+    queue = JobQueue(workers=args.workers, max_jobs=args.jobs, per_device=args.per_device or None)
+    reporters = {}
+    for folder in folders:
+        journal = None if args.dry_run else Journal(journal_path(args.log_dir), folder, recorded)
+        reporter = Reporter(folder, journal, args.quiet or args.progress)
+        scan_cache = ScanCache(default_cache_path(folder)) if args.incremental else None
+        job = queue.submit(folder, journal=reporter, **dict(options, scan_cache=scan_cache))
+        reporters[job.number] = reporter
+
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: queue.cancel_all())
+    reported = set()
+    try:
+        while len(reported) < len(queue.jobs):
+            queue.wait(0.25)
+            for job in queue.jobs:
+                if job.done and job.number not in reported:
+                    reported.add(job.number)
+                    report_job(job, reporters[job.number], args.dry_run)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        queue.close(cancel=True)
+
+    finished = sum(job.status == FINISHED for job in queue.jobs)
+    moved = sum(job.organizer.moved for job in queue.jobs if job.organizer is not None)
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} {moved} file(s) from {len(queue.jobs)} folder(s); "
+          f"{finished} finished, {len(queue.jobs) - finished} canceled or failed.")
+    return 0 if finished == len(queue.jobs) else 1
+
+
+def report_job(job, reporter, dry_run=False):
+    """The summary line of one job of a batch."""
+    if job.error is not None:
+        print(f"[{job.number}] {job.folder}: failed: {job.error}", file=sys.stderr)
+        return
+    moved = job.organizer.moved if job.organizer is not None else 0
+    verb = "would move" if dry_run else "moved"
+    text = f"[{job.number}] {job.folder}: {job.status}, {verb} {moved} file(s)"
+    if reporter.per_category:
+        text += " (" + ", ".join(f"{name}: {count}" for name, count in
+                                 sorted(reporter.per_category.items())) + ")"
+    journal = reporter.journal
+    if journal is not None and journal.moves:
+        text += f", journal {journal.path}"
+    print(text)
+
+
+def date_bucketer(args):
+    """The DateBucketer asked for by --by-date / --exif, or None."""
+    layout = args.by_date or ("month" if args.exif else None)
+    if layout is None:
+        return None
+    cache = DateCache(default_date_cache_path()) if args.exif else None
+    return DateBucketer(layout, embedded=args.exif, cache=cache)
+
+
+def content_sniffer(args):
+    """The ContentSniffer asked for by --sniff, with its results cached on disk, or None."""
+    if not args.sniff:
+        return None
+    return ContentSniffer(cache=SniffCache(default_sniff_cache_path()))
+
+
+def write_plan(folder, args, rules=None, dates=None, timer=None):
+    """--plan: scans and classifies, then writes the plan and its totals."""
+    organizer = Organizer(folder, dry_run=True, workers=args.workers,
+                          recursive=args.recursive, max_depth=args.max_depth,
+                          exclude=args.exclude, on_conflict=args.on_conflict,
+                          find_duplicates=args.find_duplicates,
+                          sniffer=content_sniffer(args), rules=rules,
+                          dates=dates, timer=timer)
+    plan = organizer.plan()
+    plan.save(args.plan)
+
+    totals = plan.totals()
+    for category, (count, size) in sorted(totals.items()):
+        print(f"{category:12} {count:9} file(s) {size / 2**20:12.1f} MiB")
+    moving = sum(count for count, size in totals.values())
+    print(f"{'Total':12} {moving:9} file(s) "
+          f"{sum(size for count, size in totals.values()) / 2**20:12.1f} MiB")
+    conflicts = plan.conflict_counts()
+    if conflicts:
+        print("Name conflicts: " + ", ".join(f"{count} {name}" for name, count in sorted(conflicts.items())))
+    print(f"Plan of {len(plan)} file(s) written to {args.plan}")
+    return 0
+
+
+def check_plan(plan_path):
+    """--check: re-validates a plan against the disk without moving anything."""
+    plan = Plan.load(plan_path)
+    stale = plan.validate()
+    for entry, reason in stale:
+        print(f"{entry.source}: {reason}")
+    print(f"{len(stale)} of {len(plan)} planned move(s) no longer match the disk.")
+    return 1 if stale else 0
+
+
+def watch(folder, args, options, journal):
+    """--watch: sorts the folder, then every new file, until interrupted."""
+    # Nested folders are not watched, and a cache is pointless for single files
+    options.update(recursive=False, scan_cache=None)
+    reporter = options["journal"]
+
+    print(f"Watching {folder} (Ctrl+C to stop)", flush=True)
+    folder_watch = FolderWatch(folder, polling=args.polling, **options)
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: folder_watch.stop())
+    try:
+        folder_watch.run()
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if journal is not None:
+            journal.finish()
+
+    print(f"Moved {sum(reporter.per_category.values())} file(s).")
+    if journal is not None and journal.moves:
+        print(f"Sort journal: {journal.path}")
+    return 0
+
+
+def progress_line(progress):
+    """A live status line on stderr while a run goes on, or nothing without --progress."""
+    if progress is None:
+        return contextlib.nullcontext()
+    return ProgressLine(progress)
+
+
+def undo(log_path, workers=1, progress=None, timer=None):
+    """--undo: moves the files of a past run back, newest first."""
+    start = time.perf_counter()
+    if log_path.endswith(JOURNAL_SUFFIX):
+        info = journal_info(log_path)
+        if info["status"] == "undone":
+            print("This run was already undone.")
+            return 0
+        with progress_line(progress):
+            report = undo_operations(read_journal_reversed(log_path), progress,
+                                     total=info["moves"], workers=workers)
+    else:
+        with progress_line(progress):
+            report = undo_operations(load_log(log_path), progress, workers=workers)
+    if timer is not None:
+        timer.add("undo", time.perf_counter() - start, report.total)
+
+    for operation, reason in report.conflicts:
+        print(f"Conflict: {operation['destination']}: {reason}", file=sys.stderr)
+    for operation, e in report.errors:
+        print(f"Error during undo: {operation['destination']}: {e}", file=sys.stderr)
+    # A run with conflicts stays undoable: fix them and run --undo again
+    if log_path.endswith(JOURNAL_SUFFIX) and report.complete:
+        mark_undone(log_path)
+    print(f"Restored {report.restored} of {report.total} file(s)"
+          + (f", {len(report.skipped)} no longer in the sorted folder" if report.skipped else "")
+          + (f", {len(report.conflicts)} conflict(s)" if report.conflicts else "")
+          + (f", {len(report.errors)} error(s)" if report.errors else "") + ".")
+    return 0 if report.complete else 1
+
+
+def replay(log_path, progress=None):
+    """--replay: redoes the moves of a journal that are not in effect."""
+    with progress_line(progress):
+        moved, errors = redo_operations(read_journal(log_path), progress,
+                                        total=journal_info(log_path)["moves"])
+    for operation, e in errors:
+        print(f"Error during replay: {e}", file=sys.stderr)
+    if log_path.endswith(JOURNAL_SUFFIX) and moved and not errors:
+        mark_replayed(log_path)
+    print(f"Moved {moved} file(s).")
+    return 1 if errors else 0
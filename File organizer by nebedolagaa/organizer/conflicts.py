@@ -0,0 +1,155 @@
+"""
+Name conflict handling for files moved into category folders.
+"""
+
+import filecmp
+import os
+import threading
+import unicodedata
+
+# What to do when a file with the same name already exists in the category folder
+RENAME = "rename"  # keep both: "name (1).ext", "name (2).ext", ...
+SKIP = "skip"      # leave the new file where it is
+DEDUPE = "dedupe"  # leave it only if its content is identical, otherwise rename
+POLICIES = (RENAME, SKIP, DEDUPE)
+
+
+def split_name(filename):
+    """Splits filename into (stem, extension), keeping ".tar.xx" suffixes together."""
+    stem, ext = os.path.splitext(filename)
+    if stem.lower().endswith(".tar"):
+        stem, ext = stem[:-4], stem[-4:] + ext
+    return stem, ext
+
+
+def fold_case(name):
+    """The key under which a case-insensitive volume stores name."""
+    return unicodedata.normalize("NFC", name).casefold()
+
+
+def case_insensitive(folder):
+    """Tells whether the filesystem holding folder (an existing folder) ignores case.
+
+    Looks for a folder on the path whose name has letters: on such a
+    filesystem its name with the case swapped is the same folder.
+    Answers False when no name on the path can tell.
+    """
+    folder = os.path.abspath(folder)
+    dev = os.stat(folder).st_dev
+    while True:
+        parent, name = os.path.split(folder)
+        if not name:
+            return False
+        try:
+            if os.stat(parent).st_dev != dev:
+                return False  # the lookup would happen on another filesystem
+            if name.swapcase() != name:
+                return os.path.samestat(os.stat(folder), os.stat(os.path.join(parent, name.swapcase())))
+        except OSError:
+            return False
+        folder = parent
+
+
+class ConflictResolver:
+    """In-memory index of the names in every destination folder of one run.
+
+    Each folder is listed once (the first time a file goes there); after
+    that collisions are resolved without touching the disk. Rename counters
+    are remembered per name, so placing 100k files called "scan.pdf" costs
+    linear time instead of probing "scan (1).pdf", "scan (2).pdf", ...
+    again for every file. On case-insensitive volumes (Windows, macOS,
+    FAT/exFAT) names are compared case-folded, so "photo.jpg" and
+    "Photo.jpg" clash there like they do on disk. Safe to use from worker
+    threads.
+
+    The index only knows the names seen when a folder was listed and the
+    ones it handed out; a file created there later by another program is
+    caught by the move itself, which never replaces a file (see
+    organizer/transfer.py), and the next name is claimed then.
+    """
+
+    def __init__(self, policy=RENAME):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown conflict policy: {policy!r} (expected one of {POLICIES})")
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._names = {}
+        self._counters = {}
+        # st_dev -> whether that filesystem ignores case
+        self._ignores_case = {}
+
+    def _names_in(self, directory):
+        """Returns (name set, key function) of a folder, listing it the first time.
+
+        Call without the lock. The key function maps a name to its key in
+        the set: the name itself, or fold_case on case-insensitive volumes.
+        """
+        index = self._names.get(directory)
+        if index is None:
+            # Listing is a round trip on network mounts, so it must not hold up
+            # the other workers; when two list the same folder the first one wins
+            key = fold_case if self._case_insensitive(directory) else str
+            try:
+                with os.scandir(directory) as entries:
+                    listed = {key(entry.name) for entry in entries}
+            except FileNotFoundError:
+                listed = set()
+            with self._lock:
+                index = self._names.setdefault(directory, (listed, key))
+        return index
+
+    def _case_insensitive(self, directory):
+        """case_insensitive() of the volume holding directory, tested once per device."""
+        folder = directory
+        while True:
+            try:
+                dev = os.stat(folder).st_dev
+                break
+            except FileNotFoundError:
+                # Category folders are created by the first move into them
+                parent = os.path.dirname(folder)
+                if parent == folder:
+                    return False
+                folder = parent
+        ignores_case = self._ignores_case.get(dev)
+        if ignores_case is None:
+            ignores_case = case_insensitive(folder)
+            self._ignores_case[dev] = ignores_case
+        return ignores_case
+
+    def claim(self, directory, filename, src_path=None):
+        """Reserves a free name for a file going into directory.
+
+        Returns the name to use, or None when the file must stay where it is
+        (SKIP policy, or an identical copy already exists with DEDUPE).
+        """
+        names, key = self._names_in(directory)
+        with self._lock:
+            if key(filename) not in names:
+                names.add(key(filename))
+                return filename
+            if self.policy == SKIP:
+                return None
+
+        # Comparing contents may take a while, so it runs outside the lock
+        if self.policy == DEDUPE and src_path is not None:
+            existing = os.path.join(directory, filename)
+            try:
+                if filecmp.cmp(src_path, existing, shallow=False):
+                    return None
+            except OSError:
+                # Existing file not on disk yet (claimed by a parallel move) or unreadable
+                pass
+
+        with self._lock:
+            stem, ext = split_name(filename)
+            counter = (directory, key(stem), key(ext))
+            n = self._counters.get(counter, 0)
+            while True:
+                n += 1
+                candidate = f"{stem} ({n}){ext}"
+                if key(candidate) not in names:
+                    break
+            self._counters[counter] = n
+            names.add(key(candidate))
+            return candidate
@@ -0,0 +1,350 @@
+"""
+Date sub-folders: Images/2024/05/... instead of one flat category folder.
+
+A DateBucketer gives the date folder of a file. By default the date is the
+modification time, which the scan already has (os.DirEntry caches the
+stat), so bucketing costs nothing. With embedded=True the capture date is
+read from the file itself, parsing only the header bytes it needs:
+
+    JPEG      the Exif (APP1) segment, found by hopping over segment headers
+    TIFF      the Exif IFD of TIFF-based files (most camera raw formats)
+    PNG       the eXIf chunk, found by hopping over chunk headers
+    MP4/MOV   creation time of the movie header (moov/mvhd), found by
+              hopping over box headers (moov is often at the end)
+
+Every read is bounded (MAX_SEGMENT bytes, MAX_HOPS headers); files
+without a usable date fall back to their modification time. Embedded dates
+are cached per inode (st_dev, st_ino), checked against size and mtime, so
+sorting the same files again never re-reads their headers; with a
+DateCache the cache is kept on disk between runs.
+"""
+
+import os
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from .scan_cache import DEFAULT_CACHE_DIR
+
+# Embedded dates a bucketer keeps in memory, least recently used dropped
+# first; a DateCache keeps all of them on disk
+MEMO_SIZE = 4096
+
+# Categories split by date unless told otherwise
+DATE_CATEGORIES = ("Images", "Videos")
+
+# Folder layout under the category folder
+LAYOUTS = {
+    "year": ("{year}",),
+    "month": ("{year}", "{month}"),
+    "day": ("{year}", "{month}", "{day}"),
+}
+
+# Most bytes read from one file for its Exif data, and most segment / chunk /
+# box headers visited to find it
+MAX_SEGMENT = 64 * 1024
+MAX_HOPS = 64
+
+EXIF_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+# Tags holding dates: DateTimeOriginal, DateTimeDigitized (Exif IFD), DateTime (IFD0)
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATE_TAGS = (0x9003, 0x9004)
+TIFF_DATE_TAG = 0x0132
+# QuickTime counts seconds from 1904-01-01 UTC
+MP4_EPOCH_OFFSET = 2082844800
+
+
+def embedded_date(path):
+    """Returns the capture date stored in a photo or video, or None.
+
+    Only the bytes needed to find the date are read (see the module
+    docstring); unknown formats cost one 16-byte read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+            if head.startswith(b"\xff\xd8"):
+                f.seek(2)
+                return _jpeg_date(f)
+            if head[:4] in (b"II*\x00", b"MM\x00*"):
+                f.seek(0)
+                return _tiff_date(f.read(MAX_SEGMENT))
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                f.seek(8)
+                return _png_date(f)
+            if head[4:8] == b"ftyp":
+                f.seek(0)
+                return _mp4_date(f)
+    except (OSError, ValueError, struct.error, OverflowError):
+        # Unreadable or truncated file, or a nonsense date
+        pass
+    return None
+
+
+def _jpeg_date(f):
+    for _ in range(MAX_HOPS):
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD9, 0xDA):
+            # End of image / start of the image data: no Exif before it
+            return None
+        length = struct.unpack(">H", marker[2:])[0]
+        if marker[1] == 0xE1:
+            data = f.read(min(length - 2, MAX_SEGMENT))
+            if data.startswith(b"Exif\x00\x00"):
+                return _tiff_date(data[6:])
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+def _png_date(f):
+    for _ in range(MAX_HOPS):
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, kind = struct.unpack(">I4s", header)
+        if kind == b"eXIf":
+            return _tiff_date(f.read(min(length, MAX_SEGMENT)))
+        if kind in (b"IDAT", b"IEND"):
+            return None
+        # Chunk data and CRC
+        f.seek(length + 4, os.SEEK_CUR)
+    return None
+
+
+def _mp4_date(f):
+    end = os.fstat(f.fileno()).st_size
+    position = 0
+    for _ in range(MAX_HOPS):
+        box = _mp4_box(f, position, end)
+        if box is None:
+            return None
+        kind, body, box_end = box
+        if kind == b"moov":
+            # mvhd is normally the first child of moov
+            child = body
+            for _ in range(MAX_HOPS):
+                box = _mp4_box(f, child, box_end)
+                if box is None:
+                    return None
+                kind, child_body, child_end = box
+                if kind == b"mvhd":
+                    f.seek(child_body)
+                    version = f.read(4)[0]
+                    if version == 1:
+                        seconds = struct.unpack(">Q", f.read(8))[0]
+                    else:
+                        seconds = struct.unpack(">I", f.read(4))[0]
+                    if not seconds:
+                        return None
+                    return datetime.fromtimestamp(seconds - MP4_EPOCH_OFFSET)
+                child = child_end
+            return None
+        position = box_end
+    return None
+
+
+def _mp4_box(f, position, end):
+    """Reads the box header at position; returns (type, body offset, end offset) or None."""
+    if position + 8 > end:
+        return None
+    f.seek(position)
+    size, kind = struct.unpack(">I4s", f.read(8))
+    body = position + 8
+    if size == 1:
+        size = struct.unpack(">Q", f.read(8))[0]
+        body += 8
+    elif size == 0:
+        size = end - position
+    if size < body - position:
+        return None
+    return kind, body, min(position + size, end)
+
+
+def _tiff_date(data):
+    """Finds the capture date in TIFF-structured Exif data (bytes starting at the byte order mark)."""
+    if data[:2] == b"II":
+        order = "<"
+    elif data[:2] == b"MM":
+        order = ">"
+    else:
+        return None
+    ifd0 = struct.unpack(order + "I", data[4:8])[0]
+    tags = _ifd_tags(data, ifd0, order)
+    exif_ifd = tags.get(EXIF_IFD_POINTER)
+    if exif_ifd is not None:
+        exif_tags = _ifd_tags(data, exif_ifd[1], order)
+        for tag in EXIF_DATE_TAGS:
+            date = _exif_date(data, exif_tags.get(tag))
+            if date is not None:
+                return date
+    return _exif_date(data, tags.get(TIFF_DATE_TAG))
+
+
+def _ifd_tags(data, offset, order):
+    """Returns {tag: (type, value or offset, count)} of one IFD."""
+    tags = {}
+    if offset + 2 > len(data):
+        return tags
+    count = struct.unpack_from(order + "H", data, offset)[0]
+    for i in range(min(count, 512)):
+        start = offset + 2 + i * 12
+        if start + 12 > len(data):
+            break
+        tag, kind, values, value = struct.unpack_from(order + "HHII", data, start)
+        tags[tag] = (kind, value, values)
+    return tags
+
+
+def _exif_date(data, field):
+    if field is None:
+        return None
+    kind, offset, count = field
+    # ASCII, "YYYY:MM:DD HH:MM:SS\0" is longer than 4 bytes so the value is an offset
+    if kind != 2 or count < 19 or offset + 19 > len(data):
+        return None
+    text = data[offset:offset + 19].decode('ascii', 'replace')
+    try:
+        return datetime.strptime(text, EXIF_DATE_FORMAT)
+    except ValueError:
+        # "0000:00:00 00:00:00" and other placeholders of cameras without a clock
+        return None
+
+
+def default_date_cache_path():
+    """Returns the default date cache (one for all folders, keyed by inode)."""
+    return os.path.join(DEFAULT_CACHE_DIR, "dates.sqlite")
+
+
+class DateCache:
+    """Embedded dates of files by inode, kept on disk between runs (SQLite).
+
+    A row is only used while the file's size and mtime are unchanged; a
+    file without an embedded date is stored too, so it is not read again
+    either. New rows are written by flush().
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS dates (
+        dev INTEGER NOT NULL,
+        ino INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        date TEXT,
+        PRIMARY KEY (dev, ino)
+    );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Lookups come from the move workers, so one connection guarded by a lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def get(self, st):
+        """Returns (True, date or None) for a cached file, (False, None) otherwise."""
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns, date FROM dates WHERE dev = ? AND ino = ?",
+                                   (st.st_dev, st.st_ino)).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return False, None
+        return True, datetime.fromisoformat(row[2]) if row[2] else None
+
+    def put(self, st, date):
+        with self._lock:
+            self._pending.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns,
+                                  date.isoformat() if date is not None else None))
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO dates VALUES (?, ?, ?, ?, ?)",
+                                         pending)
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+class DateBucketer:
+    """Gives the date folder ("2024/05") of the files of some categories.
+
+    layout is "year", "month" or "day" (see LAYOUTS). With embedded=True
+    dates come from the files' Exif / container headers, with the
+    modification time as fallback; cache (a DateCache) keeps them between
+    runs, and the last MEMO_SIZE are remembered per inode in memory. Safe
+    to call from the move workers.
+    """
+
+    def __init__(self, layout="month", categories=DATE_CATEGORIES, embedded=False, cache=None):
+        if layout not in LAYOUTS:
+            raise ValueError(f"unknown date layout {layout!r} (use {', '.join(LAYOUTS)})")
+        self.layout = layout
+        self._parts = LAYOUTS[layout]
+        self.categories = frozenset(categories)
+        self.embedded = embedded
+        self.cache = cache
+        self.headers_read = 0
+        self.cache_hits = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fingerprint(self):
+        """The options that change where files go, for the scan cache."""
+        return {"layout": self.layout, "categories": sorted(self.categories),
+                "embedded": self.embedded}
+
+    def date(self, path, st):
+        """Returns the date a file is filed under."""
+        if self.embedded:
+            date = self._embedded(path, st)
+            if date is not None:
+                return date
+        return datetime.fromtimestamp(st.st_mtime)
+
+    def subfolder(self, path, st):
+        """Returns the date folder of a file, relative to its category folder."""
+        date = self.date(path, st)
+        fields = {"year": f"{date.year}", "month": f"{date.month:02d}", "day": f"{date.day:02d}"}
+        return os.path.join(*(part.format_map(fields) for part in self._parts))
+
+    def _embedded(self, path, st):
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            memo = self._memo.get(key)
+            if memo is not None:
+                self._memo.move_to_end(key)
+        if memo is not None and memo[:2] == (st.st_size, st.st_mtime_ns):
+            self.cache_hits += 1
+            return memo[2]
+        found = False
+        if self.cache is not None:
+            found, date = self.cache.get(st)
+        if found:
+            self.cache_hits += 1
+        else:
+            date = embedded_date(path)
+            self.headers_read += 1
+            if self.cache is not None:
+                self.cache.put(st, date)
+        # Moving a file keeps its inode, so this holds after the move too
+        with self._lock:
+            self._memo[key] = (st.st_size, st.st_mtime_ns, date)
+            self._memo.move_to_end(key)
+            if len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return date
+
+    def flush(self):
+        """Writes newly read dates to the cache, if there is one."""
+        if self.cache is not None:
+            self.cache.flush()
@@ -0,0 +1,798 @@
+"""
+Scan / classify / move pipeline of the File Organizer, independent of tkinter.
+"""
+
+import errno
+import fnmatch
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from .categories import CategoryIndex
+from .conflicts import DEDUPE, RENAME, ConflictResolver
+from .duplicates import DUPLICATES_CATEGORY, DuplicateFinder
+from .oplog import OperationLog
+from .plan import IDENTICAL, NO_CONFLICT, RENAMED, SKIPPED, STAYS, Plan, check_source
+from .transfer import TEMP_SUFFIXES, CrossDeviceMover, check_space, rename_no_replace
+
+
+class MoveStats:
+    """Counters of one sort run; add() is safe to call from worker threads.
+
+    fs_calls counts the filesystem calls issued by the engine (scandir,
+    stat, mkdir, rename; a cross-device copy+delete counts as one), so
+    fs_calls_per_file shows how much each sorted file really costs.
+    """
+
+    FIELDS = ("files", "renames", "cross_device", "bytes_copied", "bytes_resumed",
+              "dirs_created", "fs_calls",
+              "renamed", "skipped", "duplicates",
+              "duplicates_found", "bytes_hashed", "hash_seconds", "cached_dirs")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def fs_calls_per_file(self):
+        return self.fs_calls / self.files if self.files else 0.0
+
+    @property
+    def hash_bytes_per_second(self):
+        return self.bytes_hashed / self.hash_seconds if self.hash_seconds else 0.0
+
+    def as_dict(self):
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        data["fs_calls_per_file"] = round(self.fs_calls_per_file, 3)
+        data["hash_bytes_per_second"] = round(self.hash_bytes_per_second)
+        return data
+
+
+class Organizer:
+    """Sorts the files of one folder into category subfolders.
+
+    The GUI and the command line both drive this class. sort() scans,
+    classifies and moves the files; plan() stops before the moves and
+    execute() carries a plan out later; cancel() stops a running sort from
+    another thread. Progress goes to an optional progress(done, total,
+    operation) callback (operation is None for a file left in place).
+
+    The stages are the public methods list_dir(), scan_files(), classify(),
+    move_to() and record(), shared by all sort modes. The other options
+    each turn on one part kept in its own module (conflicts, transfer,
+    duplicates, sniff, scan_cache, rules, dates, pipeline, journal,
+    profiling); "How It Works" in the README describes them.
+    """
+
+    # Moves in flight per worker; keeps memory bounded and cancel() prompt
+    QUEUE_PER_WORKER = 4
+    # Files whose headers are sniffed together on the sniffer's thread pool
+    SNIFF_BATCH = 256
+
+    def __init__(self, folder, categories=None, dry_run=False, workers=1,
+                 recursive=False, max_depth=None, exclude=(), on_conflict=RENAME,
+                 find_duplicates=False, sniffer=None, scan_cache=None,
+                 journal=None, keep_operations=True, rules=None, dates=None, pipeline=None,
+                 timer=None, executor=None, mover=None):
+        self.folder = os.path.normpath(folder)
+        self.index = CategoryIndex(categories)
+        self.dry_run = dry_run
+        self.workers = max(1, int(workers))
+        self.recursive = recursive
+        self.max_depth = max_depth if recursive else 0
+        self._excluded = _compile_globs(exclude)
+        self.cancelled = False
+        # Log of file operations for undo feature (compact, see organizer/oplog.py)
+        self.file_operations = OperationLog(self.folder)
+        self.journal = journal
+        self.keep_operations = keep_operations
+        self.moved = 0
+        self.stats = MoveStats()
+        self.conflicts = ConflictResolver(on_conflict)
+        self.find_duplicates = find_duplicates
+        # Paths of the duplicates found in this run -> path of their original
+        self.duplicates = {}
+        self.sniffer = sniffer
+        # Categories found by the sniffer for files about to be moved, when
+        # their content tells another category than their extension
+        self._sniffed = {}
+        self.rules = rules
+        # Age rules compare mtimes with the start of the run, not with each file's turn
+        self._started = time.time()
+        self.dates = dates
+        self.pipeline = pipeline
+        self.timer = timer
+        self.executor = executor
+        self.mover = mover if mover is not None else CrossDeviceMover()
+        # Progress callback of the running sort() or execute(), for byte progress of copies
+        self._progress = None
+        self.scan_cache = scan_cache if not dry_run else None
+        # Whether a file left in place may go elsewhere once it is edited in
+        # place: only then are such files stat'ed again by the scan cache
+        self._settled_by_content = (on_conflict == DEDUPE or bool(find_duplicates)
+                                    or sniffer is not None or dates is not None
+                                    or (rules is not None and rules.needs_stat))
+        if self.scan_cache is not None:
+            self.scan_cache.check_config({
+                "folder": self.folder,
+                "categories": self.index.extensions(),
+                "max_depth": self.max_depth,
+                "exclude": sorted(exclude),
+                "on_conflict": on_conflict,
+                "rules": rules.fingerprint() if rules is not None else None,
+                "dates": dates.fingerprint() if dates is not None else None,
+                # Both change which files are left in place and where the others go
+                "sniff": sniffer is not None,
+                "find_duplicates": bool(find_duplicates),
+            })
+        # For the scan cache: subfolders of every listed directory, files left in place
+        self._listed = {}
+        self._settled = []
+        # st_dev of known directories (sources and created destinations)
+        self._devices = {}
+        # Plan entries execute() refused to move, as (entry, reason)
+        self.stale = []
+        self._scan_lock = threading.Lock()
+
+    def scan(self):
+        """Yields os.DirEntry objects of the files to sort.
+
+        Entries are streamed from os.scandir, so moving can start before the
+        listing is finished and memory stays flat however big the folder is.
+        DirEntry caches the file type from the directory listing, so there is
+        no extra stat per file.
+
+        In recursive mode directories are walked depth-first with a stack of
+        pending paths (never a full file list). Category folders at the top
+        level are skipped, directory symlinks are not followed and every
+        directory is visited once (by st_dev/st_ino), so loops are impossible.
+        """
+        visited = set()
+        stack = [(self.folder, 0)]
+        while stack:
+            path, depth = stack.pop()
+            subdirs = []
+            yield from self.list_dir(path, depth, visited, subdirs)
+            stack.extend((subdir, depth + 1) for subdir in subdirs)
+
+    def _skip_top(self):
+        """Names of the top-level folders a recursive scan must not enter."""
+        skip_top = set(self.index.categories)
+        skip_top.add(self.index.default)
+        skip_top.add(DUPLICATES_CATEGORY)
+        if self.rules is not None:
+            skip_top.update(self.rules.top_folders())
+        return skip_top
+
+    def list_dir(self, path, depth, visited, subdirs):
+        """Scan stage for one directory: yields its files and appends its subfolders to subdirs.
+
+        visited is the set of (st_dev, st_ino) of the directories seen so far
+        in the run; a directory already in it yields nothing. Directories may
+        be listed from several threads at once (organizer/pipeline.py).
+        """
+        stats = self.stats
+        descend = self.max_depth is None or depth < self.max_depth
+        try:
+            st = os.stat(path)
+            stats.add(fs_calls=1)
+        except OSError:
+            return
+        key = (st.st_dev, st.st_ino)
+        with self._scan_lock:
+            if key in visited:
+                return
+            visited.add(key)
+        self._devices[path] = st.st_dev
+
+        cache = self.scan_cache
+        settled = None
+        if cache is not None:
+            cached = cache.unchanged_subdirs(path, st.st_mtime_ns)
+            # An unchanged mtime says nothing was added or removed, but a file
+            # edited in place does not touch it. That matters only when size,
+            # dates or content decide where a file goes: then the files left
+            # in place are stat'ed one by one before the listing is skipped
+            if cached is None or self._settled_by_content:
+                settled = cache.settled_files(path)
+            if cached is not None and (settled is None or self._settled_unchanged(settled)):
+                stats.add(cached_dirs=1)
+                subdirs.extend(cached)
+                return
+
+        try:
+            entries = os.scandir(path)
+            stats.add(fs_calls=1)
+        except OSError:
+            # Unreadable subfolder: skip it rather than abort the whole run
+            return
+        excluded = self._excluded
+        prefix_len = len(self.folder) + len(os.sep)
+        skip_top = self._skip_top() if depth == 0 else ()
+        listed = []
+        with entries:
+            for entry in entries:
+                if excluded is not None:
+                    relative = entry.path[prefix_len:].replace(os.sep, "/")
+                    if excluded(entry.name) or excluded(relative):
+                        continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if descend and entry.name not in skip_top:
+                            listed.append(entry.path)
+                    elif entry.is_file():
+                        if entry.name.endswith(TEMP_SUFFIXES):
+                            # Unfinished copy of a cross-device move and its checkpoint (organizer/transfer.py)
+                            continue
+                        if settled and entry.path in settled and self._still_settled(entry, settled):
+                            continue
+                        yield entry
+                except OSError:
+                    # Entry vanished or can't be stat'ed (broken symlink etc.)
+                    continue
+        subdirs.extend(listed)
+        if cache is not None:
+            self._listed[path] = listed
+
+    def _settled_unchanged(self, settled):
+        """True when every file left in place in a directory is still the same."""
+        for path, (ino, size, mtime_ns) in settled.items():
+            self.stats.add(fs_calls=1)
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            if (st.st_ino, st.st_size, st.st_mtime_ns) != (ino, size, mtime_ns):
+                return False
+        return True
+
+    def _still_settled(self, entry, settled):
+        """True when a file left in place by the last run stays there (see _settled_by_content)."""
+        ino, size, mtime_ns = settled[entry.path]
+        if self._settled_by_content:
+            st = entry.stat()
+            if (st.st_ino, st.st_size, st.st_mtime_ns) != (ino, size, mtime_ns):
+                return False
+        self._settled.append((os.path.dirname(entry.path), entry.path, ino, size, mtime_ns, None))
+        return True
+
+    def scan_files(self):
+        """Scan stage of a whole run: scan(), timed when there is a timer.
+
+        With find_duplicates the listing is collected into a list and the
+        duplicate detection stage runs on it before it is returned.
+        """
+        files = self.scan() if self.timer is None else self.timer.timed("scan", self.scan())
+        if self.find_duplicates:
+            files = list(files)
+            self._detect_duplicates(files)
+        return files
+
+    def _detect_duplicates(self, entries):
+        """Duplicate detection stage: fills self.duplicates and the hashing stats."""
+        workers = self.workers if self.workers > 1 else 4
+        finder = DuplicateFinder(workers=workers, should_stop=lambda: self.cancelled)
+        start = time.perf_counter()
+        self.duplicates = finder.find(entries)
+        if self.timer is not None:
+            self.timer.add("classify", time.perf_counter() - start, 0)
+        self.stats.add(duplicates_found=len(self.duplicates),
+                       bytes_hashed=finder.bytes_hashed, hash_seconds=finder.elapsed)
+
+    def _sniff_ahead(self, files):
+        """Passes files through, sniffing the headers of each batch before it is moved."""
+        files = iter(files)
+        while True:
+            batch = list(islice(files, self.SNIFF_BATCH))
+            if not batch:
+                return
+            entries = [entry for entry in batch if not isinstance(entry, str)]
+            start = time.perf_counter()
+            self._sniffed.update(self.sniffer.classify_many(entries))
+            if self.timer is not None:
+                self.timer.add("classify", time.perf_counter() - start, 0)
+            yield from batch
+
+    def classify(self, entries):
+        """Classify stage for a batch of os.DirEntry objects: returns their targets.
+
+        Headers are sniffed for the whole batch at once. A target is what
+        move_to() takes: (source path, name, category, destination folder).
+        """
+        if self.sniffer is not None:
+            self._sniffed.update(self.sniffer.classify_many(entries))
+        return [self._target(entry) for entry in entries]
+
+    def destination(self, filename, subfolder="", category=None):
+        """Returns (category, destination path) for a file of the folder.
+
+        subfolder is the file's directory relative to the folder (recursive
+        mode); category, when given, overrides classification by extension.
+        """
+        if category is None:
+            category = self.index.classify(filename)
+        return category, os.path.join(self.folder, category, subfolder, filename)
+
+    def sort(self, files=None, progress=None):
+        """Moves files into their category folders and returns the operations log.
+
+        files may be any iterable of filenames or os.DirEntry objects; by
+        default the folder is streamed through scan(). When files has no
+        len(), progress is called with total=None.
+
+        With dry_run nothing is touched on disk; the log then describes what
+        would have been moved.
+        """
+        scanned = files is None
+        self._progress = progress
+        if scanned and self.pipeline is not None:
+            # Imported here: the pipeline is off by default and brings in asyncio
+            from .pipeline import run_pipeline
+            run_pipeline(self, progress)
+        else:
+            self._sort_files(files, progress)
+
+        if scanned and self.scan_cache is not None and not self.cancelled:
+            self.scan_cache.update(self._listed, self._settled)
+        if self.dates is not None:
+            self.dates.flush()
+        if self.sniffer is not None:
+            self.sniffer.flush()
+        return self.file_operations
+
+    def _sort_files(self, files, progress):
+        """sort() on the calling thread or the thread pool (workers)."""
+        scanned = files is None
+        if scanned:
+            files = self.scan_files()
+        listing = files
+        total = len(files) if hasattr(files, '__len__') else None
+        if self.sniffer is not None:
+            files = self._sniff_ahead(files)
+        try:
+            if self.workers > 1 or self.executor is not None:
+                self._sort_parallel(files, total, progress)
+            else:
+                self._sort_serial(files, total, progress)
+        finally:
+            if scanned and hasattr(listing, 'close'):
+                # Release the directory handle even when stopped early
+                listing.close()
+
+    def plan(self, progress=None):
+        """Runs the scan and classification of sort() without moving anything.
+
+        Returns a Plan (see organizer/plan.py) with one entry per file:
+        names are claimed exactly like a real run would claim them, so
+        renames and files left in place show up as conflicts. Each file
+        costs one stat for its size and mtime.
+        """
+        plan = Plan(self.folder)
+        files = self.scan_files()
+        listing = files
+        if self.sniffer is not None:
+            files = self._sniff_ahead(files)
+        done = 0
+        try:
+            for entry in files:
+                if self.cancelled:
+                    break
+                if self.timer is None:
+                    src_path, filename, category, dest_dir = self._target(entry)
+                else:
+                    with self.timer.measure("classify"):
+                        src_path, filename, category, dest_dir = self._target(entry)
+                try:
+                    st = os.stat(src_path) if isinstance(entry, str) else entry.stat()
+                except OSError:
+                    continue
+                self.stats.add(fs_calls=1)
+                final_name = self.conflicts.claim(dest_dir, filename, src_path)
+                if final_name is None:
+                    conflict = IDENTICAL if self.conflicts.policy == DEDUPE else SKIPPED
+                    final_name = filename
+                elif final_name != filename:
+                    conflict = RENAMED
+                else:
+                    conflict = NO_CONFLICT
+                plan.add(src_path, os.path.join(dest_dir, final_name), category,
+                         st.st_size, st.st_mtime_ns, conflict)
+
+                done += 1
+                if progress is not None:
+                    progress(done, None)
+        finally:
+            if hasattr(listing, 'close'):
+                listing.close()
+        if self.dates is not None:
+            self.dates.flush()
+        if self.sniffer is not None:
+            self.sniffer.flush()
+        return plan
+
+    def execute(self, plan, progress=None):
+        """Carries out a Plan made earlier (possibly by another process).
+
+        Every move is re-validated right before it happens (see
+        check_source() in organizer/plan.py): files that changed or vanished since planning,
+        and destinations that got taken meanwhile, are left alone and listed
+        in self.stale as (entry, reason). Returns the operations log like
+        sort().
+        """
+        self.stale = []
+        self._progress = progress
+        if not self.dry_run:
+            self._check_space(plan)
+        entries = (entry for entry in plan if entry.moves)
+        total = len(plan) - sum(plan.conflict_counts().get(c, 0) for c in STAYS)
+        execute_one = self._execute_one
+        if self.timer is not None:
+            def execute_one(entry):
+                with self.timer.measure("move"):
+                    return self._execute_one(entry)
+        if self.workers > 1 or self.executor is not None:
+            self._sort_parallel(entries, total, progress, execute_one)
+        else:
+            self._sort_serial(entries, total, progress, execute_one)
+        return self.file_operations
+
+    def _check_space(self, plan):
+        """Raises OSError(ENOSPC) before anything is moved when the files of
+        the plan that go to another device do not fit there."""
+        def transfers():
+            for entry in plan:
+                if not entry.moves:
+                    continue
+                try:
+                    src_dev = self._device_of(os.path.dirname(entry.source))
+                except OSError:
+                    continue  # gone: execute() reports it as stale
+                yield src_dev, os.path.dirname(entry.destination), entry.size
+        check_space(transfers(), self.mover.min_free)
+
+    def _execute_one(self, entry):
+        """Moves one PlanEntry to its planned destination, or records why it can't."""
+        reason = check_source(entry)
+        self.stats.add(fs_calls=1)
+        if reason is None and os.path.lexists(entry.destination):
+            reason = "the destination name is taken"
+        if reason is not None:
+            # list.append is atomic, so workers can call this concurrently
+            self.stale.append((entry, reason))
+            return None
+        if self.dry_run:
+            return {'source': entry.source, 'destination': entry.destination}
+
+        operation = {
+            'source': entry.source,
+            'destination': entry.destination,
+            'size': entry.size,
+            'mtime': entry.mtime
+        }
+        dest_dir = os.path.dirname(entry.destination)
+        dest_dev = self._ensure_dir(dest_dir)
+        src_dev = self._device_of(os.path.dirname(entry.source))
+        try:
+            if not self._journaled_move(operation, src_dev == dest_dev):
+                return None
+        except FileExistsError:
+            self.stale.append((entry, "the destination name is taken"))
+            return None
+        if entry.conflict == RENAMED:
+            self.stats.add(renamed=1)
+        return operation
+
+    def _sort_serial(self, files, total, progress, move_one=None):
+        """sort() on the calling thread, one file at a time."""
+        move_one = move_one or self._move_one
+        done = 0
+        for filename in files:
+            if self.cancelled:
+                break
+
+            operation = move_one(filename)
+            if operation is not None:
+                self.record(operation)
+
+            done += 1
+            if progress is not None:
+                progress(done, total, operation)
+
+    def record(self, operation):
+        """Logs a finished move (called on the sorting thread only).
+
+        The journal has it already: intend() wrote it before the move.
+        """
+        self.moved += 1
+        if self.journal is not None:
+            self.journal.record(operation)
+        if self.keep_operations:
+            self.file_operations.append(operation)
+
+    def _target(self, entry):
+        """Returns (source path, name, category, destination folder) of a name or os.DirEntry."""
+        if isinstance(entry, str):
+            filename = entry
+            src_path = os.path.join(self.folder, filename)
+            subfolder = ""
+        else:
+            src_path = entry.path
+            filename = entry.name
+            subfolder = src_path[len(self.folder) + 1:-len(filename) - 1]
+        category = DUPLICATES_CATEGORY
+        if src_path in self.duplicates:
+            dest_path = os.path.join(self.folder, DUPLICATES_CATEGORY, subfolder, filename)
+        else:
+            sniffed = self._sniffed.pop(src_path, None)
+            category, dest_path = self.destination(filename, subfolder, sniffed)
+            stat = (lambda: os.stat(src_path)) if isinstance(entry, str) else entry.stat
+            folder = None
+            if self.rules is not None:
+                folder = self.rules.match(filename, category, stat, self._started,
+                                          reclassified=sniffed is not None)
+                if folder is not None:
+                    dest_path = os.path.join(self.folder, folder, subfolder, filename)
+            if folder is None and self.dates is not None and category in self.dates.categories:
+                date_folder = self.dates.subfolder(src_path, stat())
+                dest_path = os.path.join(self.folder, category, date_folder, subfolder, filename)
+        return src_path, filename, category, os.path.dirname(dest_path)
+
+    def _move_one(self, entry):
+        """Moves one file (name or os.DirEntry) into its category folder.
+
+        Returns the log entry, or None when the file was left in place
+        because of a name conflict.
+        """
+        timer = self.timer
+        if timer is None:
+            return self.move_to(entry, self._target(entry))
+        with timer.measure("classify"):
+            target = self._target(entry)
+        with timer.measure("move"):
+            return self.move_to(entry, target)
+
+    def move_to(self, entry, target):
+        """Move stage for one file: moves it to the target classify() chose for it.
+
+        Returns the log entry, which record() then logs, or None when the
+        file was left in place (see _move_one).
+        """
+        src_path, filename, category, dest_dir = target
+
+        # Never overwrite: pick a free name from the folder's in-memory index
+        final_name = self.conflicts.claim(dest_dir, filename, src_path)
+        while True:
+            if final_name is None:
+                if self.conflicts.policy == DEDUPE:
+                    self.stats.add(duplicates=1)
+                else:
+                    self.stats.add(skipped=1)
+                if self.scan_cache is not None and not isinstance(entry, str):
+                    self._remember_settled(entry, category)
+                return None
+            dest_path = os.path.join(dest_dir, final_name)
+
+            operation = {
+                'source': src_path,
+                'destination': dest_path
+            }
+            if self.dry_run:
+                break
+            # Size and mtime survive both rename and copy; undo uses them to
+            # notice files that were changed or replaced after the sort
+            st = os.stat(src_path) if isinstance(entry, str) else entry.stat()
+            self.stats.add(fs_calls=1)
+            operation['size'] = st.st_size
+            operation['mtime'] = st.st_mtime_ns
+            dest_dev = self._ensure_dir(dest_dir)
+            src_dev = self._device_of(os.path.dirname(src_path))
+            try:
+                if not self._journaled_move(operation, src_dev == dest_dev):
+                    return None
+                break
+            except FileExistsError:
+                # Created after the folder was listed; the index has the name
+                # now, so the next claim resolves the conflict as usual
+                final_name = self.conflicts.claim(dest_dir, filename, src_path)
+        if final_name != filename:
+            self.stats.add(renamed=1)
+        return operation
+
+    def _remember_settled(self, entry, category):
+        """Records a file left in place, so that the next run does not process it again."""
+        directory = entry.path[:-len(entry.name) - 1]
+        if not self._settled_by_content:
+            # Only its name keeps it in place; the stat would never be compared.
+            # list.append is atomic, so workers can call this concurrently
+            self._settled.append((directory, entry.path, 0, 0, 0, category))
+            return
+        try:
+            st = entry.stat()
+        except OSError:
+            return
+        self._settled.append((directory, entry.path, st.st_ino, st.st_size, st.st_mtime_ns, category))
+
+    def _device_of(self, directory):
+        """Returns st_dev of a directory, stat'ing it only the first time."""
+        dev = self._devices.get(directory)
+        if dev is None:
+            dev = os.stat(directory).st_dev
+            self._devices[directory] = dev
+            self.stats.add(fs_calls=1)
+        return dev
+
+    def _ensure_dir(self, directory):
+        """Creates a destination folder once per run and returns its st_dev."""
+        dev = self._devices.get(directory)
+        if dev is None:
+            # Two workers may race here; exist_ok makes that harmless
+            os.makedirs(directory, exist_ok=True)
+            dev = os.stat(directory).st_dev
+            self._devices[directory] = dev
+            self.stats.add(dirs_created=1, fs_calls=2)
+        return dev
+
+    def _journaled_move(self, operation, same_device):
+        """_move_file() for an operation, written to the journal first.
+
+        Write-ahead: a crash right after the move can't lose it. When the
+        move does not happen (stopped copy, taken name, any error) the
+        journal's record of it is aborted.
+        """
+        journal = self.journal
+        if journal is None:
+            return self._move_file(operation['source'], operation['destination'],
+                                   same_device, operation['size'])
+        journal.intend(operation)
+        try:
+            moved = self._move_file(operation['source'], operation['destination'],
+                                    same_device, operation['size'])
+        except BaseException:
+            journal.abort(operation)
+            raise
+        if not moved:
+            journal.abort(operation)
+        return moved
+
+    def _move_file(self, src_path, dest_path, same_device, size):
+        """Moves one file: rename on the same device, copy+delete otherwise.
+
+        Returns False when cancel() stopped a copy halfway; the file is then
+        still in place and the next run resumes the copy. Raises
+        FileExistsError when dest_path exists: nothing is ever replaced.
+        """
+        stats = self.stats
+        if same_device:
+            try:
+                rename_no_replace(src_path, dest_path)
+                stats.add(files=1, renames=1, fs_calls=1)
+                return True
+            except OSError as e:
+                # Different device after all (bind mounts, overlay fs): copy below
+                if e.errno != errno.EXDEV:
+                    raise
+                stats.add(fs_calls=1)
+
+        copying = getattr(self._progress, 'copying', None)
+        reported = [0]
+
+        def on_bytes(count):
+            reported[0] += count
+            copying(src_path, count)
+        try:
+            copied = self.mover.move(src_path, dest_path, on_bytes if copying else None,
+                                     lambda: self.cancelled)
+        finally:
+            if reported[0]:
+                # The finished move is reported with its full size by the sorting thread
+                copying(src_path, -reported[0])
+        stats.add(fs_calls=1)
+        if copied is None:
+            return False
+        stats.add(files=1, cross_device=1, bytes_copied=copied, bytes_resumed=size - copied)
+        return True
+
+    def _sort_parallel(self, files, total, progress, move_one=None):
+        """sort() with a bounded thread pool.
+
+        Only this thread touches file_operations: futures are collected in
+        submission order, so the log is ordered and holds exactly the moves
+        that happened. On cancel or error no new moves are submitted and the
+        ones already in flight are drained into the log.
+        """
+        move_one = move_one or self._move_one
+        window = self.workers * self.QUEUE_PER_WORKER
+        pending = deque()
+        files = iter(files)
+        done = 0
+        error = None
+
+        own_pool = self.executor is None
+        pool = ThreadPoolExecutor(max_workers=self.workers) if own_pool else self.executor
+        try:
+            while True:
+                while not self.cancelled and error is None and len(pending) < window:
+                    filename = next(files, None)
+                    if filename is None:
+                        break
+                    pending.append(pool.submit(move_one, filename))
+                if not pending:
+                    break
+
+                try:
+                    operation = pending.popleft().result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+                    continue
+                if operation is not None:
+                    self.record(operation)
+
+                done += 1
+                if progress is not None:
+                    progress(done, total, operation)
+        finally:
+            if own_pool:
+                pool.shutdown()
+
+        if error is not None:
+            raise error
+
+    def cancel(self):
+        """Asks a running sort() to stop after the current file."""
+        self.cancelled = True
+
+
+def _compile_globs(patterns):
+    """Combines glob patterns into one compiled matcher (None when there are none)."""
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns)).match
+
+
+def load_log(log_path):
+    """Reads a JSON operations log written by older versions (before the journal)."""
+    with open(log_path, encoding='utf-8') as log_file:
+        return json.load(log_file)
+
+
+def redo_operations(operations, progress=None, total=None):
+    """Replays moves (oldest first), e.g. from a journal after an undo.
+
+    Moves whose source is gone or whose destination is taken are skipped,
+    so replaying the same journal twice is harmless. Returns the number of
+    files moved and a list of (operation, exception) pairs.
+    """
+    done = 0
+    moved = 0
+    errors = []
+
+    for operation in operations:
+        try:
+            source_path = operation['source']
+            dest_path = operation['destination']
+            if os.path.exists(source_path) and not os.path.exists(dest_path):
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                shutil.move(source_path, dest_path)
+                moved += 1
+        except Exception as e:
+            errors.append((operation, e))
+
+        done += 1
+        if progress is not None:
+            progress(done, total, operation)
+
+    return moved, errors
@@ -0,0 +1,216 @@
+"""
+Batch sorting: many folders sorted side by side over one thread pool.
+
+JobQueue takes folders (jobs) and sorts up to max_jobs of them at once.
+The moves of all running jobs go to one shared pool of `workers` threads.
+A running job keeps at most workers * QUEUE_PER_WORKER moves in flight
+(see Organizer._sort_parallel) and the pool serves them first come, first
+served, so the running jobs get about equal shares of the threads: a huge
+folder does not starve the small ones next to it.
+
+per_device limits how many folders of one filesystem (st_dev) are sorted
+at once. Two folders on the same disk are slower together than one after
+the other, while folders on different disks or mounts overlap freely.
+Jobs start in the order they were submitted, but a job waiting for its
+device does not hold up the jobs behind it.
+
+Every job has its own Organizer, Progress and journal, and is canceled on
+its own with job.cancel().
+"""
+
+import contextlib
+import os
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .engine import Organizer
+from .journal import Journal, journal_path
+from .progress import Progress
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+CANCELED = "canceled"
+FAILED = "failed"
+
+
+class Job:
+    """One folder of a JobQueue: its Organizer options, status and progress.
+
+    status goes from "queued" through "running" to "finished", "canceled"
+    or "failed" (error then holds the exception). operations is the
+    operations log of the run once it is over.
+    """
+
+    def __init__(self, queue, number, folder, options, journal=None, profiler=None):
+        self.number = number
+        self.folder = os.path.normpath(folder)
+        self.options = options
+        self.journal = journal
+        self.profiler = profiler
+        self.device = _device(self.folder)
+        self.status = QUEUED
+        self.organizer = None
+        self.operations = None
+        self.error = None
+        self.progress = Progress()
+        self.cancel_requested = False
+        self._queue = queue
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """Drops the job if it is still queued, or stops it after the current files."""
+        self._queue._cancel(self)
+
+    def wait(self, timeout=None):
+        """Blocks until the job is over; returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+def _device(folder):
+    try:
+        return os.stat(folder).st_dev
+    except OSError:
+        # The job fails when it starts, with the real error
+        return None
+
+
+class JobQueue:
+    """Sorts the submitted folders, max_jobs at a time, over one thread pool.
+
+    per_device=None lifts the per-device limit. With log_dir every job
+    gets its own journal there (journal_prefix_<timestamp>.jsonl) unless
+    submit() is given one.
+    """
+
+    def __init__(self, workers=8, max_jobs=4, per_device=1, log_dir=None, journal_prefix="sort_log"):
+        self.workers = max(1, int(workers))
+        self.max_jobs = max(1, int(max_jobs))
+        self.per_device = per_device
+        self.log_dir = log_dir
+        self.journal_prefix = journal_prefix
+        self.jobs = []
+        self._waiting = deque()
+        self._running = 0
+        self._busy_devices = Counter()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pool = None
+        self._closed = False
+
+    def submit(self, folder, journal=None, profiler=None, run_options=None, **options):
+        """Queues a folder; options are passed on to Organizer. Returns the Job.
+
+        run_options (plain values, see RUN_OPTIONS in organizer/cli.py) are
+        recorded in the journal the queue creates, for --resume.
+
+        profiler (a Profiler) is entered on the job's thread around the sort.
+        Give every job its own Profiler and path: only one of them runs
+        cProfile at a time, the others time the stages only.
+        """
+        if journal is None and self.log_dir is not None and not options.get("dry_run"):
+            journal = Journal(journal_path(self.log_dir, self.journal_prefix), os.path.normpath(folder),
+                              run_options)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("the job queue is closed")
+            job = Job(self, len(self.jobs) + 1, folder, options, journal, profiler)
+            self.jobs.append(job)
+            self._waiting.append(job)
+            self._schedule()
+        return job
+
+    @property
+    def active(self):
+        """Jobs that are queued or running."""
+        with self._lock:
+            return [job for job in self.jobs if not job.done]
+
+    def _schedule(self):
+        # Called with the lock held
+        for job in list(self._waiting):
+            if self._running >= self.max_jobs:
+                break
+            if self.per_device and self._busy_devices[job.device] >= self.per_device:
+                continue
+            self._waiting.remove(job)
+            self._running += 1
+            self._busy_devices[job.device] += 1
+            job.status = RUNNING
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jobs")
+            threading.Thread(target=self._run, args=(job, self._pool),
+                             name=f"job-{job.number}", daemon=True).start()
+
+    def _run(self, job, pool):
+        options = dict(job.options)
+        options.setdefault("workers", self.workers)
+        status = FAILED
+        try:
+            organizer = Organizer(job.folder, journal=job.journal, executor=pool, **options)
+            job.organizer = organizer
+            if job.cancel_requested:
+                organizer.cancel()
+            with job.profiler or contextlib.nullcontext():
+                job.operations = organizer.sort(progress=job.progress)
+            status = CANCELED if organizer.cancelled else FINISHED
+        except Exception as e:
+            job.error = e
+        finally:
+            if job.journal is not None:
+                if status == FAILED:
+                    # No end marker: the journal shows an interrupted run that can be resumed
+                    job.journal.close()
+                else:
+                    job.journal.finish(status)
+            with self._lock:
+                job.status = status
+                self._running -= 1
+                self._busy_devices[job.device] -= 1
+                job._done.set()
+                self._schedule()
+                self._idle.notify_all()
+
+    def _cancel(self, job):
+        with self._lock:
+            job.cancel_requested = True
+            if job.status == QUEUED:
+                self._waiting.remove(job)
+                job.status = CANCELED
+                job._done.set()
+                self._idle.notify_all()
+                return
+            organizer = job.organizer
+        if organizer is not None:
+            organizer.cancel()
+        # else: _run() is creating the organizer and cancels it right after
+
+    def cancel_all(self):
+        for job in self.active:
+            job.cancel()
+
+    def wait(self, timeout=None):
+        """Blocks until every submitted job is over; returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._waiting and not self._running, timeout)
+
+    def close(self, cancel=False):
+        """Stops taking jobs, waits for the submitted ones and frees the threads."""
+        with self._lock:
+            self._closed = True
+        if cancel:
+            self.cancel_all()
+        self.wait()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close(cancel=exc_info[0] is not None)
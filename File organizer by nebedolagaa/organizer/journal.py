@@ -0,0 +1,271 @@
+"""
+Append-only, crash-safe journal of the moves of a sort run (JSON lines).
+
+Every move is written to the journal right before it happens (write-ahead),
+so a crash or a cancel halfway through still leaves a complete record for
+undo. A move that then does not happen (the name was taken meanwhile, a
+copy was stopped, an error) is followed by an "aborted" record, and the
+readers below drop the move it cancels. Only a crash between the record
+and the move leaves a record of a move that did not happen; undo skips
+it, as there is nothing at its destination. The file looks like:
+
+    {"type": "run", "folder": "...", "started": "2024-01-01T12:00:00", "options": {...}}
+    {"source": "...", "destination": "..."}
+    {"type": "aborted", "source": "...", "destination": "..."}
+    ...
+    {"type": "end", "status": "finished", "moves": 1234}
+
+A journal without an "end" line belongs to a run that was interrupted.
+"options" holds the sorting options of the run (see RUN_OPTIONS in
+organizer/cli.py), so that --resume continues it the same way.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+JOURNAL_SUFFIX = ".jsonl"
+ABORTED = "aborted"
+
+# Paths handed out by journal_path() in this process (journals are created lazily)
+_reserved = set()
+_reserved_lock = threading.Lock()
+
+
+def journal_path(log_dir, prefix="sort_log"):
+    """Returns <log_dir>/<prefix>_<timestamp>.jsonl for a new run.
+
+    Runs started within the same second (a batch of folders, a sort right
+    after an undo) get "_2", "_3", ... so no run appends to another's journal.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(log_dir, f"{prefix}_{timestamp}")
+    path = base + JOURNAL_SUFFIX
+    n = 1
+    with _reserved_lock:
+        while path in _reserved or os.path.exists(path):
+            n += 1
+            path = f"{base}_{n}{JOURNAL_SUFFIX}"
+        _reserved.add(path)
+    return path
+
+
+class Journal:
+    """Writer of one journal file; intend() may be called from worker threads.
+
+    Records reach the OS right away (a killed process loses nothing); they
+    are fsync'ed in batches of FSYNC_EVERY records or every FSYNC_INTERVAL
+    seconds, which keeps the cost per move low while bounding what a power
+    failure can take. The file is created with the first record, so runs
+    that move nothing leave no journal behind. Opening an existing journal
+    appends to it (resume).
+    """
+
+    FSYNC_EVERY = 1000
+    FSYNC_INTERVAL = 1.0
+
+    def __init__(self, path, folder=None, options=None):
+        self.path = path
+        self.folder = folder
+        self.options = options
+        self.moves = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        resumed = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if resumed:
+            self._write({"type": "resume", "started": datetime.now().isoformat(timespec='seconds')})
+        else:
+            record = {"type": "run", "folder": self.folder,
+                      "started": datetime.now().isoformat(timespec='seconds')}
+            if self.options is not None:
+                record["options"] = self.options
+            self._write(record)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if (self._unsynced >= self.FSYNC_EVERY
+                or time.monotonic() - self._last_sync >= self.FSYNC_INTERVAL):
+            self._sync()
+
+    def intend(self, operation):
+        """Appends one move ({'source': ..., 'destination': ...}) right before it happens."""
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._write(operation)
+            self.moves += 1
+
+    def abort(self, operation):
+        """Cancels the record intend() wrote for a move that did not happen."""
+        with self._lock:
+            self._write({"type": ABORTED, "source": operation['source'],
+                         "destination": operation['destination']})
+            self.moves -= 1
+
+    def record(self, operation):
+        """Called once the move happened; intend() has written it already."""
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def finish(self, status="finished"):
+        """Writes the end marker ("finished" or "canceled") and closes the file."""
+        with self._lock:
+            if self._file is not None:
+                self._write({"type": "end", "status": status, "moves": self.moves})
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+
+def _parse(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        # A line cut short by a crash: everything before it is still valid
+        return None
+
+
+def _key(record):
+    return record.get("source"), record.get("destination")
+
+
+def read_journal(path):
+    """Yields the moves of a journal, oldest first (streaming).
+
+    An aborted record cancels the latest move before it with the same
+    source and destination. Moves that may still be cancelled are held
+    back until the next record about them, so only the (rare) aborted
+    paths are kept in memory.
+    """
+    marker = f'"type": "{ABORTED}"'
+    with open(path, encoding='utf-8') as f:
+        # Aborts are rare: only their lines are parsed in this pass
+        aborted = {_key(record) for record in (_parse(line) for line in f if marker in line)
+                   if record is not None and record.get("type") == ABORTED}
+    held = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = _parse(line)
+            if record is None:
+                continue
+            kind = record.get("type")
+            if kind == ABORTED:
+                held.pop(_key(record), None)
+            elif kind is None:
+                key = _key(record)
+                if key not in aborted:
+                    yield record
+                    continue
+                if key in held:
+                    yield held[key]
+                held[key] = record
+    yield from held.values()
+
+
+def read_journal_reversed(path, block_size=1 << 16):
+    """Yields the moves of a journal, newest first, reading the file backwards.
+
+    Memory use is bounded by the block size and the longest line, however
+    many moves the journal holds. Moves cancelled by an aborted record are
+    left out.
+    """
+    pending = Counter()
+    for record in _records_reversed(path, block_size):
+        kind = record.get("type")
+        if kind == ABORTED:
+            pending[_key(record)] += 1
+        elif kind is None:
+            key = _key(record)
+            if pending[key]:
+                pending[key] -= 1
+            else:
+                yield record
+
+
+def _records_reversed(path, block_size):
+    """Yields every record of a journal, newest first."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + tail).split(b"\n")
+            # The first piece may be the end of a line that starts in an earlier block
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                record = _parse(line.decode('utf-8')) if line.strip() else None
+                if record is not None:
+                    yield record
+        if tail.strip():
+            record = _parse(tail.decode('utf-8'))
+            if record is not None:
+                yield record
+
+
+def journal_info(path):
+    """Returns {'folder', 'options', 'status', 'moves'}; status is None for an interrupted run.
+
+    options is None for journals written before the options were recorded.
+    """
+    info = {"folder": None, "options": None, "status": None, "moves": 0}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = _parse(line)
+            if record is None:
+                continue
+            kind = record.get("type")
+            if kind is None:
+                info["moves"] += 1
+            elif kind == ABORTED:
+                info["moves"] -= 1
+            elif kind == "run":
+                info["folder"] = record.get("folder")
+                info["options"] = record.get("options")
+            elif kind in ("end", "undone", "replayed"):
+                info["status"] = record.get("status", kind)
+            elif kind == "resume":
+                info["status"] = None
+    return info
+
+
+def _mark(path, record):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def mark_undone(path):
+    """Appends an "undone" marker after the journal's moves were reverted."""
+    _mark(path, {"type": "undone", "status": "undone"})
+
+
+def mark_replayed(path):
+    """Appends a "replayed" marker: the moves are in effect again and can be undone."""
+    _mark(path, {"type": "replayed", "status": "finished"})
@@ -0,0 +1,112 @@
+"""
+Compact in-memory log of the moves of a run.
+
+A move used to be kept as a dict with two absolute paths. At millions of
+files that is hundreds of MB, although every path repeats the same folder
+and one of a few category folders. OperationLog splits each path into an
+interned folder (relative to the run's folder, so "Images" or
+"Documents/2024" is stored once) and a file name, keeps folder ids, sizes
+and mtimes in array columns, and shares one string between the source
+and destination names when the file was not renamed.
+
+It behaves like a read-only list of operation dicts: len(), indexing,
+iteration oldest first and reversed() newest first, both without copying;
+the dicts are built on demand.
+"""
+
+import os
+from array import array
+from collections.abc import Sequence
+
+# Size/mtime of moves that did not record them (dry runs, old logs)
+UNKNOWN = -1
+
+
+class OperationLog(Sequence):
+    """Column-wise list of {'source', 'destination'[, 'size', 'mtime']} moves."""
+
+    def __init__(self, folder):
+        self.folder = os.path.normpath(folder)
+        self._prefix = self.folder + os.sep
+        # Interned folders, relative to self.folder (absolute if outside it),
+        # and the same as absolute prefixes ready to prepend to a name
+        self._dirs = []
+        self._dir_prefixes = []
+        self._dir_ids = {}
+        self._src_dir = array('I')
+        self._src_name = []
+        self._dst_dir = array('I')
+        self._dst_name = []
+        self._size = array('q')
+        self._mtime = array('q')
+
+    def _dir_id(self, directory):
+        if directory == self.folder:
+            relative = ""
+        elif directory.startswith(self._prefix):
+            relative = directory[len(self._prefix):]
+        else:
+            relative = directory
+        dir_id = self._dir_ids.get(relative)
+        if dir_id is None:
+            dir_id = self._dir_ids[relative] = len(self._dirs)
+            self._dirs.append(relative)
+            # os.path.join keeps an absolute "relative" folder as it is
+            self._dir_prefixes.append(os.path.join(self.folder, relative, ""))
+        return dir_id
+
+    def _path(self, dir_id, name):
+        return self._dir_prefixes[dir_id] + name
+
+    def add(self, source, destination, size=UNKNOWN, mtime=UNKNOWN):
+        src_dir, src_name = os.path.split(source)
+        dst_dir, dst_name = os.path.split(destination)
+        if dst_name == src_name:
+            dst_name = src_name
+        self._src_dir.append(self._dir_id(src_dir))
+        self._src_name.append(src_name)
+        self._dst_dir.append(self._dir_id(dst_dir))
+        self._dst_name.append(dst_name)
+        self._size.append(size)
+        self._mtime.append(mtime)
+
+    def append(self, operation):
+        """Adds an operation dict (as returned by Organizer._move_one)."""
+        self.add(operation['source'], operation['destination'],
+                 operation.get('size', UNKNOWN), operation.get('mtime', UNKNOWN))
+
+    def source(self, i):
+        return self._path(self._src_dir[i], self._src_name[i])
+
+    def destination(self, i):
+        return self._path(self._dst_dir[i], self._dst_name[i])
+
+    def __len__(self):
+        return len(self._src_name)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("operation index out of range")
+        return self._item(i)
+
+    def _item(self, i):
+        operation = {
+            'source': self.source(i),
+            'destination': self.destination(i)
+        }
+        if self._size[i] != UNKNOWN:
+            operation['size'] = self._size[i]
+            operation['mtime'] = self._mtime[i]
+        return operation
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._item(i)
+
+    def __reversed__(self):
+        for i in range(len(self) - 1, -1, -1):
+            yield self._item(i)
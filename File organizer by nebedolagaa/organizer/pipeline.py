@@ -0,0 +1,220 @@
+"""
+Asyncio pipeline for high-latency folders (SMB/NFS mounts).
+
+On a network mount every scandir, stat, mkdir and rename is a round trip,
+and one thread moving files spends nearly all of its time waiting. The
+pipeline runs the three steps of a sort as stages connected by bounded
+queues, each with its own concurrency:
+
+    scan      lists up to Stages.scan directories at once (recursive runs),
+              passing files on in batches of SCAN_BATCH
+    classify  up to Stages.classify batches at once: sniffing, rules and
+              embedded dates, which may read file headers
+    move      up to Stages.move moves in flight: free name, folder, rename;
+              a worker takes MOVE_BATCH files at a time, which keeps the
+              cost of handing work to threads low on fast disks
+
+The blocking calls run on one thread pool sized for all stages; the event
+loop only passes work along, records finished moves (journal, operations
+log) and reports progress, so the log is written from a single thread as
+in the other modes. Moves are logged in the order they finish, which undo
+handles since no move of a run depends on another.
+
+Queues hold at most Stages.queue batches, so memory stays flat
+however big the folder is and a slow stage holds back the ones before it.
+
+The work of each stage is done by the Organizer's stage methods
+(list_dir, scan_files, classify, move_to, record), the same ones its
+other sort modes use; this module only schedules them.
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Concurrency of every stage and length of the queues between them
+Stages = namedtuple("Stages", "scan classify move queue", defaults=(4, 8, 64, 256))
+
+# Files handed from the scan to the classify stage, and to one move worker, at a time
+SCAN_BATCH = 64
+MOVE_BATCH = 8
+
+_DONE = object()
+
+
+def parse_stages(text):
+    """Parses "SCAN,CLASSIFY,MOVE" (e.g. "4,8,64") into Stages."""
+    try:
+        counts = [int(part) for part in text.split(",")]
+    except ValueError:
+        counts = []
+    if len(counts) != 3 or min(counts) < 1:
+        raise ValueError(f"expected SCAN,CLASSIFY,MOVE concurrency like 4,8,64, not {text!r}")
+    return Stages(*counts)
+
+
+def run_pipeline(organizer, progress=None):
+    """Sorts the organizer's folder through the pipeline; see sort_pipelined()."""
+    # asyncio takes longer to import than the rest of the package: only
+    # runs that use the pipeline pay for it
+    import asyncio
+    asyncio.run(sort_pipelined(organizer, progress))
+
+
+async def sort_pipelined(organizer, progress=None):
+    """Scans, classifies and moves the files of organizer.folder as concurrent stages.
+
+    Uses organizer.pipeline (Stages). Stops early on organizer.cancel();
+    on the first error no new work is started, the moves in flight are
+    finished and logged, and the error is raised.
+    """
+    import asyncio
+    stages = organizer.pipeline
+    loop = asyncio.get_running_loop()
+    files = asyncio.Queue(maxsize=stages.queue)
+    moves = asyncio.Queue(maxsize=stages.queue)
+    state = {"error": None, "done": 0}
+    timer = organizer.timer
+
+    def stopped():
+        return organizer.cancelled or state["error"] is not None
+
+    def fail(error):
+        if state["error"] is None:
+            state["error"] = error
+
+    with ThreadPoolExecutor(max_workers=stages.scan + stages.classify + stages.move,
+                            thread_name_prefix="pipeline") as pool:
+
+        def emit(batch):
+            # Called on a scan thread; waits while the classify stage is behind
+            asyncio.run_coroutine_threadsafe(files.put(batch), loop).result()
+
+        def scan_dir(path, depth, visited):
+            subdirs = []
+            batch = []
+            entries = organizer.list_dir(path, depth, visited, subdirs)
+            try:
+                # Only the listing is timed, not the waits in emit()
+                for entry in entries if timer is None else timer.timed("scan", entries):
+                    if stopped():
+                        break
+                    batch.append(entry)
+                    if len(batch) >= SCAN_BATCH:
+                        emit(batch)
+                        batch = []
+            finally:
+                # Releases the directory handle when stopped early
+                entries.close()
+            if batch:
+                emit(batch)
+            return subdirs
+
+        def scan_all():
+            # Duplicate detection needs every file before the first move
+            listing = organizer.scan_files()
+            for start in range(0, len(listing), SCAN_BATCH):
+                if stopped():
+                    break
+                emit(listing[start:start + SCAN_BATCH])
+
+        async def scanner(directories, visited):
+            while True:
+                path, depth = await directories.get()
+                try:
+                    if not stopped():
+                        subdirs = await loop.run_in_executor(pool, scan_dir, path, depth, visited)
+                        for subdir in subdirs:
+                            directories.put_nowait((subdir, depth + 1))
+                except Exception as e:
+                    fail(e)
+                finally:
+                    directories.task_done()
+
+        async def scan():
+            try:
+                if organizer.find_duplicates:
+                    await loop.run_in_executor(pool, scan_all)
+                else:
+                    directories = asyncio.Queue()
+                    directories.put_nowait((organizer.folder, 0))
+                    visited = set()
+                    scanners = [asyncio.create_task(scanner(directories, visited))
+                                for _ in range(stages.scan)]
+                    await directories.join()
+                    for task in scanners:
+                        task.cancel()
+            except Exception as e:
+                fail(e)
+            finally:
+                for _ in range(stages.classify):
+                    await files.put(_DONE)
+
+        def classify_batch(batch):
+            start = time.perf_counter()
+            targets = list(zip(batch, organizer.classify(batch)))
+            if timer is not None:
+                timer.add("classify", time.perf_counter() - start, len(batch))
+            return targets
+
+        async def classifier():
+            while True:
+                batch = await files.get()
+                if batch is _DONE:
+                    return
+                if stopped():
+                    # Keep draining so that scan threads never block on a full queue
+                    continue
+                try:
+                    targets = await loop.run_in_executor(pool, classify_batch, batch)
+                except Exception as e:
+                    fail(e)
+                    continue
+                for start in range(0, len(targets), MOVE_BATCH):
+                    await moves.put(targets[start:start + MOVE_BATCH])
+
+        async def classify():
+            await asyncio.gather(*(classifier() for _ in range(stages.classify)))
+            for _ in range(stages.move):
+                await moves.put(_DONE)
+
+        def move_batch(batch):
+            """Moves a batch; returns the operations done and the error that stopped it."""
+            operations = []
+            start = time.perf_counter()
+            try:
+                for entry, target in batch:
+                    if stopped():
+                        break
+                    operations.append(organizer.move_to(entry, target))
+            except Exception as e:
+                return operations, e
+            finally:
+                if timer is not None:
+                    timer.add("move", time.perf_counter() - start, len(operations))
+            return operations, None
+
+        async def mover():
+            while True:
+                batch = await moves.get()
+                if batch is _DONE:
+                    return
+                if stopped():
+                    continue
+                try:
+                    operations, error = await loop.run_in_executor(pool, move_batch, batch)
+                    for operation in operations:
+                        if operation is not None:
+                            organizer.record(operation)
+                        state["done"] += 1
+                        if progress is not None:
+                            progress(state["done"], None, operation)
+                except Exception as e:
+                    error = e
+                if error is not None:
+                    fail(error)
+
+        await asyncio.gather(scan(), classify(), *(mover() for _ in range(stages.move)))
+
+    if state["error"] is not None:
+        raise state["error"]
@@ -0,0 +1,178 @@
+"""
+Move plan: everything a sort would do, computed before anything is moved.
+
+Organizer.plan() runs the scan and the classification (including name
+conflicts, duplicates and sniffing) and records one entry per file:
+source, destination, size, mtime and conflict. The plan can be saved,
+reviewed, checked against the disk again with validate() and carried out
+later with Organizer.execute().
+
+Plans of big shares hold millions of entries, so they are stored column-
+wise like the operation log (organizer/oplog.py), with the categories
+interned as well: an entry is only its name (two when renamed) plus ~20
+bytes of numbers.
+"""
+
+import json
+import os
+from array import array
+from datetime import datetime
+
+from .oplog import OperationLog
+
+# Conflict of an entry: a move without conflict, a move under a new name,
+# or a file that stays in place (same name taken / identical file there)
+NO_CONFLICT = ""
+RENAMED = "renamed"
+SKIPPED = "skipped"
+IDENTICAL = "identical"
+CONFLICTS = (NO_CONFLICT, RENAMED, SKIPPED, IDENTICAL)
+STAYS = (SKIPPED, IDENTICAL)
+
+PLAN_SUFFIX = ".plan.jsonl"
+
+
+class PlanEntry:
+    """One file of a plan (a view built on demand, not stored)."""
+
+    __slots__ = ("source", "destination", "category", "size", "mtime", "conflict")
+
+    def __init__(self, source, destination, category, size, mtime, conflict):
+        self.source = source
+        self.destination = destination
+        self.category = category
+        self.size = size
+        self.mtime = mtime
+        self.conflict = conflict
+
+    @property
+    def moves(self):
+        """False for files the plan leaves in place."""
+        return self.conflict not in STAYS
+
+    def __repr__(self):
+        return f"PlanEntry({self.source!r} -> {self.destination!r}, {self.conflict or 'ok'})"
+
+
+class Plan(OperationLog):
+    """Column-wise list of PlanEntry for one folder."""
+
+    def __init__(self, folder):
+        super().__init__(folder)
+        self._categories = []
+        self._category_ids = {}
+        self._category = array('H')
+        self._conflict = array('B')
+
+    def add(self, source, destination, category, size, mtime, conflict=NO_CONFLICT):
+        """Appends an entry; source and destination are absolute paths inside the folder."""
+        category_id = self._category_ids.get(category)
+        if category_id is None:
+            category_id = self._category_ids[category] = len(self._categories)
+            self._categories.append(category)
+        super().add(source, destination, size, mtime)
+        self._category.append(category_id)
+        self._conflict.append(CONFLICTS.index(conflict))
+
+    def _item(self, i):
+        return PlanEntry(self.source(i), self.destination(i),
+                         self._categories[self._category[i]], self._size[i], self._mtime[i],
+                         CONFLICTS[self._conflict[i]])
+
+    def totals(self):
+        """Returns {category: (files, bytes)} of the files the plan moves."""
+        counts = [0] * len(self._categories)
+        sizes = [0] * len(self._categories)
+        stays = CONFLICTS.index(SKIPPED), CONFLICTS.index(IDENTICAL)
+        for category_id, size, conflict in zip(self._category, self._size, self._conflict):
+            if conflict not in stays:
+                counts[category_id] += 1
+                sizes[category_id] += size
+        return {name: (counts[i], sizes[i]) for i, name in enumerate(self._categories) if counts[i]}
+
+    def conflict_counts(self):
+        """Returns {conflict: number of entries} for renamed/skipped/identical entries."""
+        counts = [0] * len(CONFLICTS)
+        for conflict in self._conflict:
+            counts[conflict] += 1
+        return {name: counts[i] for i, name in enumerate(CONFLICTS) if name and counts[i]}
+
+    def validate(self):
+        """Checks the plan against the disk as it is now, without moving anything.
+
+        Returns a list of (entry, reason) for the moves that execute() would
+        refuse: the source is gone or its size/mtime changed since planning,
+        or the destination name got taken. Costs one stat per file and one
+        listing per destination folder.
+        """
+        stale = []
+        taken = {}
+        for entry in self:
+            if not entry.moves:
+                continue
+            reason = check_source(entry)
+            if reason is None:
+                dest_dir, dest_name = os.path.split(entry.destination)
+                names = taken.get(dest_dir)
+                if names is None:
+                    try:
+                        names = taken[dest_dir] = set(os.listdir(dest_dir))
+                    except OSError:
+                        names = taken[dest_dir] = set()
+                if dest_name in names:
+                    reason = "the destination name is taken"
+            if reason is not None:
+                stale.append((entry, reason))
+        return stale
+
+    def save(self, path):
+        """Writes the plan as JSON lines with paths relative to the folder."""
+        totals = self.totals()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"type": "plan", "folder": self.folder,
+                                "created": datetime.now().isoformat(timespec='seconds'),
+                                "entries": len(self)}, ensure_ascii=False) + "\n")
+            for i in range(len(self)):
+                src_dir = self._dirs[self._src_dir[i]]
+                dst_dir = self._dirs[self._dst_dir[i]]
+                f.write(json.dumps([
+                    f"{src_dir}{os.sep}{self._src_name[i]}" if src_dir else self._src_name[i],
+                    f"{dst_dir}{os.sep}{self._dst_name[i]}" if dst_dir else self._dst_name[i],
+                    self._categories[self._category[i]], self._size[i], self._mtime[i],
+                    CONFLICTS[self._conflict[i]],
+                ], ensure_ascii=False) + "\n")
+            f.write(json.dumps({"type": "totals", "categories": totals,
+                                "conflicts": self.conflict_counts()}, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        plan = None
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    if record.get("type") == "plan":
+                        plan = cls(record["folder"])
+                    continue
+                if plan is None:
+                    raise ValueError(f"{path} is not a plan file")
+                source, destination, category, size, mtime, conflict = record
+                plan.add(os.path.join(plan.folder, source), os.path.join(plan.folder, destination),
+                         category, size, mtime, conflict)
+        if plan is None:
+            raise ValueError(f"{path} is not a plan file")
+        return plan
+
+
+def check_source(entry):
+    """Returns why the source of a plan entry no longer matches the plan, or None."""
+    try:
+        st = os.stat(entry.source)
+    except FileNotFoundError:
+        return "the file is gone"
+    except OSError as e:
+        # No access any more, a network share that went away, ...
+        return f"the file can't be checked: {e.strerror or e}"
+    if st.st_size != entry.size or st.st_mtime_ns != entry.mtime:
+        return "the file changed since planning"
+    return None
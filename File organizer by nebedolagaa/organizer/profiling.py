@@ -0,0 +1,133 @@
+"""
+Opt-in profiling of sort runs: per-stage timers and cProfile.
+
+StageTimer adds up the time spent in each stage of a run: scan (listing
+directories), classify (category, sniffing, rules, dates) and move (free
+name, folders, rename or copy), plus undo. Pass one to Organizer(timer=...)
+or use Profiler, which also runs cProfile. Nothing is measured unless a
+timer is given, so normal runs pay nothing.
+
+With workers or the pipeline several files are in the same stage at once;
+stage times are then summed over the threads (busy time), and can add up
+to more than the run took. cProfile only sees the thread it was started on;
+profile with one worker to see where the moves spend their time.
+
+Only one cProfile can run at a time (Python 3.12 refuses a second one,
+older versions let them overwrite each other's stats), so a Profiler
+entered while another one is profiling only times the stages.
+
+The GUI profiles its runs when FILE_ORGANIZER_PROFILE names a file to write
+the cProfile stats to (one file per job); the command line has --profile FILE.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ("scan", "classify", "move", "undo")
+
+# Environment variable the GUI reads: where to write the profile of each run
+PROFILE_ENV = "FILE_ORGANIZER_PROFILE"
+
+# Held by the Profiler whose cProfile is running
+_cprofile_lock = threading.Lock()
+
+
+class StageTimer:
+    """Seconds and item counts per stage; safe to use from worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(STAGES, 0)
+
+    def add(self, stage, seconds, count=1):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + count
+
+    @contextmanager
+    def measure(self, stage, count=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, count)
+
+    def timed(self, stage, iterable):
+        """Passes the items of iterable through, timing how long each one took to produce."""
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self.add(stage, clock() - start, 0)
+                    return
+                self.add(stage, clock() - start)
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: {"seconds": round(self.seconds[stage], 6), "count": self.counts[stage]}
+                    for stage in self.seconds if self.counts[stage] or self.seconds[stage]}
+
+    def report(self):
+        """One line per stage that ran, e.g. "scan      0.412 s   120000 (3.4 us each)"."""
+        lines = []
+        for stage, data in self.as_dict().items():
+            each = data["seconds"] / data["count"] * 1e6 if data["count"] else 0.0
+            lines.append(f"{stage:9} {data['seconds']:8.3f} s {data['count']:9} ({each:.1f} us each)")
+        return "\n".join(lines)
+
+
+class Profiler:
+    """Context manager: cProfile on the current thread plus a StageTimer.
+
+    Pass profiler.timer to the Organizer. On exit the cProfile stats are
+    written to path (if given; open with python -m pstats or snakeviz).
+    When another Profiler is already profiling, cProfile is left off:
+    profiled is then False and nothing is written.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.timer = StageTimer()
+        self.profile = cProfile.Profile()
+        self.profiled = False
+
+    def __enter__(self):
+        if _cprofile_lock.acquire(blocking=False):
+            try:
+                self.profile.enable()
+            except BaseException:
+                _cprofile_lock.release()
+                raise
+            self.profiled = True
+        return self
+
+    def __exit__(self, *exc):
+        if not self.profiled:
+            return
+        self.profile.disable()
+        _cprofile_lock.release()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.profile.dump_stats(self.path)
+
+    def top(self, limit=15, sort="cumulative"):
+        """The most expensive functions as text, like pstats print_stats()."""
+        if not self.profiled:
+            return "cProfile was busy with another run: stage times only"
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
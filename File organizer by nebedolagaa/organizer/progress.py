@@ -0,0 +1,147 @@
+"""
+Progress of a long run (sort or undo), shared between the worker and the UI.
+
+The thread doing the work only rebinds a few attributes per file; the GUI
+polls them about 30 times a second and the command line a few times a
+second. Per-file callbacks into Tk (root.after for every file) flooded the
+event queue on big folders and left the bar far behind the real work.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+Snapshot = namedtuple("Snapshot", "done total bytes_done current elapsed "
+                                  "files_per_second bytes_per_second eta")
+
+
+class Progress:
+    """Progress counters: written by one thread, polled by another.
+
+    Pass it as the progress callback of Organizer.sort(), undo_operations()
+    or redo_operations(): progress(done, total, operation). A call only
+    stores numbers (atomic under the GIL), there is no lock or queue; the
+    rates and the ETA are computed by snapshot() on the polling side, over
+    the last RATE_WINDOW seconds.
+    """
+
+    RATE_WINDOW = 3.0
+
+    def __init__(self):
+        self.done = 0
+        self.total = None
+        self.bytes_done = 0
+        # Bytes of files still being copied to another device (see copying())
+        self.bytes_copying = 0
+        self.current = None
+        self.started = time.monotonic()
+        self._samples = deque()
+        self._copying_lock = threading.Lock()
+
+    def __call__(self, done, total=None, operation=None):
+        if operation is not None:
+            self.current = operation['source']
+            self.bytes_done += operation.get('size') or 0
+        self.total = total
+        self.done = done
+
+    def copying(self, path, nbytes):
+        """Counts nbytes more of a file being copied, so the rate moves inside big files.
+
+        Called by worker threads for every chunk; the engine takes the bytes
+        back (negative nbytes) before the finished move is reported.
+        """
+        with self._copying_lock:
+            self.bytes_copying += nbytes
+        self.current = path
+
+    def snapshot(self):
+        """Returns a Snapshot; meant to be called from a single polling thread."""
+        now = time.monotonic()
+        done, total, bytes_done = self.done, self.total, self.bytes_done + self.bytes_copying
+        samples = self._samples
+        samples.append((now, done, bytes_done))
+        while len(samples) > 2 and now - samples[0][0] > self.RATE_WINDOW:
+            samples.popleft()
+
+        then, done_then, bytes_then = samples[0]
+        if now - then < 0.1:
+            # Too few samples yet: average since the start
+            then, done_then, bytes_then = self.started, 0, 0
+        seconds = max(now - then, 1e-9)
+        files_per_second = (done - done_then) / seconds
+        bytes_per_second = (bytes_done - bytes_then) / seconds
+        eta = None
+        if total and files_per_second > 0:
+            eta = max(total - done, 0) / files_per_second
+        return Snapshot(done, total, bytes_done, self.current, now - self.started,
+                        files_per_second, bytes_per_second, eta)
+
+
+def format_progress(snapshot):
+    """One line of text, e.g. '1200/5000 files, 850 files/s, 12.3 MiB/s, ETA 0:05 - photo.jpg'."""
+    if snapshot.total:
+        text = f"{snapshot.done}/{snapshot.total} files"
+    else:
+        text = f"{snapshot.done} files"
+    text += f", {snapshot.files_per_second:.0f} files/s"
+    if snapshot.bytes_done:
+        text += f", {snapshot.bytes_per_second / 2**20:.1f} MiB/s"
+    if snapshot.eta is not None:
+        minutes, seconds = divmod(int(snapshot.eta), 60)
+        text += f", ETA {minutes}:{seconds:02d}"
+    if snapshot.current:
+        text += f" - {os.path.basename(snapshot.current)}"
+    return text
+
+
+class ProgressLine:
+    """Redraws a Progress as one status line on a terminal until stopped.
+
+    Use it as a context manager around the run:
+
+        with ProgressLine(progress):
+            organizer.sort(progress=progress)
+    """
+
+    def __init__(self, progress, stream=None, interval=0.25):
+        self.progress = progress
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._width = 0
+
+    def _draw(self):
+        columns = os.get_terminal_size(self.stream.fileno()).columns if self.stream.isatty() else 120
+        line = format_progress(self.progress.snapshot())[:columns - 1]
+        # Pad with spaces to wipe what is left of a longer previous line
+        self.stream.write("\r" + line.ljust(self._width))
+        self.stream.flush()
+        self._width = len(line)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._draw()
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
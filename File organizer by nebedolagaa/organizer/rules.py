@@ -0,0 +1,304 @@
+"""
+User rules: where files go, beyond the extension -> category table.
+
+Rules are read from a JSON file and tried in order; the first rule that
+matches a file decides its destination folder, files no rule matches are
+sorted by category as usual. Example (rules.example.json):
+
+    {"rules": [
+        {"category": "Videos", "min_size": "1 GB", "to": "Archive/Large"},
+        {"glob": "invoice_*.pdf", "to": "Documents/Invoices/{year}"},
+        {"regex": "^IMG_\\\\d{8}", "to": "{category}/{year}/{month}"},
+        {"older_than": "365d", "to": "Old/{category}"}
+    ]}
+
+Conditions of a rule (all optional, all must hold):
+    extensions   list of extensions, e.g. [".mkv", ".mp4"]
+    category     category the file is classified as, e.g. "Videos"
+    glob         shell pattern on the file name (case-insensitive)
+    regex        regular expression searched in the file name
+    min_size, max_size    bytes, or a string like "500 MB", "1.5 GB"
+    older_than, newer_than   mtime age, seconds or "12h", "30d", "2w", "1y"
+
+"to" is the destination folder relative to the sorted folder; it may use
+{category}, {ext}, {year}, {month} and {day} (the date is the file's
+modification time). Its first folder must be fixed text or {category},
+so that recursive runs know which folders hold sorted files.
+
+Rules are compiled once (RuleSet): they are bucketed by the extensions they
+can match, so a file is only checked against the rules of its extension
+plus the rules that accept any extension, and the name patterns of a
+bucket are joined into one regex that rejects non-matching files in a
+single call. Files are stat'ed only if a candidate rule needs size, age
+or date.
+"""
+
+import fnmatch
+import json
+import os
+import re
+import string
+import time
+from datetime import datetime
+
+from .categories import CategoryIndex
+
+TEMPLATE_FIELDS = ("category", "ext", "year", "month", "day")
+DATE_FIELDS = ("year", "month", "day")
+
+SIZE_UNITS = {"": 1, "b": 1, "k": 2**10, "kb": 2**10, "m": 2**20, "mb": 2**20,
+              "g": 2**30, "gb": 2**30, "t": 2**40, "tb": 2**40}
+AGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "y": 365 * 86400}
+
+
+def parse_quantity(value, units, what):
+    """Parses 1024, "500 MB" or "30d" into a number of bytes or seconds."""
+    if isinstance(value, (int, float)):
+        return value
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", str(value))
+    if match is None or match.group(2).lower() not in units:
+        raise ValueError(f"invalid {what}: {value!r}")
+    return float(match.group(1)) * units[match.group(2).lower()]
+
+
+class Rule:
+    """One compiled rule."""
+
+    __slots__ = ("number", "name", "extensions", "glob_extension", "category", "pattern",
+                 "pattern_source",
+                 "min_size", "max_size", "min_age", "max_age", "template", "needs_stat",
+                 "uses_date")
+
+    def __init__(self, spec, number):
+        self.number = number
+        self.name = spec.get("name", f"rule {number}")
+        unknown = set(spec) - {"name", "extensions", "category", "glob", "regex", "min_size",
+                               "max_size", "older_than", "newer_than", "to"}
+        if unknown:
+            raise ValueError(f"{self.name}: unknown keys {sorted(unknown)}")
+        if "to" not in spec:
+            raise ValueError(f"{self.name}: no destination ('to')")
+
+        extensions = spec.get("extensions") or ()
+        self.extensions = tuple(e.lower() if e.startswith(".") else "." + e.lower()
+                                for e in extensions) or None
+        self.category = spec.get("category")
+
+        # "*.pdf", "invoice_*.pdf": a glob ending in a literal extension can only
+        # match that extension, which is enough to bucket the rule
+        self.glob_extension = None
+        match = re.search(r"(\.[^.*?\[\]/]+)$", spec.get("glob", ""))
+        if match is not None:
+            self.glob_extension = match.group(1).lower()
+
+        # Patterns are used with re.match; a regex is searched by letting it
+        # start anywhere (a leading ^ still only matches at the start)
+        sources = []
+        if "glob" in spec:
+            # fnmatch.translate anchors the end; (?i:) makes globs case-insensitive
+            sources.append(f"(?i:{fnmatch.translate(spec['glob'])})")
+        if "regex" in spec:
+            sources.append(f"(?s:.*?)(?:{spec['regex']})")
+        try:
+            patterns = [re.compile(source) for source in sources]
+        except re.error as e:
+            raise ValueError(f"{self.name}: bad pattern: {e}") from None
+        self.pattern_source = sources[0] if len(sources) == 1 else None
+        if not patterns:
+            self.pattern = None
+        elif len(patterns) == 1:
+            self.pattern = patterns[0].match
+        else:
+            glob, regex = (p.match for p in patterns)
+            self.pattern = lambda name: glob(name) and regex(name)
+
+        self.min_size = self._quantity(spec, "min_size", SIZE_UNITS)
+        self.max_size = self._quantity(spec, "max_size", SIZE_UNITS)
+        self.min_age = self._quantity(spec, "older_than", AGE_UNITS)
+        self.max_age = self._quantity(spec, "newer_than", AGE_UNITS)
+
+        template = spec["to"].replace("\\", "/").strip("/")
+        parts = template.split("/")
+        if not template or os.path.isabs(spec["to"]) or ".." in parts:
+            raise ValueError(f"{self.name}: 'to' must be a folder inside the sorted folder")
+        fields = {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+        if not fields <= set(TEMPLATE_FIELDS):
+            raise ValueError(f"{self.name}: unknown fields {sorted(fields - set(TEMPLATE_FIELDS))} "
+                             f"in 'to' (allowed: {', '.join(TEMPLATE_FIELDS)})")
+        # Recursive scans skip the rules' top folders; one named by the file
+        # (a date, an extension) can't be known up front, so only {category},
+        # always skipped, may vary there
+        first_fields = {field for _, field, _, _ in string.Formatter().parse(parts[0])
+                        if field is not None}
+        if first_fields and parts[0] != "{category}":
+            raise ValueError(f"{self.name}: 'to' must start with a fixed folder or {{category}}, "
+                             f"not {parts[0]!r}")
+        self.template = os.path.join(*parts)
+        self.uses_date = bool(fields & set(DATE_FIELDS))
+        self.needs_stat = (self.min_size is not None or self.max_size is not None
+                           or self.min_age is not None or self.max_age is not None)
+
+    def _quantity(self, spec, key, units):
+        if key not in spec:
+            return None
+        try:
+            return parse_quantity(spec[key], units, key)
+        except ValueError as e:
+            raise ValueError(f"{self.name}: {e}") from None
+
+    @property
+    def top_folder(self):
+        """First folder of the destination, or None for {category} (a category folder)."""
+        first = self.template.split(os.sep)[0]
+        return None if first == "{category}" else first.format()
+
+    def matches(self, name, lowered, category, stat, now):
+        if self.extensions is not None and not lowered.endswith(self.extensions):
+            return False
+        if self.category is not None and category != self.category:
+            return False
+        if self.pattern is not None and not self.pattern(name):
+            return False
+        if self.needs_stat:
+            st = stat()
+            if self.min_size is not None and st.st_size < self.min_size:
+                return False
+            if self.max_size is not None and st.st_size > self.max_size:
+                return False
+            age = now - st.st_mtime
+            if self.min_age is not None and age < self.min_age:
+                return False
+            if self.max_age is not None and age > self.max_age:
+                return False
+        return True
+
+    def render(self, lowered, category, stat):
+        fields = {"category": category}
+        dot = lowered.rfind(".")
+        fields["ext"] = lowered[dot + 1:] if dot > 0 else ""
+        if self.uses_date:
+            date = datetime.fromtimestamp(stat().st_mtime)
+            fields.update(year=f"{date.year}", month=f"{date.month:02d}", day=f"{date.day:02d}")
+        return self.template.format_map(fields)
+
+
+class _Bucket:
+    """Candidate rules of one extension, in rule order, with a joint name prefilter."""
+
+    __slots__ = ("rules", "prefilter", "unpatterned")
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.prefilter = None
+        # Rules without a name pattern must be tried even when the prefilter says no
+        self.unpatterned = tuple(rule for rule in rules if rule.pattern is None)
+        patterned = [rule for rule in rules if rule.pattern is not None]
+        if len(patterned) > 1 and all(rule.pattern_source is not None for rule in patterned):
+            try:
+                self.prefilter = re.compile(
+                    "|".join(f"(?:{rule.pattern_source})" for rule in patterned)).match
+            except re.error:
+                # e.g. global inline flags in the middle of the alternation
+                self.prefilter = None
+
+
+class RuleSet:
+    """Rules compiled for fast matching; see the module docstring.
+
+    index is the CategoryIndex the organizer classifies with; it gives the
+    extensions of "category" rules.
+    """
+
+    def __init__(self, specs, index):
+        self.specs = specs
+        self.index = index
+        self.rules = [Rule(spec, number) for number, spec in enumerate(specs, 1)]
+        # Whether where a file goes may depend on its size or dates
+        self.needs_stat = any(rule.needs_stat or rule.uses_date for rule in self.rules)
+
+        keyed = {}
+        unkeyed = []
+        by_category = {}
+        for ext, category in index.extensions():
+            by_category.setdefault(category, []).append(ext)
+        for rule in self.rules:
+            extensions = rule.extensions
+            if extensions is None and rule.glob_extension is not None:
+                extensions = (rule.glob_extension,)
+            if extensions is None and rule.category is not None:
+                extensions = by_category.get(rule.category)
+            if not extensions:
+                unkeyed.append(rule)
+                continue
+            for ext in extensions:
+                # Buckets are keyed by the last suffix; ".tar.gz" is checked by the rule itself
+                keyed.setdefault("." + ext.rsplit(".", 1)[-1], []).append(rule)
+
+        def ordered(rules):
+            return _Bucket(tuple(sorted(set(rules), key=lambda rule: rule.number)))
+
+        self._any = ordered(unkeyed)
+        self._all = ordered(self.rules)
+        self._buckets = {ext: ordered(rules + unkeyed) for ext, rules in keyed.items()}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def top_folders(self):
+        """Fixed top-level destination folders (skipped by recursive scans like categories)."""
+        return {rule.top_folder for rule in self.rules if rule.top_folder is not None}
+
+    def fingerprint(self):
+        """The rules as a string, for caches that must be dropped when they change."""
+        return json.dumps(self.specs, sort_keys=True)
+
+    def match(self, name, category, stat, now=None, reclassified=False):
+        """Returns the destination folder (relative) for a file, or None when no rule matches.
+
+        stat is a callable returning the file's os.stat_result; it is only
+        called if a candidate rule needs size, age or date. reclassified
+        says category does not come from the extension (content sniffing),
+        so extension buckets can't be trusted and every rule is tried.
+        """
+        lowered = name.lower()
+        dot = lowered.rfind(".")
+        if reclassified:
+            bucket = self._all
+        elif dot > 0:
+            bucket = self._buckets.get(lowered[dot:], self._any)
+        else:
+            bucket = self._any
+        if not bucket.rules:
+            return None
+
+        cached = []
+
+        def stat_once():
+            if not cached:
+                cached.append(stat())
+            return cached[0]
+
+        if now is None:
+            now = time.time()
+        rules = bucket.rules
+        if bucket.prefilter is not None and not bucket.prefilter(name):
+            rules = bucket.unpatterned
+        for rule in rules:
+            if rule.matches(name, lowered, category, stat_once, now):
+                return rule.render(lowered, category, stat_once)
+        return None
+
+
+def load_rules(path, index=None):
+    """Reads a rules file ({"rules": [...]} or a bare list) and compiles it.
+
+    index defaults to the built-in categories (CategoryIndex()).
+    """
+    if index is None:
+        index = CategoryIndex()
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    specs = data.get("rules", []) if isinstance(data, dict) else data
+    if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+        raise ValueError(f"{path}: expected a list of rules")
+    return RuleSet(specs, index)
@@ -0,0 +1,123 @@
+"""
+Persistent scan cache (SQLite) for incremental re-sorting of the same folders.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Where caches are kept by default: one SQLite file per organized folder
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "file_organizer")
+
+# A directory modified this recently may still change within the same mtime
+# tick, so it is not trusted as unchanged (the "racily clean" rule of git).
+# Coarse timestamps (FAT: 2 s, ext3 and HFS+: 1 s) need the full window;
+# with sub-millisecond timestamps a tick is the kernel's coarse clock, a few ms
+RACY_NS = 2 * 10**9
+RACY_FINE_NS = 100 * 10**6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    category TEXT
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+"""
+
+
+def default_cache_path(folder):
+    """Returns the default cache file for a folder (~/.cache/file_organizer/<hash>.sqlite)."""
+    digest = hashlib.sha1(os.path.abspath(folder).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(DEFAULT_CACHE_DIR, f"{digest[:16]}.sqlite")
+
+
+class ScanCache:
+    """What the previous runs left behind in every directory they listed.
+
+    For a directory the cache keeps its st_mtime_ns after the run and its
+    subfolders; for the files left in place (name conflicts) their inode,
+    size, mtime and category (inode, size and mtime are 0 when the
+    Organizer's options make only names matter). A directory whose mtime did not change still
+    holds the same entries, so the next run does not list it once its files
+    left in place are found unchanged (a file edited in place does not
+    change the directory's mtime), and in changed directories files that
+    are still the same are not processed again. Entries are keyed by path;
+    check_config() drops the whole cache when the sorting options change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # The GUI opens the cache on the Tk thread and sorts on a worker thread
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def check_config(self, config):
+        """Clears the cache if it was built with different sorting options."""
+        fingerprint = json.dumps(config, sort_keys=True)
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        if row is None or row[0] != fingerprint:
+            with self._db:
+                self._db.execute("DELETE FROM dirs")
+                self._db.execute("DELETE FROM files")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('config', ?)", (fingerprint,))
+
+    def unchanged_subdirs(self, directory, mtime_ns):
+        """Returns the cached subfolders of an unchanged directory, or None if it must be listed."""
+        row = self._db.execute("SELECT mtime_ns, subdirs FROM dirs WHERE path = ?",
+                               (directory,)).fetchone()
+        if row is None or row[0] != mtime_ns:
+            return None
+        return row[1].split("\0") if row[1] else []
+
+    def settled_files(self, directory):
+        """Returns {path: (ino, size, mtime_ns)} of the files left in place in directory."""
+        rows = self._db.execute("SELECT path, ino, size, mtime_ns FROM files WHERE dir = ?",
+                                (directory,))
+        return {path: (ino, size, mtime_ns) for path, ino, size, mtime_ns in rows}
+
+    def update(self, listed, settled):
+        """Records the directories listed in a finished run.
+
+        listed maps directory -> subfolders; settled is a list of
+        (directory, path, ino, size, mtime_ns, category) for the files that
+        stay where they are.
+        """
+        now_ns = time.time_ns()
+        with self._db:
+            for directory, subdirs in listed.items():
+                self._db.execute("DELETE FROM files WHERE dir = ?", (directory,))
+                try:
+                    mtime_ns = os.stat(directory).st_mtime_ns
+                except OSError:
+                    self._db.execute("DELETE FROM dirs WHERE path = ?", (directory,))
+                    continue
+                if _racy(now_ns, mtime_ns):
+                    self._db.execute("DELETE FROM dirs WHERE path = ?", (directory,))
+                else:
+                    self._db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                                     (directory, mtime_ns, "\0".join(subdirs)))
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(path, directory, ino, size, mtime_ns, category)
+                                  for directory, path, ino, size, mtime_ns, category in settled])
+
+    def close(self):
+        self._db.close()
+
+
+def _racy(now_ns, mtime_ns):
+    """True when a directory may still change without its mtime changing."""
+    window = RACY_FINE_NS if mtime_ns % 10**6 else RACY_NS
+    return now_ns - mtime_ns < window
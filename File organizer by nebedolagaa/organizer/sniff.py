@@ -0,0 +1,267 @@
+"""
+Content sniffing: classify files by their magic numbers instead of their extension.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .categories import CategoryIndex
+from .scan_cache import DEFAULT_CACHE_DIR
+
+# Bytes read from the start of each file; enough for the tar header magic at 257
+HEADER_SIZE = 512
+# Results a sniffer keeps in memory, least recently used dropped first; a
+# SniffCache keeps all of them on disk
+MEMO_SIZE = 4096
+
+# (offset, magic bytes, category, strong)
+# A strong signature overrides a known extension (mislabeled files); a weak one
+# (generic containers, short magics) is only used when the extension tells nothing.
+SIGNATURES = [
+    (0, b"\xff\xd8\xff", "Images", True),
+    (0, b"\x89PNG\r\n\x1a\n", "Images", True),
+    (0, b"GIF87a", "Images", True),
+    (0, b"GIF89a", "Images", True),
+    (0, b"II*\x00", "Images", True),
+    (0, b"MM\x00*", "Images", True),
+    (0, b"BM", "Images", False),
+    (0, b"%PDF-", "Documents", True),
+    (0, b"{\\rtf", "Documents", True),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "Documents", False),  # OLE2: .doc/.xls/.ppt
+    (0, b"\x1aE\xdf\xa3", "Videos", True),  # Matroska / WebM
+    (0, b"FLV\x01", "Videos", True),
+    (0, b"ID3", "Music", True),
+    (0, b"fLaC", "Music", True),
+    (0, b"OggS", "Music", True),
+    (0, b"Rar!\x1a\x07", "Archives", True),
+    (0, b"7z\xbc\xaf\x27\x1c", "Archives", True),
+    (0, b"\x1f\x8b", "Archives", True),
+    (0, b"BZh", "Archives", False),
+    (0, b"\xfd7zXZ\x00", "Archives", True),
+    (0, b"PK\x03\x04", "Archives", False),  # also .docx/.xlsx/.jar/...
+    (257, b"ustar", "Archives", True),
+]
+
+# Major brands of ISO base media files ("ftyp" box) that are not plain video:
+# HEIF/HEIC and AVIF photos (and their image sequences), AAC audio
+IMAGE_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx",
+                b"mif1", b"msf1", b"avif", b"avis"}
+AUDIO_BRANDS = {b"M4A ", b"M4B ", b"M4P "}
+VIDEO_BRANDS = {b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"avc1",
+                b"qt  ", b"M4V ", b"M4VH", b"M4VP", b"3gp4", b"3gp5", b"3gp6", b"3g2a",
+                b"dash", b"mmp4", b"MSNV", b"f4v "}
+
+# Bump when sniff_header() gives other answers, so SniffCache drops old results
+SNIFF_VERSION = 2
+
+
+def sniff_header(header):
+    """Returns (category, strong) for a file header, or None when inconclusive."""
+    for offset, magic, category, strong in SIGNATURES:
+        if header.startswith(magic, offset):
+            return category, strong
+    # Containers whose type is a few bytes in
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand in IMAGE_BRANDS:
+            return "Images", True
+        if brand in AUDIO_BRANDS:
+            return "Music", True
+        # Unknown brands are most often video, but only say so when the extension can't
+        return "Videos", brand in VIDEO_BRANDS
+    if header[:4] == b"RIFF":
+        kind = header[8:12]
+        if kind == b"WAVE":
+            return "Music", True
+        if kind == b"AVI ":
+            return "Videos", True
+    return None
+
+
+def default_sniff_cache_path():
+    """Returns the default sniff cache (one for all folders, keyed by inode)."""
+    return os.path.join(DEFAULT_CACHE_DIR, "sniff.sqlite")
+
+
+class SniffCache:
+    """Sniff results of files by inode, kept on disk between runs (SQLite).
+
+    A row is only used while the file's size and mtime are unchanged; an
+    inconclusive header is stored too, so it is not read again either. New
+    rows are written by flush(). The cache is emptied when SNIFF_VERSION
+    changes.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS sniffs (
+        dev INTEGER NOT NULL,
+        ino INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        category TEXT,
+        strong INTEGER NOT NULL,
+        PRIMARY KEY (dev, ino)
+    );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # The GUI opens the cache on the Tk thread and sorts on a job thread
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = []
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != str(SNIFF_VERSION):
+            with self._db:
+                self._db.execute("DELETE FROM sniffs")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                                 (str(SNIFF_VERSION),))
+
+    def get(self, st):
+        """Returns (True, sniff result or None) for a cached file, (False, None) otherwise."""
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns, category, strong FROM sniffs "
+                                   "WHERE dev = ? AND ino = ?", (st.st_dev, st.st_ino)).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return False, None
+        return True, (row[2], bool(row[3])) if row[2] is not None else None
+
+    def put(self, st, sniffed):
+        category, strong = sniffed if sniffed is not None else (None, False)
+        with self._lock:
+            self._pending.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns,
+                                  category, int(strong)))
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO sniffs VALUES (?, ?, ?, ?, ?, ?)",
+                                         pending)
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+class ContentSniffer:
+    """Classifies files by header bytes, falling back to the extension.
+
+    Headers are read in batches on a thread pool. The last MEMO_SIZE
+    results are remembered by (st_dev, st_ino, st_mtime_ns, st_size), so a
+    file that was sniffed recently is not read again while it is unchanged;
+    moving a file keeps its inode, so sorting the same files again (after
+    an undo, in watch mode) costs no reads. With a SniffCache every result
+    is kept on disk between runs. Safe to call from several threads.
+    """
+
+    def __init__(self, index=None, workers=4, header_size=HEADER_SIZE, cache=None):
+        self.index = index if index is not None else CategoryIndex()
+        self.workers = max(1, int(workers))
+        self.header_size = header_size
+        self.cache = cache
+        self.headers_read = 0
+        self.cache_hits = 0
+        self._memo = OrderedDict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def category(self, filename, sniffed):
+        """Combines the extension category with a sniff result."""
+        return self._combine(self.index.classify(filename), sniffed)
+
+    def _combine(self, by_extension, sniffed):
+        if sniffed is None:
+            return by_extension
+        category, strong = sniffed
+        if category not in self.index.categories:
+            return by_extension
+        if strong or by_extension == self.index.default:
+            return category
+        return by_extension
+
+    def classify_many(self, entries):
+        """Returns {path: category} for the os.DirEntry objects of a batch whose
+        content gives another category than their extension."""
+        sniffed = {}
+        misses = []
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+            found, result = self._recall(key)
+            if not found and self.cache is not None:
+                found, result = self.cache.get(st)
+                if found:
+                    self.cache_hits += 1
+                    self._remember(key, result)
+            if found:
+                sniffed[entry.path] = result
+            else:
+                misses.append((entry.path, key, st))
+
+        if misses:
+            for (path, key, st), result in zip(misses, self._executor().map(self._read, misses)):
+                sniffed[path] = result
+                self._remember(key, result)
+                if self.cache is not None:
+                    self.cache.put(st, result)
+            self.headers_read += len(misses)
+
+        categories = {}
+        for entry in entries:
+            by_extension = self.index.classify(entry.name)
+            category = self._combine(by_extension, sniffed.get(entry.path))
+            if category != by_extension:
+                categories[entry.path] = category
+        return categories
+
+    def _recall(self, key):
+        """Returns (found, sniff result) from the in-memory results."""
+        with self._lock:
+            if key not in self._memo:
+                return False, None
+            self._memo.move_to_end(key)
+            return True, self._memo[key]
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memo[key] = result
+            if len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+
+    def _read(self, item):
+        path = item[0]
+        try:
+            with open(path, 'rb') as f:
+                return sniff_header(f.read(self.header_size))
+        except OSError:
+            return None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix="sniff")
+            return self._pool
+
+    def flush(self):
+        """Writes newly read results to the cache, if there is one."""
+        if self.cache is not None:
+            self.cache.flush()
+
+    def close(self):
+        """Stops the reader threads (the cache is kept)."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,454 @@
+"""
+Moves across devices: free space check, chunked zero-copy copy, verify, delete.
+
+A rename only works within one filesystem. When a category folder is on
+another device (a mount or a symlink to a NAS, a USB disk), a move is a
+copy followed by deleting the source. CrossDeviceMover does it in steps:
+
+    space    the bytes still to copy, plus MIN_FREE, must fit in the free
+             space of the destination (os.statvfs). Copies running at the
+             same time are counted, so workers do not all see the same
+             free space. Organizer.execute() checks a whole plan up front.
+    copy     CHUNK_SIZE bytes at a time with os.copy_file_range (in the
+             kernel, no copy through user space), else os.sendfile, else
+             read/write. The way that works is remembered per pair of
+             devices. Every chunk is reported to on_bytes, so progress
+             moves inside big files.
+    verify   the source must be unchanged (size and mtime) and the copy
+             must have the same size. With verify=SAMPLE the first, last
+             and resume-point blocks are also compared; with verify=FULL
+             every byte is.
+    commit   fsync, copy the metadata (mtime, mode), rename into place
+             (never over an existing file), then delete the source.
+
+The copy is written to a hidden ".<name>.organizer-part" next to the
+destination. Every CHECKPOINT bytes it is fsync'ed, then the offset up to
+which it is durable is written (and fsync'ed) to the hidden
+".<name>.organizer-checkpoint", along with the source's size and mtime.
+If a copy is interrupted (cancel, crash, power loss), the next move of
+the same file cuts the partial copy back to that offset and continues
+from there; whatever was written after the checkpoint may be torn and
+is copied again. A partial copy without a checkpoint, or whose checkpoint names
+another size or mtime (an older version of the file), is started over.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import shutil
+import sys
+import threading
+from collections import Counter
+
+CHUNK_SIZE = 8 * 2**20
+CHECKPOINT = 256 * 2**20
+# Bytes left free on the destination: a copy never fills a disk to the last block
+MIN_FREE = 64 * 2**20
+# Bytes compared per sample by verify=SAMPLE
+SAMPLE_SIZE = 64 * 2**10
+PART_SUFFIX = ".organizer-part"
+CHECKPOINT_SUFFIX = ".organizer-checkpoint"
+# Names the scan must leave alone
+TEMP_SUFFIXES = (PART_SUFFIX, CHECKPOINT_SUFFIX)
+
+SAMPLE = "sample"
+FULL = "full"
+VERIFY_MODES = (SAMPLE, FULL)
+
+# Flags of renameat2() (Linux, <linux/fs.h>) and renamex_np() (macOS, <stdio.h>)
+# that make a rename fail with EEXIST instead of replacing the destination
+RENAME_NOREPLACE = 1
+RENAME_EXCL = 0x00000004
+AT_FDCWD = -100
+# Errors of those calls meaning "not supported here" (old kernel or libc, filesystem)
+NO_NATIVE_RENAME = {errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+# os.link errors of filesystems without hard links (FAT, exFAT, some SMB/FUSE mounts)
+NO_HARD_LINKS = {errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS, errno.EMLINK}
+
+# Ways to copy a chunk, fastest first
+COPY_FILE_RANGE = "copy_file_range"
+SENDFILE = "sendfile"
+READ_WRITE = "read"
+# Errors meaning "this way of copying is not supported here", not "the copy failed"
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP,
+                errno.EBADF, errno.ENOTSOCK, errno.EPERM}
+
+
+def free_space(path):
+    """Bytes an unprivileged user may still write on the filesystem of path.
+
+    path may not exist yet; its nearest existing parent is used.
+    """
+    path = _existing_parent(path)
+    if hasattr(os, "statvfs"):
+        st = os.statvfs(path)
+        return st.f_bavail * st.f_frsize
+    return shutil.disk_usage(path).free
+
+
+def _existing_parent(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def check_space(transfers, min_free=MIN_FREE):
+    """Raises OSError(ENOSPC) unless every destination can take its files.
+
+    transfers is an iterable of (source device, destination folder, size);
+    files staying on their device are free. The sizes are added up per
+    destination filesystem before free space is checked, so a batch fails
+    up front instead of halfway through.
+    """
+    needed = Counter()
+    folders = {}
+    devices = {}
+    for src_dev, folder, size in transfers:
+        dev = devices.get(folder)
+        if dev is None:
+            dev = devices[folder] = os.stat(_existing_parent(folder)).st_dev
+        if dev == src_dev:
+            continue
+        needed[dev] += size
+        folders.setdefault(dev, folder)
+    for dev, size in needed.items():
+        free = free_space(folders[dev])
+        if size + min_free > free:
+            raise OSError(errno.ENOSPC, f"not enough free space on the device of {folders[dev]}: "
+                                        f"{_mib(size)} to copy and {_mib(min_free)} to keep free, "
+                                        f"{_mib(free)} free")
+
+
+def _mib(size):
+    return f"{size / 2**20:.1f} MiB"
+
+
+def part_path(dest_path):
+    """Where the copy to dest_path is written until it is complete."""
+    folder, name = os.path.split(dest_path)
+    return os.path.join(folder, f".{name}{PART_SUFFIX}")
+
+
+def checkpoint_path(dest_path):
+    """Where the resumable offset of the copy to dest_path is kept."""
+    folder, name = os.path.split(dest_path)
+    return os.path.join(folder, f".{name}{CHECKPOINT_SUFFIX}")
+
+
+class CrossDeviceMover:
+    """Moves files to another device; safe to use from worker threads.
+
+    Counts the files it moved, the bytes it copied and the bytes it did not
+    have to copy again because an interrupted copy was resumed.
+    """
+
+    def __init__(self, verify=SAMPLE, chunk_size=CHUNK_SIZE, min_free=MIN_FREE,
+                 checkpoint=CHECKPOINT):
+        if verify not in VERIFY_MODES:
+            raise ValueError(f"unknown verify mode {verify!r} (use {', '.join(VERIFY_MODES)})")
+        self.verify = verify
+        self.chunk_size = chunk_size
+        self.min_free = min_free
+        self.checkpoint = checkpoint
+        self.files = 0
+        self.bytes_copied = 0
+        self.bytes_resumed = 0
+        self._lock = threading.Lock()
+        # Bytes being copied to every device right now
+        self._reserved = Counter()
+        # (source device, destination device) -> way of copying that works there
+        self._methods = {}
+
+    def move(self, src_path, dest_path, on_bytes=None, should_stop=None):
+        """Copies src_path to dest_path, verifies the copy and deletes the source.
+
+        Returns the number of bytes copied by this call (less than the size
+        when an earlier copy was resumed), or None when should_stop() asked
+        to stop; the partial copy is then kept for the next move.
+        """
+        if os.path.lexists(dest_path):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dest_path)
+        dest_dir = os.path.dirname(dest_path)
+        partial = part_path(dest_path)
+        marker = checkpoint_path(dest_path)
+        binary = getattr(os, "O_BINARY", 0)
+        src_fd = os.open(src_path, os.O_RDONLY | binary)
+        try:
+            st = os.fstat(src_fd)
+            size = st.st_size
+            dst_fd = os.open(partial, os.O_RDWR | os.O_CREAT | binary, 0o600)
+            completed = False
+            try:
+                offset = self._resume_offset(dst_fd, marker, st)
+                dest_dev = os.fstat(dst_fd).st_dev
+                self._reserve(dest_dir, dest_dev, size - offset)
+                try:
+                    copied_to = self._copy(src_fd, dst_fd, marker, st, offset, dest_dev,
+                                           on_bytes, should_stop)
+                finally:
+                    with self._lock:
+                        self._reserved[dest_dev] -= size - offset
+                if copied_to < size:
+                    self._checkpoint(dst_fd, marker, st, copied_to)
+                    return None
+                os.fsync(dst_fd)
+                self._verify(src_path, src_fd, dst_fd, marker, st, offset)
+                completed = True
+            finally:
+                # An empty partial copy has nothing to resume
+                empty = not completed and os.fstat(dst_fd).st_size == 0
+                os.close(dst_fd)
+                if empty:
+                    os.unlink(partial)
+                    _remove(marker)
+        finally:
+            os.close(src_fd)
+
+        shutil.copystat(src_path, partial)
+        try:
+            rename_no_replace(partial, dest_path)
+        except FileExistsError:
+            # Someone else's file took the name during the copy; the caller
+            # picks another name, which has its own partial copy
+            _remove(partial)
+            _remove(marker)
+            raise
+        _remove(marker)
+        _sync_dir(dest_dir)
+        os.unlink(src_path)
+        with self._lock:
+            self.files += 1
+            self.bytes_copied += size - offset
+            self.bytes_resumed += offset
+        return size - offset
+
+    def _resume_offset(self, dst_fd, marker, st):
+        """Bytes of the partial copy that can be kept (0 starts over).
+
+        Only the bytes up to the last checkpoint are known to be on disk;
+        anything after it is cut off and copied again.
+        """
+        part_size = os.fstat(dst_fd).st_size
+        offset = 0
+        if part_size:
+            checkpoint = _read_checkpoint(marker)
+            if (checkpoint is not None
+                    and (checkpoint.get("size"), checkpoint.get("mtime_ns")) == (st.st_size, st.st_mtime_ns)
+                    and isinstance(checkpoint.get("offset"), int)
+                    and 0 <= checkpoint["offset"] <= part_size):
+                offset = checkpoint["offset"]
+        if part_size != offset:
+            os.ftruncate(dst_fd, offset)
+        if not offset:
+            _remove(marker)
+        return offset
+
+    def _reserve(self, dest_dir, dest_dev, needed):
+        with self._lock:
+            free = free_space(dest_dir) - self._reserved[dest_dev]
+            if needed + self.min_free > free:
+                raise OSError(errno.ENOSPC, f"not enough free space in {dest_dir}: "
+                                            f"{_mib(needed)} to copy and {_mib(self.min_free)} "
+                                            f"to keep free, {_mib(max(free, 0))} free")
+            self._reserved[dest_dev] += needed
+
+    def _copy(self, src_fd, dst_fd, marker, st, offset, dest_dev, on_bytes, should_stop):
+        """Copies from offset to the end chunk by chunk; returns where it stopped."""
+        size = st.st_size
+        devices = (st.st_dev, dest_dev)
+        method = self._methods.get(devices, COPY_FILE_RANGE)
+        since_checkpoint = 0
+        while offset < size:
+            if should_stop is not None and should_stop():
+                break
+            count = min(self.chunk_size, size - offset)
+            copied, method = self._copy_chunk(src_fd, dst_fd, offset, count, method)
+            if not copied:
+                raise OSError(errno.EIO, "the source file got shorter while it was copied")
+            offset += copied
+            if on_bytes is not None:
+                on_bytes(copied)
+            since_checkpoint += copied
+            if since_checkpoint >= self.checkpoint:
+                self._checkpoint(dst_fd, marker, st, offset)
+                since_checkpoint = 0
+        self._methods[devices] = method
+        return offset
+
+    def _copy_chunk(self, src_fd, dst_fd, offset, count, method):
+        """Copies one chunk, falling back to a slower way where one is not supported."""
+        if method == COPY_FILE_RANGE and hasattr(os, "copy_file_range"):
+            try:
+                copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+                if copied:
+                    return copied, method
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+        if method in (COPY_FILE_RANGE, SENDFILE) and hasattr(os, "sendfile"):
+            try:
+                os.lseek(dst_fd, offset, os.SEEK_SET)
+                copied = os.sendfile(dst_fd, src_fd, offset, count)
+                if copied:
+                    return copied, SENDFILE
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        data = os.read(src_fd, count)
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        return len(data), READ_WRITE
+
+    def _checkpoint(self, dst_fd, marker, st, offset):
+        """Makes the first offset bytes durable, then records them as resumable."""
+        os.fsync(dst_fd)
+        data = json.dumps({"offset": offset, "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+        fd = os.open(marker, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o600)
+        try:
+            os.write(fd, data.encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _verify(self, src_path, src_fd, dst_fd, marker, st, resumed_from):
+        """Raises OSError(EIO) unless the copy matches an unchanged source."""
+        now = os.stat(src_path)
+        if (now.st_size, now.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            raise OSError(errno.EIO, f"{src_path} changed while it was copied; try again")
+        size = st.st_size
+        if os.fstat(dst_fd).st_size != size:
+            raise OSError(errno.EIO, f"the copy of {src_path} has the wrong size")
+        if self.verify == FULL:
+            blocks = ((offset, self.chunk_size) for offset in range(0, size, self.chunk_size))
+        else:
+            offsets = {0, max(size - SAMPLE_SIZE, 0), max(resumed_from - SAMPLE_SIZE, 0)}
+            blocks = ((offset, SAMPLE_SIZE) for offset in sorted(offsets))
+        for offset, count in blocks:
+            if _read_at(src_fd, offset, count) != _read_at(dst_fd, offset, count):
+                # A bad copy must not be resumed: the next move starts over
+                os.ftruncate(dst_fd, 0)
+                _remove(marker)
+                raise OSError(errno.EIO, f"the copy of {src_path} does not match it "
+                                         f"(at byte {offset}); the source was kept")
+
+
+def rename_no_replace(src_path, dest_path):
+    """Renames a file like os.rename, but raises FileExistsError instead of replacing one.
+
+    os.rename silently replaces an existing file on POSIX (on a
+    case-insensitive volume even one whose name differs only in case).
+    The rename is done by renameat2(RENAME_NOREPLACE) on Linux and
+    renamex_np(RENAME_EXCL) on macOS, a single atomic call either way.
+    Where neither works the file is hard-linked under its new name and the
+    old name removed, and on filesystems without hard links the name is
+    checked right before a plain rename. Windows' rename never replaces
+    a file.
+    """
+    global _rename_function
+    if os.name == "nt":
+        os.rename(src_path, dest_path)
+        return
+    rename = _native_rename()
+    if rename is not None:
+        if rename(os.fsencode(src_path), os.fsencode(dest_path)) == 0:
+            return
+        error = ctypes.get_errno()
+        if error not in NO_NATIVE_RENAME:
+            raise OSError(error, os.strerror(error), src_path, None, dest_path)
+        if error == errno.ENOSYS:
+            # The kernel lacks the call: don't try it again
+            _rename_function = None
+    try:
+        os.link(src_path, dest_path, follow_symlinks=False)
+    except OSError as e:
+        if e.errno not in NO_HARD_LINKS:
+            raise
+        if os.path.lexists(dest_path):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dest_path) from None
+        os.rename(src_path, dest_path)
+        return
+    try:
+        os.unlink(src_path)
+    except OSError:
+        os.unlink(dest_path)
+        raise
+
+
+# The system's no-replace rename once looked up; None when there is none
+_NOT_LOADED = object()
+_rename_function = _NOT_LOADED
+
+
+def _native_rename():
+    """The system's no-replace rename as f(src bytes, dest bytes) -> 0 or -1, or None.
+
+    libc is loaded on the first move, not when the module is imported.
+    """
+    global _rename_function
+    if _rename_function is _NOT_LOADED:
+        _rename_function = _load_native_rename()
+    return _rename_function
+
+
+def _load_native_rename():
+    if sys.platform.startswith("linux"):
+        name = "renameat2"
+    elif sys.platform == "darwin":
+        name = "renamex_np"
+    else:
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        function = getattr(libc, name)
+    except (OSError, AttributeError):
+        # e.g. glibc before 2.28, macOS before 10.12
+        return None
+    if name == "renameat2":
+        function.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+        return lambda src, dest: function(AT_FDCWD, src, AT_FDCWD, dest, RENAME_NOREPLACE)
+    function.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint)
+    return lambda src, dest: function(src, dest, RENAME_EXCL)
+
+
+def _read_checkpoint(marker):
+    """The last checkpoint of a partial copy, or None (missing or torn)."""
+    try:
+        with open(marker, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return checkpoint if isinstance(checkpoint, dict) else None
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _read_at(fd, offset, count):
+    if hasattr(os, "pread"):
+        return os.pread(fd, count, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, count)
+
+
+def _sync_dir(folder):
+    """Makes a rename into folder durable (POSIX; a no-op elsewhere)."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,188 @@
+"""
+Undo of a sort run: moves files back to where they were, in parallel.
+
+Every move is checked before it is reverted. A file that is no longer at
+its sorted location is skipped, and a file that was changed or replaced
+since the sort (its size or mtime differs from what the journal recorded
+at move time), or whose original location is taken by another file, is
+left alone and reported as a conflict. Nothing is ever overwritten.
+"""
+
+import errno
+import os
+import queue
+import threading
+from collections.abc import Sequence
+
+from .transfer import CrossDeviceMover, rename_no_replace
+
+RESTORED = "restored"
+SKIPPED = "skipped"
+CONFLICT = "conflict"
+FAILED = "failed"
+
+
+class UndoReport:
+    """Outcome of an undo; add() is safe to call from worker threads.
+
+    restored is a count; skipped, conflicts and errors are lists of
+    (operation, reason) pairs, reason being a short text (an exception for
+    errors).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.restored = 0
+        self.dirs_created = 0
+        self.skipped = []
+        self.conflicts = []
+        self.errors = []
+
+    def add(self, status, operation, reason=None):
+        with self._lock:
+            if status == RESTORED:
+                self.restored += 1
+            elif status == SKIPPED:
+                self.skipped.append((operation, reason))
+            elif status == CONFLICT:
+                self.conflicts.append((operation, reason))
+            else:
+                self.errors.append((operation, reason))
+
+    @property
+    def total(self):
+        return self.restored + len(self.skipped) + len(self.conflicts) + len(self.errors)
+
+    @property
+    def complete(self):
+        """True when nothing was left behind because of a conflict or an error."""
+        return not self.conflicts and not self.errors
+
+    def as_dict(self):
+        def entries(pairs):
+            return [{'source': op['source'], 'destination': op['destination'], 'reason': str(reason)}
+                    for op, reason in pairs]
+        return {
+            RESTORED: self.restored,
+            SKIPPED: entries(self.skipped),
+            CONFLICT: entries(self.conflicts),
+            FAILED: entries(self.errors),
+            "dirs_created": self.dirs_created,
+        }
+
+
+class Undoer:
+    """Reverts moves newest first, with `workers` threads.
+
+    Moves are spread over the workers by their original path, so the moves
+    of one path (e.g. a name sorted twice by --watch) are always reverted
+    by the same worker, in journal order, while unrelated files are moved
+    back concurrently. Each original folder is created once per undo.
+    """
+
+    # Moves queued per worker; keeps memory bounded on huge journals
+    QUEUE_PER_WORKER = 64
+
+    def __init__(self, workers=1):
+        self.workers = max(1, workers)
+        self.report = UndoReport()
+        # Files sorted onto another device are copied back (organizer/transfer.py)
+        self.mover = CrossDeviceMover()
+        self._dirs = set()
+        self._dirs_lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        self._done = 0
+
+    def run(self, operations, progress=None, total=None):
+        """Reverts operations (already newest first) and returns the UndoReport."""
+        if self.workers == 1:
+            for operation in operations:
+                self._undo_one(operation, progress, total)
+            return self.report
+
+        lanes = [queue.Queue(self.QUEUE_PER_WORKER) for _ in range(self.workers)]
+        threads = [threading.Thread(target=self._drain, args=(lane, progress, total), daemon=True)
+                   for lane in lanes]
+        for thread in threads:
+            thread.start()
+        try:
+            for operation in operations:
+                lanes[hash(operation['source']) % self.workers].put(operation)
+        finally:
+            for lane in lanes:
+                lane.put(None)
+            for thread in threads:
+                thread.join()
+        return self.report
+
+    def _drain(self, lane, progress, total):
+        while True:
+            operation = lane.get()
+            if operation is None:
+                return
+            self._undo_one(operation, progress, total)
+
+    def _undo_one(self, operation, progress, total):
+        try:
+            status, reason = self._restore(operation)
+        except Exception as e:
+            status, reason = FAILED, e
+        self.report.add(status, operation, reason)
+        if progress is not None:
+            with self._progress_lock:
+                self._done += 1
+                progress(self._done, total, operation)
+
+    def _restore(self, operation):
+        source_path = operation['source']
+        dest_path = operation['destination']
+        try:
+            st = os.lstat(dest_path)
+        except FileNotFoundError:
+            return SKIPPED, "no longer in the sorted folder"
+        # Logs written before size/mtime were recorded cannot be checked
+        size = operation.get('size')
+        if size is not None and (st.st_size != size or st.st_mtime_ns != operation.get('mtime')):
+            return CONFLICT, "changed since it was sorted"
+        if os.path.lexists(source_path):
+            return CONFLICT, "the original location is taken by another file"
+
+        self._ensure_dir(os.path.dirname(source_path))
+        try:
+            try:
+                rename_no_replace(dest_path, source_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Checked, verified copy; an interrupted one is resumed by the next undo
+                self.mover.move(dest_path, source_path)
+        except FileExistsError:
+            # Taken between the check above and the move
+            return CONFLICT, "the original location is taken by another file"
+        return RESTORED, None
+
+    def _ensure_dir(self, directory):
+        """Creates an original folder (e.g. a nested one emptied by the sort) once per undo."""
+        if directory in self._dirs:
+            return
+        with self._dirs_lock:
+            if directory in self._dirs:
+                return
+            if not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+                self.report.dirs_created += 1
+            self._dirs.add(directory)
+
+
+def undo_operations(operations, progress=None, total=None, workers=1):
+    """Moves files back to their original locations, newest first.
+
+    operations is a sequence in the order the moves happened (a list or an
+    OperationLog; it is walked backwards, not copied), or any iterable
+    already in undo order (newest first, e.g. read_journal_reversed()) with
+    its length passed as total. Returns an UndoReport.
+    """
+    if isinstance(operations, Sequence):
+        total = len(operations)
+        operations = reversed(operations)
+    return Undoer(workers).run(operations, progress, total)
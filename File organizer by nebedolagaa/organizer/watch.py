@@ -0,0 +1,226 @@
+"""
+Watch mode: sort files as soon as they arrive in a folder.
+
+On Linux the folder is watched with inotify (through ctypes, no extra
+packages); elsewhere, or when inotify is unavailable, the folder is polled
+with os.scandir. Either way the process sleeps while nothing happens.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from .engine import Organizer
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+# Wake-up interval while idle: how quickly stop() is noticed
+IDLE_TIMEOUT = 1.0
+
+
+class InotifyWatcher:
+    """Reports files finished being written (IN_CLOSE_WRITE) or moved into the folder."""
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout):
+        """Blocks up to timeout seconds; returns (names, overflowed)."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return [], False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+
+        names = []
+        overflowed = False
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+            elif name and not mask & IN_ISDIR:
+                names.append(os.fsdecode(name))
+        return names, overflowed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback: lists the folder every interval seconds.
+
+    A file is reported once its size and mtime are the same on two polls
+    in a row, so files that are still being written are left alone.
+    """
+
+    def __init__(self, folder, interval=0.3):
+        self.folder = folder
+        self.interval = interval
+        self._seen = {}
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        current = {}
+        ready = []
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    signature = (st.st_size, st.st_mtime_ns)
+                    current[entry.name] = signature
+                    if self._seen.get(entry.name) == signature:
+                        ready.append(entry.name)
+        except OSError:
+            pass
+        # Reported files are expected to be moved away; forget them either way
+        for name in ready:
+            current.pop(name, None)
+        self._seen = current
+        return ready, False
+
+    def close(self):
+        pass
+
+
+def make_watcher(folder, polling=False):
+    """Returns an InotifyWatcher when possible, a PollingWatcher otherwise."""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(folder)
+
+
+class FolderWatch:
+    """Long-running loop that sorts new files of a folder in small batches.
+
+    Every reported file waits settle seconds without new events (debounce,
+    for writers that close and reopen a file), then due files are sorted
+    together, at most batch_size per Organizer run. organizer_options are
+    passed to every Organizer; on_batch(organizer) is called after each run,
+    also one that failed (the error is printed and the watch goes on).
+    New files are handed over as os.DirEntry objects, like a scan's, so
+    the sniffer reads their headers. find_duplicates is refused: it only
+    looks at the files of one run, and a batch is a few new files.
+    """
+
+    def __init__(self, folder, on_batch=None, settle=0.25, batch_size=256, polling=False,
+                 **organizer_options):
+        if organizer_options.get("find_duplicates"):
+            raise ValueError("find_duplicates does not work in watch mode: "
+                             "new files are sorted a few at a time")
+        self.folder = os.path.normpath(folder)
+        self.on_batch = on_batch
+        self.settle = settle
+        self.batch_size = batch_size
+        self.polling = polling
+        self.organizer_options = organizer_options
+        self.stopped = False
+        self._current = None
+
+    def stop(self):
+        """Makes run() return (within IDLE_TIMEOUT seconds); a running batch stops after its current file."""
+        self.stopped = True
+        organizer = self._current
+        if organizer is not None:
+            organizer.cancel()
+
+    def run(self):
+        watcher = make_watcher(self.folder, self.polling)
+        # Polling already waits for files to stop changing
+        settle = self.settle if isinstance(watcher, InotifyWatcher) else 0.0
+        pending = {}
+        try:
+            # Files that were already there
+            self._sort(None)
+            while not self.stopped:
+                now = time.monotonic()
+                timeout = IDLE_TIMEOUT
+                if pending:
+                    timeout = max(0.0, min(min(pending.values()) - now, timeout))
+
+                names, overflowed = watcher.wait(timeout)
+                now = time.monotonic()
+                if overflowed:
+                    # Events were lost: fall back to one full pass over the folder
+                    pending.clear()
+                    self._sort(None)
+                    continue
+                for name in names:
+                    pending[name] = now + settle
+
+                due = [name for name, deadline in pending.items() if deadline <= now]
+                for name in due:
+                    del pending[name]
+                for start in range(0, len(due), self.batch_size):
+                    self._sort(due[start:start + self.batch_size])
+        finally:
+            watcher.close()
+
+    def _sort(self, names):
+        if self.stopped:
+            return
+        organizer = Organizer(self.folder, **self.organizer_options)
+        self._current = organizer
+        files = None
+        if names is not None:
+            files = self._entries(names)
+            if not files:
+                return
+        try:
+            organizer.sort(files)
+        except Exception as e:
+            # One bad batch (a file that can't be read, a rule or a date that
+            # fails on it) is reported and skipped; the watch goes on
+            what = "the folder" if files is None else f"{len(files)} file(s)"
+            print(f"Could not sort {what}: {type(e).__name__}: {e}", file=sys.stderr)
+        if self.on_batch is not None:
+            self.on_batch(organizer)
+
+    def _entries(self, names):
+        """os.DirEntry objects of the named files that are still in the folder."""
+        wanted = set(names)
+        files = []
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    try:
+                        # The file may have been renamed or deleted in the meantime
+                        if entry.name in wanted and entry.is_file():
+                            files.append(entry)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return files